@@ -7,6 +7,7 @@ import time
 
 from Client import *
 from jameed import Jameed
+from metrics import LatencyMetrics, timer
 
 iMsg = 0
 SIGNAL_ALIVE = '==================ALIVE======================'
@@ -29,7 +30,12 @@ request2argc = {'Name?': 0, 'Chips': 2, 'Ante_Changed': 1, 'Forced_Bet': 2, 'Ope
 # ToDo:  Player_Call, Player_Fold, Player_All-in, Round_Win_Undisputed, Round_result, Player_Hand, Result
 
 unprocessed_buffer = []
-jameed = Jameed(debug=True)
+# latency metrics, only when JAMEED_METRICS names the file they go to (dumped at game over and on SIGUSR1, merged with
+# the ones of the previous games, see metrics)
+metrics = LatencyMetrics.from_environment()
+if metrics is not None:
+    metrics.dump_on_signal()
+jameed = Jameed(debug=True, metrics=metrics)
 
 while True:
 
@@ -45,6 +51,7 @@ while True:
         data = ''
         if len(unprocessed_buffer) == 0:
             continue
+        message_start = timer()
         RequestType = unprocessed_buffer[0]
         request_argc = request2argc[RequestType]
         MsgFractions = unprocessed_buffer[:request_argc + 1]
@@ -160,6 +167,9 @@ while True:
             with open('results.log', 'a') as f:
                 f.write(time.strftime('%y-%m-%d %H:%M:%S') + '\n')
                 f.write('='*20 + '\n')
+            if metrics is not None:
+                metrics.record('message.' + RequestType, timer() - message_start)
+                metrics.dump()
             break
 
         # "Player_Open"
@@ -229,6 +239,9 @@ while True:
             with open('results.log', 'a') as f:
                 f.write(' '.join(MsgFractions)+'\n')
 
+        if metrics is not None:
+            metrics.record('message.' + RequestType, timer() - message_start)
+
 
     except socket.timeout:
         break
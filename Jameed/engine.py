@@ -0,0 +1,364 @@
+"""
+In-process five-card-draw game engine: the rules and the message sequence of the poker server (PokerServerGui.jar,
+see test/test-2p) played through method calls, for headless self-play and tuning (see tuning).
+Bots get the messages PokerGame.py reads from the server socket, Bot.message(request_type, *args), with the numbers as
+ints and the cards as server strings ('TH' is the ten of hearts), and answer the queries as PokerGame.py answers the
+server: Open? and Call/Raise? with a ClientBase.BettingAnswer action or an (action, amount) tuple, Draw? with the cards
+thrown separated by spaces (the Throws message). Name? is asked once, before the first round.
+A round is:
+    Round, Chips (every player), Ante_Changed (first round), Forced_Bet (every player), Cards (to each player),
+    a betting round, Draw? and Player_Draw then Cards (to each player still in, the replacement cards are dealt
+    from the rest of the deck, then from the cards thrown, shuffled), a second betting round and
+    Round_Win_Undisputed (a single player left) or Player_Hand and Round_result (showdown)
+A betting round asks Open? in turn until a player opens (Player_Open, Player_Check, Player_All-in), then Call/Raise?
+until the players still in have matched the highest bet or are all-in (Player_Call, Player_Raise, Player_Fold,
+Player_All-in). When nobody opens before the draw the pot goes to the next round. The game ends with Result (name,
+rounds played, chips of every player) and Game_Over when a player has all the chips or after max_rounds rounds (a
+carried pot left then goes back to the players who put it in).
+Games are reproducible: the decks are shuffled by random.Random(seed) and the global random module, which the bots
+sample their decisions from, is seeded with seed at the start of the game.
+"""
+import random
+import sys
+
+from ClientBase import BettingAnswer
+
+sys.path.append('../Learner')
+
+CARD_STRINGS = [rank + suit for suit in 'CDHS' for rank in '23456789TJQKA']  # by card int value
+CARD_IDS = dict((card_string, card_id) for card_id, card_string in enumerate(CARD_STRINGS))
+
+GAME_SETTINGS = {'chips': 200, 'ante': 10, 'max_rounds': 100}
+MAX_PLAYERS = 10  # 5 cards each from a single deck
+
+
+class Bot(object):
+    """
+    A player of the engine, ignores the messages and checks, folds and keeps its cards.
+    """
+
+    def message(self, request_type, *args):
+        if request_type == 'Name?':
+            return self.__class__.__name__
+        if request_type == 'Open?':
+            return BettingAnswer.ACTION_CHECK
+        if request_type == 'Call/Raise?':
+            return BettingAnswer.ACTION_FOLD
+        if request_type == 'Draw?':
+            return ''
+        return None
+
+
+class JameedBot(Bot):
+    """
+    Jameed, driven the way PokerGame.py drives it. Bots of a process share the tables Jameed loads.
+    """
+
+    def __init__(self, name='Jameed', coefficients=None, jameed=None):
+        from jameed import Jameed
+        self.name = name
+        self.jameed = jameed if jameed is not None else Jameed(coefficients=coefficients)
+
+    def message(self, request_type, *args):
+        jameed = self.jameed
+        if request_type == 'Name?':
+            return self.name
+        elif request_type == 'Chips':
+            # as PokerGame.py does
+            if args[0] == self.name:
+                jameed.update_others_chips(args[0], args[1])
+            else:
+                jameed.chips = args[1]
+        elif request_type == 'Ante_Changed':
+            jameed.ante = args[0]
+        elif request_type == 'Forced_Bet':
+            if args[0] == self.name:
+                jameed.current_bet = args[1]
+            else:
+                jameed.update_others_bet(args[0], args[1])
+        elif request_type == 'Open?':
+            return jameed.get_open_action(*args)
+        elif request_type == 'Call/Raise?':
+            return jameed.get_call_raise_action(*args)
+        elif request_type == 'Cards':
+            jameed.set_hand(','.join(args).replace('T', '10'))
+        elif request_type == 'Draw?':
+            return jameed.get_cards_to_throw()
+        elif request_type == 'Round':
+            jameed.new_round()
+        elif request_type == 'Player_Draw':
+            if args[0] != self.name:
+                jameed.update_other_draw_state(args[0], args[1])
+        return None
+
+
+class RandomBot(Bot):
+    """
+    The random client of Client.py (queryOpenAction, queryCallRaiseAction, queryCardsToThrow).
+    """
+
+    def __init__(self, name='Random'):
+        self.name = name
+        self.hand = []
+
+    def message(self, request_type, *args):
+        if request_type == 'Name?':
+            return self.name
+        elif request_type == 'Cards':
+            self.hand = list(args)
+        elif request_type == 'Open?':
+            minimum_pot_after_open, current_bet, remaining_chips = args
+            choice = random.randint(0, 2)
+            if choice == 0:
+                return BettingAnswer.ACTION_CHECK
+            if choice == 1:
+                return BettingAnswer.ACTION_ALLIN
+            if current_bet + remaining_chips > minimum_pot_after_open:
+                return BettingAnswer.ACTION_OPEN, min(random.randint(0, 10) + minimum_pot_after_open,
+                                                      current_bet + remaining_chips)
+            return BettingAnswer.ACTION_CHECK
+        elif request_type == 'Call/Raise?':
+            maximum_bet, minimum_amount_to_raise_to, current_bet, remaining_chips = args
+            choice = random.randint(0, 3)
+            if choice == 0:
+                return BettingAnswer.ACTION_FOLD
+            if choice == 1:
+                return BettingAnswer.ACTION_ALLIN
+            if choice == 2:
+                return BettingAnswer.ACTION_CALL if current_bet + remaining_chips > maximum_bet else \
+                    BettingAnswer.ACTION_FOLD
+            if current_bet + remaining_chips > minimum_amount_to_raise_to:
+                return BettingAnswer.ACTION_RAISE, min(random.randint(0, 10) + minimum_amount_to_raise_to,
+                                                       current_bet + remaining_chips)
+            return BettingAnswer.ACTION_FOLD
+        elif request_type == 'Draw?':
+            return self.hand[random.randint(0, 4)] + ' '
+        return None
+
+
+class Game(object):
+    """
+    One game between bots (2 to MAX_PLAYERS), play() returns the chips of every bot at the end. rounds is the number
+    of rounds played.
+    """
+
+    def __init__(self, bots, seed, chips=200, ante=10, max_rounds=100):
+        if not 2 <= len(bots) <= MAX_PLAYERS:
+            raise ValueError('A game is played by 2 to {0} bots, not {1}'.format(MAX_PLAYERS, len(bots)))
+        self.bots = bots
+        self.seed = seed
+        self.ante = ante
+        self.max_rounds = max_rounds
+        self.stacks = [chips] * len(bots)
+        self.rounds = 0
+        self.names = [bot.message('Name?') for bot in bots]
+        if len(set(self.names)) < len(self.names):
+            raise ValueError('The bots need distinct names: {0}'.format(', '.join(self.names)))
+
+    def _broadcast(self, request_type, *args):
+        for bot in self.bots:
+            bot.message(request_type, *args)
+
+    def play(self):
+        # type: () -> list
+        from learner.card import Hand
+        if Hand._hand_table is None:
+            Hand.load_hand_table('./hands.bin')  # what Jameed loads, for games without Jameed
+        self._strengths = Hand._hand_table.records()['strength']
+        self._rng = random.Random(self.seed)
+        random.seed(self.seed)
+        self._carried = [0] * len(self.bots)  # what each player put in the pot carried to the next round
+        for round_number in range(self.max_rounds):
+            seated = [i for i in range(len(self.bots)) if self.stacks[i] > 0]
+            if len(seated) < 2:
+                break
+            self._play_round(round_number, seated)
+            self.rounds += 1
+        for i, carried in enumerate(self._carried):
+            self.stacks[i] += carried
+        for i, name in enumerate(self.names):
+            self._broadcast('Result', name, self.rounds, self.stacks[i])
+        self._broadcast('Game_Over')
+        return self.stacks
+
+    def _play_round(self, round_number, seated):
+        bots, names, stacks, ante = self.bots, self.names, self.stacks, self.ante
+        dealer = seated[round_number % len(seated)]
+        order = [i for i in seated if i > dealer] + [i for i in seated if i <= dealer]
+        deck = self._rng.sample(range(52), 52)  # dealt from the end
+        thrown_cards = []
+        self._broadcast('Round', round_number + 1)
+        for i in seated:
+            self._broadcast('Chips', names[i], stacks[i])
+        if round_number == 0:
+            self._broadcast('Ante_Changed', ante)
+        bets = [0] * len(bots)
+        for i in order:
+            bets[i] = min(ante, stacks[i])
+            stacks[i] -= bets[i]
+            self._broadcast('Forced_Bet', names[i], bets[i])
+        hands = {}
+        for i in order:
+            hands[i] = [deck.pop() for k in range(5)]
+            bots[i].message('Cards', *[CARD_STRINGS[card_id] for card_id in hands[i]])
+        folded = set()
+        if not self._betting_round(order, bets, folded):
+            self._carried = [carried + bet for carried, bet in zip(self._carried, bets)]
+            return
+        in_round = [i for i in order if i not in folded]
+        if len(in_round) > 1:
+            for i in in_round:
+                thrown = set(CARD_IDS[card] for card in (bots[i].message('Draw?') or '').split()
+                             if card in CARD_IDS and CARD_IDS[card] in hands[i])
+                own = sorted(thrown)
+                if len(deck) < len(thrown):
+                    # the rest of the deck, then the cards thrown before and last the player's own ones, shuffled
+                    self._rng.shuffle(thrown_cards)
+                    self._rng.shuffle(own)
+                    deck = own + thrown_cards + deck
+                    thrown_cards = []
+                else:
+                    thrown_cards.extend(own)
+                hands[i] = [card_id for card_id in hands[i] if card_id not in thrown] + [deck.pop() for card in thrown]
+                self._broadcast('Player_Draw', names[i], len(thrown))
+                bots[i].message('Cards', *[CARD_STRINGS[card_id] for card_id in hands[i]])
+            self._betting_round(order, bets, folded)
+        in_round = [i for i in order if i not in folded]
+        won = [0] * len(bots)
+        if len(in_round) == 1:
+            won[in_round[0]] = sum(bets) + sum(self._carried)
+            stacks[in_round[0]] += won[in_round[0]]
+            self._broadcast('Round_Win_Undisputed', names[in_round[0]], won[in_round[0]])
+        else:
+            for i in in_round:
+                self._broadcast('Player_Hand', names[i], *[CARD_STRINGS[card_id] for card_id in hands[i]])
+            from learner.index import hand_index
+            _showdown(dict((i, self._strengths[hand_index(hands[i])]) for i in in_round), bets, won,
+                      sum(self._carried))
+            for i in range(len(bots)):
+                stacks[i] += won[i]
+            for i in in_round:
+                self._broadcast('Round_result', names[i], won[i])
+        self._carried = [0] * len(bots)
+
+    def _put(self, i, amount, bets):
+        amount = min(amount, self.stacks[i])
+        bets[i] += amount
+        self.stacks[i] -= amount
+
+    def _betting_round(self, order, bets, folded):
+        # False when nobody opened, True as well when less than two players can bet
+        bots, names, stacks, ante = self.bots, self.names, self.stacks, self.ante
+        if len([i for i in order if i not in folded and stacks[i] > 0]) < 2:
+            return True
+        opener = None
+        for i in order:
+            if i in folded or stacks[i] == 0:
+                continue
+            answer = bots[i].message('Open?', max(bets) + ante, bets[i], stacks[i])
+            if answer == BettingAnswer.ACTION_ALLIN:
+                self._put(i, stacks[i], bets)
+                self._broadcast('Player_All-in', names[i], bets[i])
+            elif isinstance(answer, tuple) and answer[0] == BettingAnswer.ACTION_OPEN:
+                self._put(i, max(int(answer[1]), max(bets) + ante) - bets[i], bets)
+                self._broadcast('Player_Open', names[i], bets[i])
+            else:
+                self._broadcast('Player_Check', names[i])
+                continue
+            opener = i
+            break
+        if opener is None:
+            return False
+        position = order.index(opener)
+        to_act = order[position + 1:] + order[:position]
+        while to_act and len(order) - len(folded) > 1:
+            i = to_act.pop(0)
+            maximum_bet = max(bets)
+            if i in folded or stacks[i] == 0 or bets[i] >= maximum_bet:
+                continue
+            answer = bots[i].message('Call/Raise?', maximum_bet, maximum_bet + ante, bets[i], stacks[i])
+            action = answer[0] if isinstance(answer, tuple) else answer
+            if action == BettingAnswer.ACTION_CALL and bets[i] + stacks[i] > maximum_bet:
+                self._put(i, maximum_bet - bets[i], bets)
+                self._broadcast('Player_Call', names[i])
+            elif action == BettingAnswer.ACTION_RAISE and bets[i] + stacks[i] > maximum_bet + ante:
+                self._put(i, max(int(answer[1]), maximum_bet + ante) - bets[i], bets)
+                self._broadcast('Player_Raise', names[i], bets[i])
+            elif action in (BettingAnswer.ACTION_ALLIN, BettingAnswer.ACTION_CALL, BettingAnswer.ACTION_RAISE):
+                # a call or a raise the player can't afford is all the chips it has
+                self._put(i, stacks[i], bets)
+                self._broadcast('Player_All-in', names[i], bets[i])
+            else:
+                folded.add(i)
+                self._broadcast('Player_Fold', names[i])
+                continue
+            if bets[i] > maximum_bet:
+                position = order.index(i)
+                to_act = [j for j in order[position + 1:] + order[:position] if j not in folded and stacks[j] > 0]
+        return True
+
+
+def _showdown(strengths, bets, won, pot):
+    # splits the bets (and the pot carried from previous rounds) into won between the players still in (index -> hand
+    # strength), side pots included: a player wins at most what each other player put in up to their own bet
+    levels = sorted(set(bets[i] for i in strengths))
+    previous = 0
+    for level in levels:
+        layer = sum(min(bet, level) - min(bet, previous) for bet in bets) + pot
+        pot = 0
+        contenders = [i for i in strengths if bets[i] >= level]
+        best = max(strengths[i] for i in contenders)
+        winners = [i for i in contenders if strengths[i] == best]
+        for k, i in enumerate(winners):
+            won[i] += layer // len(winners) + (1 if k < layer % len(winners) else 0)
+        previous = level
+    # what folded players put in above the highest bet of the players still in goes back to them
+    for i, bet in enumerate(bets):
+        if bet > previous:
+            won[i] += bet - previous
+
+
+def play_game(bots, seed, chips=200, ante=10, max_rounds=100):
+    # type: (list, int, int, int, int) -> list
+    # chips of every bot at the end of a game
+    return Game(bots, seed, chips, ante, max_rounds).play()
+
+
+# bots of a worker process, by spec
+_bots = {}
+
+
+def _play_chunk(task):
+    specs, seeds, game_settings = task
+    bots = []
+    for seat, spec in enumerate(specs):
+        key = (seat, repr(spec))
+        if key not in _bots:
+            factory, kwargs = spec
+            _bots[key] = factory(**kwargs)
+        bots.append(_bots[key])
+    return [(seed, play_game(bots, seed, **game_settings)) for seed in seeds]
+
+
+def play_games(specs, seeds, processes=None, chunk_size=100, **game_settings):
+    # Plays a game per seed on a pool of processes (all cores by default), [(seed, chips of every bot)] in the order
+    # of seeds. specs: one (bot class or other picklable factory, keyword arguments) per seat, e.g.
+    # [(JameedBot, {}), (RandomBot, {})]; each worker builds its bots once and plays its games with them.
+    import multiprocessing
+    game_settings = dict(GAME_SETTINGS, **game_settings)
+    seeds = list(seeds)
+    tasks = [(specs, seeds[start:start + chunk_size], game_settings) for start in range(0, len(seeds), chunk_size)]
+    if any(isinstance(factory, type) and issubclass(factory, JameedBot) for factory, kwargs in specs):
+        # built (when missing) and loaded once here rather than by every worker at once, forked workers inherit them
+        from jameed import load_tables
+        load_tables()
+    if processes == 1:
+        results = [_play_chunk(task) for task in tasks]
+    else:
+        pool = multiprocessing.Pool(processes)
+        try:
+            results = pool.map(_play_chunk, tasks, chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+    return [result for chunk in results for result in chunk]
@@ -1,3 +1,5 @@
+import json
+import os
 import sys
 
 sys.path.append('../Learner')
@@ -5,8 +7,10 @@ import ClientBase
 import random
 from learner.card import Card, Hand, HandType, HandValue
 from learner.stats import StatBuilder, SBin
+from learner.shared import attach_or_build, process_rss
 import time
 from math import exp
+from policy import compile_table
 
 HANDS_COMBINATIONS = 2598960
 THRESHOLD_TO_OPEN = 0.2
@@ -51,11 +55,79 @@ CALL_RAISE_ACTION_C_ALL_IN = 200.
 CALL_RAISE_ACTION_D_ALL_IN = -0.49
 CALL_RAISE_ACTION_E_ALL_IN = 0.02
 
+# Actions of the compiled policies, in the order of their coefficients (see compile_policies)
+OPEN_ACTIONS = [ClientBase.BettingAnswer.ACTION_CHECK, ClientBase.BettingAnswer.ACTION_OPEN,
+                ClientBase.BettingAnswer.ACTION_ALLIN]
+CALL_RAISE_ACTIONS = [ClientBase.BettingAnswer.ACTION_FOLD, ClientBase.BettingAnswer.ACTION_CALL,
+                      ClientBase.BettingAnswer.ACTION_RAISE, ClientBase.BettingAnswer.ACTION_ALLIN]
+
 # Coefficients for bias calculation of the 'Open' amount
 OPEN_AMOUNT_KEEP_MULTIPLES_OF_ANTE = 1
 OPEN_AMOUNT_A = 1.0
 
 
+COEFFICIENT_PREFIXES = ('THRESHOLD_', 'OPEN_ACTION_', 'CALL_RAISE_ACTION_', 'OPEN_AMOUNT_')
+
+
+def default_coefficients():
+    # the coefficient constants above, by name
+    return dict((name, value) for name, value in globals().items()
+                if name.startswith(COEFFICIENT_PREFIXES) and isinstance(value, (int, float)))
+
+
+def load_coefficients(file_name):
+    # coefficients saved by save_coefficients (or written by hand, names as the constants above), the missing ones
+    # are the default ones
+    with open(file_name, 'r') as f:
+        loaded = json.load(f)
+    coefficients = default_coefficients()
+    unknown = sorted(set(loaded) - set(coefficients))
+    if unknown:
+        raise ValueError('Unknown coefficients in {0}: {1}'.format(file_name, ', '.join(unknown)))
+    coefficients.update(loaded)
+    return coefficients
+
+
+def save_coefficients(coefficients, file_name):
+    with open(file_name, 'w') as f:
+        json.dump(coefficients, f, indent=2, sort_keys=True)
+
+
+def compile_policies(coefficients):
+    # (open policy over p_win, call/raise policy over p_win and risk) from coefficients (as default_coefficients()),
+    # actions as in OPEN_ACTIONS and CALL_RAISE_ACTIONS. ValueError when the coefficients are too steep for the
+    # tables to stay within policy.TOLERANCE of them (see policy.compile_table)
+    c = coefficients
+    open_policy = compile_table([(c['OPEN_ACTION_A_' + action], c['OPEN_ACTION_B_' + action],
+                                  c['OPEN_ACTION_C_' + action], c['OPEN_ACTION_D_' + action], 0.)
+                                 for action in ('CHECK', 'OPEN', 'ALL_IN')], risk_steps=0)
+    # the fold risk term has always been weighted by CALL_RAISE_ACTION_D_FOLD (CALL_RAISE_ACTION_E_FOLD is unused)
+    call_raise_policy = compile_table([(c['CALL_RAISE_ACTION_A_' + action], c['CALL_RAISE_ACTION_B_' + action],
+                                        c['CALL_RAISE_ACTION_C_' + action], c['CALL_RAISE_ACTION_D_' + action],
+                                        c['CALL_RAISE_ACTION_' + ('D_' if action == 'FOLD' else 'E_') + action])
+                                       for action in ('FOLD', 'CALL', 'RAISE', 'ALL_IN')])
+    return open_policy, call_raise_policy
+
+
+# tables shared by the Jameed instances of the process, loaded by the first one: (equity engine, shared tables)
+_tables = None
+
+
+def load_tables():
+    # loads the hand table, the bins, the stats and the shared tables of the process once, from the current directory
+    global _tables
+    if _tables is None:
+        Hand.load_hand_table('./hands.bin')
+        StatBuilder.load_bins('./bins.json', index=False)
+        if os.path.exists('./stats.bin'):
+            StatBuilder.load_stats_table('./stats.bin')
+        else:
+            StatBuilder.load_stats('./stats_dump')
+        # bin index and equity histograms are built by the first game only, the next ones map them
+        _tables = attach_or_build('./tables.bin', './hands.bin')
+    return _tables
+
+
 class PlayerInfo(object):
     def __init__self(self):
         self.name = ''
@@ -66,12 +138,20 @@ class PlayerInfo(object):
 
 
 class Jameed(object):
-    def __init__(self, debug=False):
-        Hand.load_hands_dict('./hands.json')
-        StatBuilder.load_bins('./bins.json')
-        StatBuilder.load_stats('./stats_dump')
+    def __init__(self, debug=False, metrics=None, coefficients=None):
+        # metrics: a LatencyMetrics timing the decisions, None for no timing
+        # coefficients: dict overriding the coefficient constants (see default_coefficients), read from
+        # ./coefficients.json when not given and there's one
+        start_time = time.time()
+        self.__equity, self.__shared_tables = load_tables()
+        if coefficients is None:
+            coefficients = load_coefficients('./coefficients.json') if os.path.exists('./coefficients.json') else {}
+        self.coefficients = default_coefficients()
+        self.coefficients.update(coefficients)
+        self.__open_policy, self.__call_raise_policy = compile_policies(self.coefficients)
         self.__hand = None  # type: Hand
         self.__bin = None  # type: SBin
+        self.__strategies = None  # the bin strategies resolved for the hand
         self.chips = 0
         self.__ante = 0
         self.current_bet = 0
@@ -79,10 +159,18 @@ class Jameed(object):
         self.__players_info = {}
         self.__debug = debug
         self.__did_draw = False
+        if metrics is not None:
+            metrics.instrument(self, ['set_hand', 'get_cards_to_throw', 'get_open_action', 'get_call_raise_action'],
+                               'decision.')
+        rss = process_rss()
+        self.info('Started in {:.3f}s, RSS = {}'.format(time.time() - start_time, 'unknown' if rss is None else
+                                                        '{:.1f} MB'.format(rss / 1048576.)))
 
     def set_hand(self, hand_str):
         self.__hand = Hand(cards_string=hand_str)
-        self.__bin = StatBuilder.bin_hand(self.__hand)
+        self.__bin, self.__strategies = StatBuilder.classify_hand(self.__hand)
+        # computed here so the betting decisions only hit the cache
+        self.__equity.p_win_multiway(self.__hand.cards_id, self.__no_of_players - 1)
         self.debug('My hand is -> {}'.format(self.__hand))
         self.debug('My hand bin is  -> {}'.format(self.__bin))
 
@@ -136,7 +224,7 @@ class Jameed(object):
         beta = 0
         strategy_markers = []
         self.debug('Deciding what to throw. Current hand is -> {}'.format(self.__hand.hand_value))
-        for i in range(len(self.__bin.strategies)):
+        for i in range(len(self.__strategies)):
             p_yield = self.__bin.strategies_performance_unweighted[
                 i]  # probability that this strategy will yield better results
             expected_value = self.__bin.strategies_performance[
@@ -151,7 +239,7 @@ class Jameed(object):
                 break
         cards_to_throw = ''
         self.debug('Strategies distribution = {}, q = {:.2f}'.format(strategy_markers, q))
-        for i in self.__bin.strategies[selected_strategy_idx]:
+        for i in self.__strategies[selected_strategy_idx]:
             card_to_throw = str(self.__hand.hand_value.cards[i]).replace('10', 'T')
             cards_to_throw += card_to_throw + ' '
 
@@ -166,6 +254,7 @@ class Jameed(object):
         # invalidate previous round state
         self.__ante = 0
         self.__bin = None
+        self.__strategies = None
         self.__did_draw = False
         self.__hand = None
         self.__players_info.clear()
@@ -184,18 +273,17 @@ class Jameed(object):
             self.debug('Open choice: Forced to check as I have no enough chips')
             return ClientBase.BettingAnswer.ACTION_CHECK
         # * Jameed has enough chips to open : Choose Open, Check or All-in
-        p_hand = float(self.__hand.hand_value.strength) / HANDS_COMBINATIONS
-        p_win = p_hand ** (self.__no_of_players - 1)  # This assumes independent events which is not the case,
-        #                                           but should be a good approximation due to the large sample space
+        # against every other player, card removal included (sampled deals when there are several of them)
+        p_win = self.__equity.p_win_multiway(self.__hand.cards_id, self.__no_of_players - 1)
 
-        self.debug('p_h = {:.2f}, p_w = {:.2f}'.format(p_hand, p_win))
+        self.debug('p_w = {:.2f}'.format(p_win))
 
         # Fixed strategy: Hand is too bad -> check
-        if p_win < THRESHOLD_TO_OPEN and self.__did_draw:
+        if p_win < self.coefficients['THRESHOLD_TO_OPEN'] and self.__did_draw:
             self.debug('Open choice: Forced to check due to crappy hand')
             return ClientBase.BettingAnswer.ACTION_CHECK
         # Fixed strategy: Hand is too good --> All in
-        if p_win > THRESHOLD_TO_FORCE_ALL_IN:
+        if p_win > self.coefficients['THRESHOLD_TO_FORCE_ALL_IN']:
             self.debug('Open choice: Forced to go all in due to amazing hand')
             return ClientBase.BettingAnswer.ACTION_ALLIN
 
@@ -213,34 +301,28 @@ class Jameed(object):
     def sample_open_action_with_bias(self, p_win):
 
         # * Jameed has enough money to open, the action should be a random variable of {Check, Open, All-in} the
-        #       distribution is function of p_win.
-        k_c = OPEN_ACTION_A_CHECK - OPEN_ACTION_B_CHECK / (
-            1.0 + exp(-OPEN_ACTION_C_CHECK * (p_win - 0.5 + OPEN_ACTION_D_CHECK)))
-        k_o = OPEN_ACTION_A_OPEN - OPEN_ACTION_B_OPEN / (
-            1.0 + exp(-OPEN_ACTION_C_OPEN * (p_win - 0.5 + OPEN_ACTION_D_OPEN)))
-        k_a = OPEN_ACTION_A_ALL_IN - OPEN_ACTION_B_ALL_IN / (
-            1.0 + exp(-OPEN_ACTION_C_ALL_IN * (p_win - 0.5 + OPEN_ACTION_D_ALL_IN)))
-        k_sum = k_c + k_o + k_a
-        r = random.uniform(0, k_sum)
-        self.debug(
-            "Open choice sampling: Kc={:.2f}, Ko={:.2f}, Ka={:.2f}, r={:.2f}".format(k_c, k_c + k_o, k_sum, r))
-        if r < k_c:
+        #       distribution is function of p_win (compiled into self.__open_policy).
+        r = random.random()
+        action = OPEN_ACTIONS[self.__open_policy.decide(p_win, u=r)]
+        if self.__debug:  # the probabilities are read for the log only
+            self.debug("Open choice sampling: P(check, open, all in) = ({:.2f}, {:.2f}, {:.2f}), r={:.2f}".format(
+                *(self.__open_policy.probabilities(p_win) + [r])))
+        if action == ClientBase.BettingAnswer.ACTION_CHECK:
             self.debug('Open choice: Biased to check')
-            return ClientBase.BettingAnswer.ACTION_CHECK
-        elif k_c <= r < k_c + k_o:
+        elif action == ClientBase.BettingAnswer.ACTION_OPEN:
             self.debug('Open choice: Biased to open')
-            return ClientBase.BettingAnswer.ACTION_OPEN
         else:
             self.debug('Open choice: Biased to go all in')
-            return ClientBase.BettingAnswer.ACTION_ALLIN
+        return action
 
     def sample_open_amount_with_bias(self, p_win, minimum_pot_after_open, current_bet, remaining_chips):
         remaining_chips_after_minimum_open = remaining_chips + current_bet - minimum_pot_after_open
 
-        if remaining_chips_after_minimum_open < OPEN_AMOUNT_KEEP_MULTIPLES_OF_ANTE * self.ante:
+        keep = self.coefficients['OPEN_AMOUNT_KEEP_MULTIPLES_OF_ANTE'] * self.ante
+        if remaining_chips_after_minimum_open < keep:
             return minimum_pot_after_open
 
-        free_chips = remaining_chips_after_minimum_open - OPEN_AMOUNT_KEEP_MULTIPLES_OF_ANTE * self.ante
+        free_chips = remaining_chips_after_minimum_open - keep
         ratio = 1/(1+exp(-30.*(p_win-0.9)))
 
         open_amount = minimum_pot_after_open + random.uniform(0, free_chips * ratio)
@@ -264,18 +346,17 @@ class Jameed(object):
             self.debug('Call/Raise choice: Forced to go all as there\' no hope left')
             return ClientBase.BettingAnswer.ACTION_ALLIN
 
-        p_hand = float(self.__hand.hand_value.strength) / HANDS_COMBINATIONS
-        p_win = p_hand ** (self.__no_of_players - 1)  # This assumes independent events which is not the case,
-        #                                           but should be a good approximation due to the large sample space
+        # against every other player, card removal included (sampled deals when there are several of them)
+        p_win = self.__equity.p_win_multiway(self.__hand.cards_id, self.__no_of_players - 1)
 
-        self.debug('p_h = {:.2f}, p_w = {:.2f}'.format(p_hand, p_win))
+        self.debug('p_w = {:.2f}'.format(p_win))
         # Fixed Strategy: Hand is extremely bad
-        if p_win < THRESHOLD_TO_FORCE_FOLD:
+        if p_win < self.coefficients['THRESHOLD_TO_FORCE_FOLD']:
             self.debug('Call/Raise choice: Forced to fold due to crappy hand')
             return ClientBase.BettingAnswer.ACTION_FOLD
 
         # Fixed Strategy: Hand is extremely good
-        if p_win > THRESHOLD_TO_FORCE_ALL_IN:
+        if p_win > self.coefficients['THRESHOLD_TO_FORCE_ALL_IN']:
             self.debug('Call/Raise choice: Forced to go all in due to amazing hand')
             return ClientBase.BettingAnswer.ACTION_ALLIN
 
@@ -289,27 +370,17 @@ class Jameed(object):
         risk = float(maximum_bet) / (current_bet + remaining_chips)
         if risk > 1.:
             risk = 1.
-        k_f = CALL_RAISE_ACTION_A_FOLD - CALL_RAISE_ACTION_B_FOLD / (
-            1.0 + exp(
-                -CALL_RAISE_ACTION_C_FOLD * (p_win - 0.5 + CALL_RAISE_ACTION_D_FOLD - CALL_RAISE_ACTION_D_FOLD * risk)))
-        k_c = CALL_RAISE_ACTION_A_CALL - CALL_RAISE_ACTION_B_CALL / (
-            1.0 + exp(
-                -CALL_RAISE_ACTION_C_CALL * (p_win - 0.5 + CALL_RAISE_ACTION_D_CALL - CALL_RAISE_ACTION_E_CALL * risk)))
-        k_r = CALL_RAISE_ACTION_A_RAISE - CALL_RAISE_ACTION_B_RAISE / (
-            1.0 + exp(-CALL_RAISE_ACTION_C_RAISE * (
-                p_win - 0.5 + CALL_RAISE_ACTION_D_RAISE - CALL_RAISE_ACTION_E_RAISE * risk)))
-        k_a = CALL_RAISE_ACTION_A_ALL_IN - CALL_RAISE_ACTION_B_ALL_IN / (
-            1.0 + exp(-CALL_RAISE_ACTION_C_ALL_IN * (
-                p_win - 0.5 + CALL_RAISE_ACTION_D_ALL_IN - CALL_RAISE_ACTION_E_ALL_IN * risk)))
-        k_sum = k_f + k_c + k_r + k_a
-        r = random.uniform(0, k_sum)
-        self.debug(
-            "Call/Raise choice sampling: Kf={:.2f}, Kc={:.2f}, Kr={:.2f}, Ka={:.2f}, risk ={:.2f}, r={:.2f}"
-                .format(k_f, k_f + k_c, k_f + k_c + k_r, k_sum, risk, r))
-        if r < k_f:
+        # the distribution is function of p_win and risk (compiled into self.__call_raise_policy)
+        r = random.random()
+        action = CALL_RAISE_ACTIONS[self.__call_raise_policy.decide(p_win, risk, u=r)]
+        if self.__debug:  # the probabilities are read for the log only
+            self.debug(
+                "Call/Raise choice sampling: P(fold, call, raise, all in) = ({:.2f}, {:.2f}, {:.2f}, {:.2f}), "
+                "risk ={:.2f}, r={:.2f}".format(*(self.__call_raise_policy.probabilities(p_win, risk) + [risk, r])))
+        if action == ClientBase.BettingAnswer.ACTION_FOLD:
             self.debug('Call/Raise choice: Biased to fold')
             return ClientBase.BettingAnswer.ACTION_FOLD
-        if r <= k_f + k_c:
+        if action == ClientBase.BettingAnswer.ACTION_CALL:
             if maximum_bet < current_bet + remaining_chips:
                 self.debug('Call/Raise choice: Biased to call')
                 return ClientBase.BettingAnswer.ACTION_CALL
@@ -317,7 +388,7 @@ class Jameed(object):
                 # self.debug('Call/Raise choice: Biased to call but forced to fold due to insufficient chips')
                 self.debug('Call/Raise choice: Biased to call but will go for All-in due to insufficient chips ')
                 return ClientBase.BettingAnswer.ACTION_ALLIN
-        if r <= k_f + k_c + k_r:
+        if action == ClientBase.BettingAnswer.ACTION_RAISE:
             if minimum_amount_to_raise_to < current_bet + remaining_chips:
                 self.debug('Call/Raise choice: Biased to raise to {}'.format(minimum_amount_to_raise_to))
                 return ClientBase.BettingAnswer.ACTION_RAISE, minimum_amount_to_raise_to  # ToDo: Add possibility to go over the minimum
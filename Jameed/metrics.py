@@ -0,0 +1,181 @@
+"""
+Latency instrumentation of the agent: a histogram per decision (Jameed methods) and per protocol message type
+(PokerGame.py), dumped as text with counts and p50/p95/p99. Nothing is wrapped or timed unless a LatencyMetrics is
+created, so switched off it costs nothing but an `is None` check per message.
+Switch it on with the JAMEED_METRICS environment variable, the file the metrics are written to (see from_environment,
+e.g. JAMEED_METRICS=./metrics.txt, which git ignores along with every '.d' directory).
+Every process keeps its histograms in a file of its own in the directory next to it (JAMEED_METRICS + '.d') and the
+report merges all of them, so the games of a run (a process each with test/test-2p) add up. Remove both to start over.
+"""
+import json
+import math
+import os
+import sys
+import time
+
+sys.path.append('../Learner')
+from learner.stats import _replace_file
+
+# time.perf_counter is python 3 only
+timer = getattr(time, 'perf_counter', time.time)
+
+# bucket i holds the latencies in [MIN_LATENCY * BUCKET_RATIO ** i, MIN_LATENCY * BUCKET_RATIO ** (i + 1)), the first
+# one everything below, the last one everything above
+MIN_LATENCY = 1e-6
+BUCKET_RATIO = 2 ** 0.25
+BUCKETS_COUNT = 112  # up to about 260 s
+
+
+class LatencyHistogram(object):
+    """
+    Log-scale latency histogram, percentiles are read within BUCKET_RATIO (about 19%) of the true value.
+    """
+    __slots__ = ('counts', 'count', 'total', 'max')
+
+    def __init__(self):
+        self.counts = [0] * BUCKETS_COUNT
+        self.count = 0
+        self.total = 0.
+        self.max = 0.
+
+    def add(self, seconds):
+        if seconds > MIN_LATENCY:
+            bucket = min(int(math.log(seconds / MIN_LATENCY, BUCKET_RATIO)), BUCKETS_COUNT - 1)
+        else:
+            bucket = 0
+        self.counts[bucket] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def merge(self, other):
+        # adds the latencies of other (a LatencyHistogram) to this one
+        self.counts = [count + other_count for count, other_count in zip(self.counts, other.counts)]
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def to_dict(self):
+        return {'counts': self.counts, 'count': self.count, 'total': self.total, 'max': self.max}
+
+    @staticmethod
+    def from_dict(state):
+        histogram = LatencyHistogram()
+        histogram.counts = list(state['counts'])
+        histogram.count = state['count']
+        histogram.total = state['total']
+        histogram.max = state['max']
+        return histogram
+
+    def percentile(self, p):
+        # type: (float) -> float
+        # upper bound of the bucket holding the p-th percentile (p in 0..100), capped to the largest latency seen
+        if self.count == 0:
+            return float('nan')
+        rank = int(math.ceil(p / 100. * self.count))
+        seen = 0
+        for bucket, count in enumerate(self.counts):
+            seen += count
+            if seen >= max(rank, 1):
+                return min(MIN_LATENCY * BUCKET_RATIO ** (bucket + 1), self.max)
+        return self.max
+
+
+class LatencyMetrics(object):
+
+    def __init__(self, file_name=None):
+        self.file_name = file_name
+        self.histograms = {}
+        # the file of this process in the histograms directory, named after the pid and the start time as pids are
+        # reused
+        self._state_name = '{0}-{1}.json'.format(os.getpid(), int(time.time() * 1000))
+
+    @staticmethod
+    def from_environment():
+        # a LatencyMetrics writing to $JAMEED_METRICS, None (metrics off) when it isn't set
+        file_name = os.environ.get('JAMEED_METRICS')
+        return LatencyMetrics(file_name) if file_name else None
+
+    def record(self, name, seconds):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = LatencyHistogram()
+        histogram.add(seconds)
+
+    def wrap(self, name, function):
+        # function timed under name
+        def timed(*args, **kwargs):
+            start = timer()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.record(name, timer() - start)
+        timed.__name__ = function.__name__
+        timed.__doc__ = function.__doc__
+        return timed
+
+    def instrument(self, obj, method_names, prefix):
+        # replaces the methods of obj (an instance) by timed ones, recorded as prefix + method name
+        for method_name in method_names:
+            setattr(obj, method_name, self.wrap(prefix + method_name, getattr(obj, method_name)))
+
+    def report(self, histograms=None):
+        # type: (dict) -> str
+        # histograms: name -> LatencyHistogram, the ones of this process by default
+        histograms = self.histograms if histograms is None else histograms
+        lines = ['# name count p50_ms p95_ms p99_ms max_ms mean_ms']
+        for name in sorted(histograms):
+            histogram = histograms[name]
+            lines.append('{0} {1} {2:.3f} {3:.3f} {4:.3f} {5:.3f} {6:.3f}'.format(
+                name, histogram.count, histogram.percentile(50) * 1e3, histogram.percentile(95) * 1e3,
+                histogram.percentile(99) * 1e3, histogram.max * 1e3, histogram.total / histogram.count * 1e3))
+        return '\n'.join(lines) + '\n'
+
+    def dump(self, file_name=None):
+        # saves the histograms of this process next to file_name (the metrics file by default) then writes the report
+        # of the histograms of every process saved there to file_name
+        file_name = file_name or self.file_name
+        directory = file_name + '.d'
+        if not os.path.isdir(directory):
+            try:
+                os.makedirs(directory)
+            except OSError:
+                if not os.path.isdir(directory):  # made by another process meanwhile otherwise
+                    raise
+        _write(os.path.join(directory, self._state_name),
+               json.dumps(dict((name, histogram.to_dict()) for name, histogram in self.histograms.items())))
+        _write(file_name, self.report(merged_histograms(directory)))
+
+    def dump_on_signal(self):
+        # dumps the metrics when the process receives SIGUSR1 (kill -USR1 <pid>), where there's such a signal
+        import signal
+        if hasattr(signal, 'SIGUSR1'):
+            signal.signal(signal.SIGUSR1, lambda signum, frame: self.dump())
+
+
+def merged_histograms(directory):
+    # name -> LatencyHistogram of all the processes which saved theirs in directory
+    histograms = {}
+    for state_name in sorted(os.listdir(directory)):
+        if not state_name.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(directory, state_name), 'r') as f:
+                state = json.load(f)
+        except (IOError, OSError, ValueError):
+            continue  # removed meanwhile
+        for name, histogram_state in state.items():
+            histogram = LatencyHistogram.from_dict(histogram_state)
+            if name in histograms:
+                histograms[name].merge(histogram)
+            else:
+                histograms[name] = histogram
+    return histograms
+
+
+def _write(file_name, text):
+    # through a temporary file of the process, so readers see the old file or the new one
+    tmp_file_name = '{0}.{1}.tmp'.format(file_name, os.getpid())
+    with open(tmp_file_name, 'w') as f:
+        f.write(text)
+    _replace_file(tmp_file_name, file_name)
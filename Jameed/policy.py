@@ -0,0 +1,142 @@
+"""
+Precompiled betting policies. The biased action sampling of Jameed weighs every action with a sigmoid of p_win (and of
+the risk for call/raise):
+    weight = a - b / (1 + exp(-c * (p_win - 0.5 + d - e * risk)))
+and draws the action with probability weight / sum of weights. A PolicyTable evaluates this mixture once over a grid
+of p_win (and risk) values in [0, 1] and keeps the cumulative action distribution of every grid point, so a decision
+is an index computation plus one uniform draw, without any exp.
+p_win and risk are rounded to the nearest grid point: with the default grids (P_WIN_STEPS, RISK_STEPS) and the
+coefficients of jameed.py the action probabilities are within TOLERANCE of the exact ones (see max_error). Steeper
+sigmoids need finer grids, compile_table refines them until the table is within TOLERANCE.
+"""
+import math
+import random
+from array import array
+
+P_WIN_STEPS = 2048
+RISK_STEPS = 128
+TOLERANCE = 0.01
+MAX_REFINEMENTS = 2  # each doubles both grids, 4 times finer grids are about 50 MB for 4 actions
+
+
+def action_weights(coefficients, p_win, risk=0.):
+    # unnormalized weight of every action, coefficients: one (a, b, c, d, e) per action. p_win and risk may be numpy
+    # arrays, the weights are then arrays of their broadcast shape
+    import numpy as np
+    with np.errstate(over='ignore'):  # exp overflowing to inf is a weight of a
+        return [a - b / (1. + np.exp(-c * (p_win - 0.5 + d - e * risk))) for a, b, c, d, e in coefficients]
+
+
+def compile_table(coefficients, risk_steps=RISK_STEPS, tolerance=TOLERANCE):
+    # type: (list, int, float) -> PolicyTable
+    # PolicyTable of the coefficients on the default grids, refined up to MAX_REFINEMENTS times until its max_error()
+    # is within tolerance. ValueError when it still isn't, or when the weights aren't a distribution (PolicyTable).
+    p_win_steps = P_WIN_STEPS
+    for refinement in range(MAX_REFINEMENTS + 1):
+        table = PolicyTable(coefficients, p_win_steps, risk_steps)
+        error = table.max_error()
+        if error <= tolerance:
+            return table
+        p_win_steps *= 2
+        risk_steps *= 2
+    raise ValueError('The policy {0} is {1:.3f} away from its table, more than {2}'.format(
+        table.coefficients, error, tolerance))
+
+
+class PolicyTable(object):
+    """
+    Cumulative action distributions of a sigmoid mixture over quantized p_win and risk. Actions are given by their
+    index in coefficients. risk_steps=0 makes a table of p_win only (the risk is then ignored).
+    The weights must be positive or zero with a positive sum at every grid point, otherwise the bounds aren't
+    monotone (or not defined) and ValueError is raised.
+    """
+
+    def __init__(self, coefficients, p_win_steps=P_WIN_STEPS, risk_steps=RISK_STEPS):
+        import numpy as np
+        self.coefficients = [tuple(float(x) for x in action) for action in coefficients]
+        self.actions_count = len(self.coefficients)
+        self.p_win_steps = p_win_steps
+        self.risk_steps = risk_steps
+        p_win = np.linspace(0., 1., p_win_steps + 1)[:, None]
+        risk = np.linspace(0., 1., risk_steps + 1)[None, :] if risk_steps else np.zeros((1, 1))
+        weights = np.stack(np.broadcast_arrays(*action_weights(self.coefficients, p_win, risk)), axis=-1)
+        invalid = ~(weights >= 0.)  # nan included
+        if invalid.any():
+            i, j, action = np.argwhere(invalid)[0]
+            raise ValueError('The policy {0} weighs action {1} {2} at p_win={3:.4f}, risk={4:.4f}'.format(
+                self.coefficients, action, weights[i, j, action], p_win[i, 0], risk[0, j]))
+        cumulative = np.cumsum(weights, axis=-1)
+        if not (cumulative[..., -1] > 0.).all():
+            i, j = np.argwhere(~(cumulative[..., -1] > 0.))[0]
+            raise ValueError('The policy {0} weighs no action at p_win={1:.4f}, risk={2:.4f}'.format(
+                self.coefficients, p_win[i, 0], risk[0, j]))
+        cumulative /= cumulative[..., -1:]
+        # the last bound is always 1, only the first actions_count - 1 ones are kept, one row per grid point, as
+        # single precision floats: an array for decide() and a numpy view of it for the batch decisions
+        self._bounds = array('f', cumulative[..., :-1].astype(np.float32).tobytes())
+        self.cumulative = np.frombuffer(self._bounds, dtype=np.float32).reshape(-1, self.actions_count - 1)
+
+    def _row(self, p_win, risk):
+        # index of the grid point nearest to (p_win, risk), both clipped to [0, 1]
+        i = int(min(max(p_win, 0.), 1.) * self.p_win_steps + 0.5)
+        if not self.risk_steps:
+            return i
+        return i * (self.risk_steps + 1) + int(min(max(risk, 0.), 1.) * self.risk_steps + 0.5)
+
+    def _rows(self, p_win, risk):
+        # _row() over numpy arrays
+        import numpy as np
+        rows = (np.clip(np.asarray(p_win, dtype=np.float64), 0., 1.) * self.p_win_steps + 0.5).astype(np.int64)
+        if not self.risk_steps:
+            return rows
+        risk = np.clip(np.asarray(0. if risk is None else risk, dtype=np.float64), 0., 1.)
+        return rows * (self.risk_steps + 1) + (risk * self.risk_steps + 0.5).astype(np.int64)
+
+    def decide(self, p_win, risk=0., u=None):
+        # type: (float, float, float) -> int
+        # index of the sampled action, u: the uniform draw in [0, 1) (random.random() by default)
+        if u is None:
+            u = random.random()
+        bounds = self._bounds
+        start = self._row(p_win, risk) * (self.actions_count - 1)
+        for action in range(self.actions_count - 1):
+            if u < bounds[start + action]:
+                return action
+        return self.actions_count - 1
+
+    def decide_batch(self, p_win, risk=None, random_state=None):
+        # decide() over arrays: p_win and risk (broadcast against each other) -> array of action indices.
+        # random_state: a numpy RandomState (or seed) the uniform draws are taken from
+        import numpy as np
+        if not isinstance(random_state, np.random.RandomState):
+            random_state = np.random.RandomState(random_state)
+        rows = self._rows(p_win, risk)
+        u = random_state.random_sample(rows.shape)
+        return (u[..., None] >= self.cumulative[rows]).sum(axis=-1)
+
+    def probabilities(self, p_win, risk=0.):
+        # type: (float, float) -> list
+        # action probabilities of the table at (p_win, risk)
+        start = self._row(p_win, risk) * (self.actions_count - 1)
+        bounds = [0.] + list(self._bounds[start:start + self.actions_count - 1]) + [1.]
+        return [bounds[i + 1] - bounds[i] for i in range(self.actions_count)]
+
+    def exact_probabilities(self, p_win, risk=0.):
+        # type: (float, float) -> list
+        # action probabilities of the sigmoid mixture itself
+        weights = [a - b / (1. + math.exp(min(-c * (p_win - 0.5 + d - e * (risk if self.risk_steps else 0.)), 700.)))
+                   for a, b, c, d, e in self.coefficients]
+        return [weight / sum(weights) for weight in weights]
+
+    def max_error(self, samples=100000, seed=0):
+        # type: (int, int) -> float
+        # largest difference between a table and an exact action probability over random (p_win, risk) points
+        import numpy as np
+        random_state = np.random.RandomState(seed)
+        p_win = random_state.random_sample(samples)
+        risk = random_state.random_sample(samples) if self.risk_steps else np.zeros(samples)
+        rows = self._rows(p_win, risk)
+        weights = np.stack(action_weights(self.coefficients, p_win, risk), axis=-1)
+        exact = weights / weights.sum(axis=-1)[:, None]
+        bounds = np.hstack([np.zeros((samples, 1)), self.cumulative[rows], np.ones((samples, 1))])
+        return float(np.abs(np.diff(bounds, axis=-1) - exact).max())
@@ -0,0 +1,39 @@
+# Headless games on the in-process engine (see engine), the replacement of the server runs of test/test-2p. Run it from
+# this directory (Jameed loads ./hands.bin, ./bins.json and the stats from here). The tables are loaded (and on a cold
+# start, without ./tables.bin, built) before the games and timed on their own, the games/s are those of warm bots.
+# usage: python selfplay.py [--games N] [--opponent random|jameed] [--coefficients file.json] [--processes N]
+import argparse
+import os
+import time
+
+from engine import JameedBot, RandomBot, play_games
+from jameed import load_coefficients, load_tables
+
+parser = argparse.ArgumentParser(description='Jameed headless self-play')
+parser.add_argument('--games', type=int, default=1000)
+parser.add_argument('--opponent', default='random', help='random (the Client.py random client) or jameed')
+parser.add_argument('--coefficients', help='coefficients of Jameed (see tuning), the defaults otherwise')
+parser.add_argument('--seed', type=int, default=0, help='seed of the first game, the next ones follow')
+parser.add_argument('--chips', type=int, default=200)
+parser.add_argument('--ante', type=int, default=10)
+parser.add_argument('--max-rounds', type=int, default=100)
+parser.add_argument('--processes', type=int, help='worker processes, all cores by default')
+args = parser.parse_args()
+if args.opponent not in ('random', 'jameed'):
+    parser.error('unknown opponent {0}'.format(args.opponent))
+
+coefficients = load_coefficients(args.coefficients) if args.coefficients else {}
+opponent = (RandomBot, {}) if args.opponent == 'random' else (JameedBot, {'name': 'Baseline', 'coefficients': {}})
+start = time.time()
+cold = not os.path.exists('./tables.bin')
+load_tables()  # play_games would otherwise load them, its forked workers inherit them
+print 'Tables {0} in {1:.1f}s'.format('built' if cold else 'loaded', time.time() - start)
+start = time.time()
+results = play_games([(JameedBot, {'coefficients': coefficients}), opponent],
+                     range(args.seed, args.seed + args.games), args.processes,
+                     chips=args.chips, ante=args.ante, max_rounds=args.max_rounds)
+elapsed = time.time() - start
+wins = sum(1 for seed, chips in results if chips[0] > chips[1])
+mean = sum(chips[0] for seed, chips in results) / float(len(results)) - args.chips
+print '{0} games in {1:.1f}s ({2:.0f} games/s)'.format(len(results), elapsed, len(results) / elapsed)
+print 'Jameed won {0} ({1:.1f}%), {2:+.1f} chips per game'.format(wins, 100. * wins / len(results), mean)
@@ -0,0 +1,96 @@
+# Tests of the compiled betting policies (policy) and of the self-play engine (engine).
+# Run from the Jameed directory (Jameed loads ./hands.bin, ./bins.json and the stats from there):
+#     python -m unittest discover tests (or pytest tests)
+import os
+import random
+import shutil
+import sys
+import tempfile
+import unittest
+
+JAMEED_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, JAMEED_DIR)
+sys.path.insert(0, os.path.join(JAMEED_DIR, '..', 'Learner'))
+
+import policy
+from engine import Game, JameedBot, RandomBot
+from jameed import compile_policies, default_coefficients
+
+HAND_TABLE = './hands.bin'
+
+
+class PolicyTableTest(unittest.TestCase):
+
+    def test_default_policies_within_tolerance(self):
+        for table in compile_policies(default_coefficients()):
+            self.assertLessEqual(table.max_error(), policy.TOLERANCE)
+            rng = random.Random(0)
+            for i in range(200):
+                p_win, risk = rng.random(), rng.random()
+                for p, exact in zip(table.probabilities(p_win, risk), table.exact_probabilities(p_win, risk)):
+                    self.assertAlmostEqual(p, exact, delta=policy.TOLERANCE)
+
+    def test_decide_follows_probabilities(self):
+        table = compile_policies(default_coefficients())[1]
+        rng = random.Random(1)
+        counts = [0] * table.actions_count
+        for i in range(20000):
+            counts[table.decide(0.6, 0.3, u=rng.random())] += 1
+        for count, p in zip(counts, table.probabilities(0.6, 0.3)):
+            self.assertAlmostEqual(count / 20000., p, delta=0.015)
+
+    def test_steep_policy_is_refined(self):
+        table = policy.compile_table([(1., 0., 0., 0., 0.), (1., 1., 800., 0., 0.)], risk_steps=0)
+        self.assertGreater(table.p_win_steps, policy.P_WIN_STEPS)
+        self.assertLessEqual(table.max_error(), policy.TOLERANCE)
+
+    def test_negative_weights_are_rejected(self):
+        self.assertRaises(ValueError, policy.compile_table, [(1., 0., 0., 0., 0.), (-1., 0.5, 3., 0., 0.)])
+        self.assertRaises(ValueError, policy.compile_table, [(0., 0., 0., 0., 0.), (0., 0., 0., 0., 0.)])
+
+    def test_sweep_rejects_negative_weights(self):
+        from tuning import Sweep
+        directory = tempfile.mkdtemp()
+        try:
+            sweep = Sweep.create(os.path.join(directory, 'sweep'), [{'OPEN_ACTION_A_CHECK': -100.}, {}], games=2)
+            self.assertEqual(len(sweep.rejected), 1)
+            self.assertEqual(list(sweep.rejected.values())[0][0], {'OPEN_ACTION_A_CHECK': -100.})
+        finally:
+            shutil.rmtree(directory)
+
+
+class CheckedGame(Game):
+    # checks after every round that the chips in the stacks and in the carried pot add up to the chips dealt
+
+    def _play_round(self, round_number, seated):
+        Game._play_round(self, round_number, seated)
+        assert min(self.stacks) >= 0, 'Negative stack {0}'.format(self.stacks)
+        assert sum(self.stacks) + sum(self._carried) == self.total, 'Chips lost in round {0}'.format(round_number)
+
+
+@unittest.skipUnless(os.path.exists(HAND_TABLE), 'needs the hand table (hands.bin) in the current directory')
+class EngineTest(unittest.TestCase):
+
+    def play(self, bots, seeds, chips=200):
+        for seed in seeds:
+            game = CheckedGame(bots, seed, chips=chips, ante=10, max_rounds=100)
+            game.total = chips * len(bots)
+            stacks = game.play()
+            self.assertEqual(sum(stacks), chips * len(bots), seed)
+            self.assertTrue(1 <= game.rounds <= 100)
+
+    def test_random_bots(self):
+        self.play([RandomBot('R{0}'.format(i)) for i in range(2)], range(50))
+        self.play([RandomBot('R{0}'.format(i)) for i in range(5)], range(20), chips=100)
+
+    def test_jameed_bots(self):
+        self.play([JameedBot(), RandomBot()], range(20))
+        self.play([JameedBot(), JameedBot('Baseline'), RandomBot('R1'), RandomBot('R2')], range(5))
+
+    def test_games_are_reproducible(self):
+        results = [Game([JameedBot(), RandomBot()], 7).play() for i in range(2)]
+        self.assertEqual(results[0], results[1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+# Coefficient sweep (see tuning): candidates play simulated games against the default coefficients on every core and
+# are ranked by chip EV. Run it from this directory (Jameed loads ./hands.bin, ./bins.json and the stats from here).
+# usage: python tune.py sweep_dir [--space space.json [--samples N]] [--games N] [--processes N]
+# A new sweep needs --space, a JSON {coefficient name: [values] or {"low": x, "high": y[, "log": true]}}; running the
+# command again on the same directory resumes it. The best candidate can be used with
+#     cp sweep_dir/coefficients/<candidate>.json ./coefficients.json
+import argparse
+import json
+import os
+import sys
+
+from tuning import Sweep, candidates_from_space
+
+parser = argparse.ArgumentParser(description='Jameed coefficient sweep')
+parser.add_argument('directory', help='sweep directory, created or resumed')
+parser.add_argument('--space', help='JSON search space of a new sweep')
+parser.add_argument('--samples', type=int, help='random candidates drawn from the space, all the grid by default')
+parser.add_argument('--games', type=int, default=1000, help='games per candidate and seat')
+parser.add_argument('--chunk-size', type=int, default=50)
+parser.add_argument('--seed', type=int, default=0)
+parser.add_argument('--chips', type=int, default=200)
+parser.add_argument('--ante', type=int, default=10)
+parser.add_argument('--max-rounds', type=int, default=100)
+parser.add_argument('--processes', type=int, help='worker processes, all cores by default')
+parser.add_argument('--top', type=int, default=10, help='candidates listed')
+args = parser.parse_args()
+
+if os.path.exists(os.path.join(args.directory, 'sweep.json')):
+    sweep = Sweep(args.directory)
+    print 'Resuming {0}: {1} candidates, {2} games each'.format(args.directory, len(sweep.candidates), sweep.games)
+elif args.space:
+    with open(args.space, 'r') as f:
+        space = json.load(f)
+    sweep = Sweep.create(args.directory, candidates_from_space(space, args.samples, args.seed), args.games,
+                         args.chunk_size, args.seed,
+                         {'chips': args.chips, 'ante': args.ante, 'max_rounds': args.max_rounds})
+    print 'Started {0}: {1} candidates, {2} games each'.format(args.directory, len(sweep.candidates), sweep.games)
+    if sweep.rejected:
+        print '{0} candidates rejected, their policies are too steep for the tables (see sweep.json)'.format(
+            len(sweep.rejected))
+else:
+    parser.error('{0} holds no sweep, give a --space'.format(args.directory))
+
+
+def progress(done, total):
+    sys.stdout.write('\r{0}/{1} chunks'.format(done, total))
+    sys.stdout.flush()
+
+
+sweep.run(args.processes, progress)
+print
+print '{0:<14}{1:>8}{2:>12}{3:>10}  {4}'.format('candidate', 'games', 'chip EV', '95% CI', 'coefficients')
+for c_id, overrides, games, ev, half_width in sweep.ranking()[:args.top]:
+    print '{0:<14}{1:>8}{2:>12.2f}{3:>10.2f}  {4}'.format(c_id, games, ev, half_width,
+                                                         json.dumps(overrides, sort_keys=True) if overrides else
+                                                         '(defaults)')
@@ -0,0 +1,212 @@
+"""
+Offline tuning of the Jameed coefficients (the THRESHOLD_*, OPEN_ACTION_*, CALL_RAISE_ACTION_* and OPEN_AMOUNT_*
+constants, see jameed.default_coefficients). Candidates drawn from a search space play heads-up games (see engine)
+against the default coefficients on every core and are ranked by chip EV, the mean chips won per game, with a 95% confidence
+interval.
+Every game seed is played twice with the seats swapped and every candidate plays the same seeds, so the deals (not the
+decisions, which stay random) are common to all candidates and to both seats.
+A sweep lives in a directory: sweep.json (settings and candidates), coefficients/<candidate>.json (the full
+coefficients of each candidate, what Jameed(coefficients=load_coefficients(...)) or ./coefficients.json loads) and
+results.jsonl (one line per finished chunk of games). Running a sweep again resumes it: finished chunks are skipped.
+Candidates whose policies can't be compiled within policy.TOLERANCE (see jameed.compile_policies) are not played: the
+ranking would score the quantized policy rather than the coefficients saved.
+"""
+import hashlib
+import itertools
+import json
+import math
+import os
+import random
+
+from engine import GAME_SETTINGS, JameedBot, play_game
+from jameed import compile_policies, default_coefficients, load_tables, save_coefficients
+
+
+def candidate_id(overrides):
+    # type: (dict) -> str
+    return hashlib.sha1(json.dumps(overrides, sort_keys=True).encode('utf-8')).hexdigest()[:12]
+
+
+def candidates_from_space(space, samples=None, seed=0):
+    # Candidate coefficient overrides from a search space, {name: [values]} for a list of values to try and
+    # {name: {'low': x, 'high': y}} for a range sampled uniformly ('log': true to sample its logarithm). Without samples
+    # every combination of the lists is a candidate (the space must then only hold lists), otherwise samples candidates
+    # are drawn at random. The defaults ({}) are always the first candidate.
+    known = default_coefficients()
+    unknown = sorted(set(space) - set(known))
+    if unknown:
+        raise ValueError('Unknown coefficients: {0}'.format(', '.join(unknown)))
+    names = sorted(space)
+    candidates = [{}]
+    if samples is None:
+        if any(not isinstance(space[name], list) for name in names):
+            raise ValueError('A grid search space only holds lists of values, give a number of samples')
+        for values in itertools.product(*[space[name] for name in names]):
+            candidates.append(dict(zip(names, values)))
+    else:
+        rng = random.Random(seed)
+        for i in range(samples):
+            candidates.append(dict((name, _sample(space[name], rng)) for name in names))
+    unique = []
+    for overrides in candidates:
+        if overrides not in unique:
+            unique.append(overrides)
+    return unique
+
+
+def _sample(dimension, rng):
+    if isinstance(dimension, list):
+        return rng.choice(dimension)
+    if dimension.get('log'):
+        return math.exp(rng.uniform(math.log(dimension['low']), math.log(dimension['high'])))
+    return rng.uniform(dimension['low'], dimension['high'])
+
+
+class Sweep(object):
+    """
+    A resumable sweep in directory. create() starts one, Sweep(directory) opens an existing one.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, 'sweep.json'), 'r') as f:
+            settings = json.load(f)
+        self.candidates = settings['candidates']  # id -> overrides
+        self.games = settings['games']
+        self.chunk_size = settings['chunk_size']
+        self.seed = settings['seed']
+        self.game_settings = settings['game_settings']
+        self.rejected = settings.get('rejected', {})  # id -> [overrides, reason], candidates left out
+
+    @staticmethod
+    def create(directory, candidates, games=1000, chunk_size=50, seed=0, game_settings=None):
+        # type: (str, list, int, int, int, dict) -> Sweep
+        # candidates: coefficient overrides (see candidates_from_space), games: seeds played by each candidate (twice,
+        # once per seat), in chunks of chunk_size. The candidates compile_policies refuses are rejected.
+        if os.path.exists(os.path.join(directory, 'sweep.json')):
+            raise ValueError('{0} already holds a sweep'.format(directory))
+        if not os.path.isdir(os.path.join(directory, 'coefficients')):
+            os.makedirs(os.path.join(directory, 'coefficients'))
+        settings = {'candidates': {}, 'rejected': {}, 'games': games, 'chunk_size': chunk_size, 'seed': seed,
+                    'game_settings': dict(GAME_SETTINGS, **(game_settings or {}))}
+        for overrides in candidates:
+            c_id = candidate_id(overrides)
+            coefficients = default_coefficients()
+            coefficients.update(overrides)
+            try:
+                compile_policies(coefficients)
+            except ValueError as e:
+                settings['rejected'][c_id] = [overrides, str(e)]
+                continue
+            settings['candidates'][c_id] = overrides
+            save_coefficients(coefficients, os.path.join(directory, 'coefficients', c_id + '.json'))
+        with open(os.path.join(directory, 'sweep.json'), 'w') as f:
+            json.dump(settings, f, indent=2, sort_keys=True)
+        return Sweep(directory)
+
+    def _results_file_name(self):
+        return os.path.join(self.directory, 'results.jsonl')
+
+    def results(self):
+        # finished chunks, {(candidate id, chunk): result}
+        results = {}
+        if not os.path.exists(self._results_file_name()):
+            return results
+        with open(self._results_file_name(), 'r') as f:
+            for line in f:
+                try:
+                    result = json.loads(line)
+                except ValueError:
+                    continue  # the last line of an interrupted run
+                results[(result['candidate'], result['chunk'])] = result
+        return results
+
+    def pending_tasks(self):
+        done = self.results()
+        tasks = []
+        for chunk, start in enumerate(range(0, self.games, self.chunk_size)):
+            seeds = [self.seed * 1000003 + i for i in range(start, min(start + self.chunk_size, self.games))]
+            for c_id in sorted(self.candidates):
+                if (c_id, chunk) not in done:
+                    tasks.append((c_id, self.candidates[c_id], chunk, seeds, self.game_settings))
+        return tasks
+
+    def run(self, processes=None, progress=None):
+        # plays the pending chunks on a pool of processes (all cores by default), progress(done, total) is called as
+        # chunks finish. Stopping the run loses the chunks being played only.
+        import multiprocessing
+        tasks = self.pending_tasks()
+        if not tasks:
+            return
+        load_tables()  # built (when missing) once here rather than by every worker at once
+        if processes == 1:
+            results = (_play_chunk(task) for task in tasks)
+            pool = None
+        else:
+            pool = multiprocessing.Pool(processes)
+            results = pool.imap_unordered(_play_chunk, tasks)
+        file_name = self._results_file_name()
+        if os.path.exists(file_name) and os.path.getsize(file_name):
+            with open(file_name, 'rb') as f:
+                f.seek(-1, os.SEEK_END)
+                complete = f.read(1) == b'\n'
+            if not complete:
+                with open(file_name, 'a') as f:
+                    f.write('\n')  # after the cut line of an interrupted run
+        try:
+            with open(file_name, 'a') as f:
+                for done, result in enumerate(results):
+                    f.write(json.dumps(result, sort_keys=True) + '\n')
+                    f.flush()
+                    if progress is not None:
+                        progress(done + 1, len(tasks))
+        finally:
+            if pool is not None:
+                pool.terminate()
+                pool.join()
+
+    def ranking(self):
+        # [(candidate id, overrides, games, chip EV, 95% interval half width)] from the best chip EV down
+        totals = dict((c_id, [0, 0., 0.]) for c_id in self.candidates)
+        for (c_id, chunk), result in self.results().items():
+            if c_id in totals:
+                total = totals[c_id]
+                total[0] += result['games']
+                total[1] += result['sum']
+                total[2] += result['sum2']
+        ranking = []
+        for c_id, (n, total, total2) in totals.items():
+            if n == 0:
+                continue
+            mean = total / n
+            variance = max(total2 / n - mean ** 2, 0.) * n / (n - 1) if n > 1 else float('inf')
+            ranking.append((c_id, self.candidates[c_id], n, mean, 1.96 * math.sqrt(variance / n)))
+        ranking.sort(key=lambda item: -item[3])
+        return ranking
+
+
+# bots of a worker process, by candidate id ('baseline' for the opponent of the candidates, a bot of its own even
+# when a candidate has the default coefficients)
+_players = {}
+
+
+def _player(key, overrides):
+    player = _players.get(key)
+    if player is None:
+        player = _players[key] = JameedBot('Baseline' if key == 'baseline' else 'Candidate', overrides)
+    return player
+
+
+def _play_chunk(task):
+    c_id, overrides, chunk, seeds, game_settings = task
+    candidate = _player(c_id, overrides)
+    baseline = _player('baseline', {})
+    total, total2 = 0., 0.
+    for seed in seeds:
+        # the candidate chips won in both seats, halved
+        first = play_game([candidate, baseline], seed, **game_settings)[0]
+        second = play_game([baseline, candidate], seed, **game_settings)[1]
+        won = (first + second) / 2. - game_settings['chips']
+        total += won
+        total2 += won * won
+    return {'candidate': c_id, 'chunk': chunk, 'games': len(seeds), 'sum': total, 'sum2': total2}
@@ -0,0 +1,37 @@
+# Runs the learner micro-benchmarks (see learner.bench) and writes the results as JSON
+# usage: python benchmark.py [--output results.json] [--baseline baseline.json] [--tolerance 0.2] [benchmark ...]
+# exits with status 1 when a benchmark is slower than its baseline by more than the tolerance
+# runs on python 2 and 3, the memory figures need python 3 (tracemalloc)
+import argparse
+import sys
+
+from learner.bench import BENCHMARKS, compare, load_results, run_benchmarks, save_results
+
+parser = argparse.ArgumentParser(description='Learner micro-benchmarks')
+parser.add_argument('benchmarks', nargs='*', help='benchmarks to run, all by default: ' + ', '.join(BENCHMARKS))
+parser.add_argument('--output', default='./benchmark.json', help='JSON file the results are written to')
+parser.add_argument('--baseline', help='JSON results to compare with')
+parser.add_argument('--tolerance', type=float, default=0.2, help='allowed slowdown against the baseline')
+parser.add_argument('--hand-table', default='./hands.bin')
+parser.add_argument('--hands-json', help='also time Hand.load_hands_dict on this hands.json')
+parser.add_argument('--bins', default='./bins.json')
+parser.add_argument('--stats', default='./stats_dump')
+args = parser.parse_args()
+for name in args.benchmarks:
+    if name not in BENCHMARKS:
+        parser.error('unknown benchmark {0}'.format(name))
+
+results = run_benchmarks({'hand_table': args.hand_table, 'hands_json': args.hands_json, 'bins': args.bins,
+                          'stats': args.stats}, args.benchmarks or None)
+save_results(results, args.output)
+for name, result in results.items():
+    print('{0:<16}{1:>14,.0f} ops/s {2:>12} blocks/op {3:>14} peak bytes'.format(
+        name, result['ops_per_sec'], 'n/a' if result['allocated_blocks'] is None else
+        '{0:.3f}'.format(result['allocated_blocks']), 'n/a' if result['peak_memory'] is None else
+        result['peak_memory']))
+if args.baseline:
+    regressions = compare(results, load_results(args.baseline), args.tolerance)
+    for name, ops_per_sec, baseline_ops_per_sec in regressions:
+        print('{0} regressed: {1:,.0f} ops/s, baseline {2:,.0f} ops/s'.format(name, ops_per_sec, baseline_ops_per_sec))
+    if regressions:
+        sys.exit(1)
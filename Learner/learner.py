@@ -1,10 +1,17 @@
 from learner.player import Player
 from learner.card import Card, Deck, Hand, HandType, HandValue, CustomEncoder, as_enum
 from learner.stats import StatBuilder,SBin
+from learner.table import convert_hands_json
+from learner.stats_table import convert_stats_dump
+from learner.generator import generate_hand_table
+from learner.exhaustive import exhaustive_stats
 
+import os
 import time
 
-Hand.load_hands_dict('./hands.json')
+# convert_hands_json('./hands.json', './hands.bin')
+# generate_hand_table('./hands.bin')
+Hand.load_hand_table('./hands.bin')
 hand = Hand(cards_string='KH,QC,JD,9D,8D')
 
 result = hand.is_potential_straight()
@@ -16,6 +23,7 @@ exit()
 # StatBuilder.define_bins()
 StatBuilder.load_bins('./bins.json')
 StatBuilder.load_stats('./stats_dump')
+# convert_stats_dump('./stats_dump', './stats.bin', StatBuilder.bins)
 # print StatBuilder.bins
 # hand = Hand(cards_string='9C,8C,6C,5D,3D')
 # hbin = StatBuilder.bin_hand(hand)
@@ -32,17 +40,24 @@ StatBuilder.load_stats('./stats_dump')
 # exit()
 t = time.time()
 sb = StatBuilder(no_of_players=2)
-import random
-for i in range(1000000):
-    #s = random.random()
-    #print "s = ", s
-    if i%1000 == 0:
-        print '{:,} complete!'.format(i)
-    sb.simulate_deal()
-    #print '#'*15
+# checkpointed so an interrupted run resumes where it stopped when started again
+sb.simulate_checkpointed(1000000, './stats_checkpoint')
+# sb.simulate_parallel(1000000)
+# sb.simulate_batch(1000000)  # vectorized, no checkpoints
+# exhaustive_stats(StatBuilder.bins, StatBuilder.bin_index, Hand._hand_table.records()).dump('./stats_dump')  # exact
+# import random
+# for i in range(1000000):
+#     #s = random.random()
+#     #print "s = ", s
+#     if i%1000 == 0:
+#         print '{:,} complete!'.format(i)
+#     sb.simulate_deal()
+#     #print '#'*15
 
 sb.print_stats()
 sb.dump_stats('./stats_dump')
+sb.dump_stats_table('./stats.bin')  # what Jameed loads
+os.remove('./stats_checkpoint')  # the run is in stats_dump now
 
 # idx, hand_id = hand.is_potential_flush()
 # idx, s_type, hand_id = hand.is_potential_straight()
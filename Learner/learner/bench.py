@@ -0,0 +1,185 @@
+"""
+Micro-benchmarks of the learner hot paths. Every benchmark is a setup function taking the data files and returning
+(run, ops): run() performs ops operations on inputs drawn from fixed seeds, so two runs of a benchmark do the same work.
+Results are dicts, ready to be dumped as JSON:
+    ops_per_sec: best of the timed repeats
+    allocated_blocks: memory blocks allocated by a run and still allocated after it, per operation (caches filling up
+        show here)
+    peak_memory: peak of the memory allocated by a run, in bytes (what it allocated at the worst point, the inputs
+        and whatever was allocated before the run excluded)
+The memory figures are traced with tracemalloc (python 3, run benchmark.py with python 3), they are None without it.
+"""
+import gc
+import json
+import random
+import sys
+from collections import OrderedDict
+
+from timeit import default_timer as timer
+
+from learner.card import Deck, Hand
+from learner.stats import StatBuilder
+
+SEED = 0
+HANDS_COUNT = 20000
+
+
+def _random_hands(count=HANDS_COUNT):
+    deck_cards = list(range(52))
+    return [random.sample(deck_cards, 5) for i in range(count)]
+
+
+def _evaluate_hand(files):
+    hands = [Hand(cards_id=cards_id) for cards_id in _random_hands(2000)]
+
+    def run():
+        for hand in hands:
+            hand.evaluate_hand()
+    return run, len(hands)
+
+
+def _hand_value(files):
+    hands = [Hand(cards_id=cards_id) for cards_id in _random_hands()]
+
+    def run():
+        # cold cache: every hand is read from the table (or dict) and frozen
+        Hand._hand_value_cache.clear()
+        for hand in hands:
+            hand._hand_value = None
+            hand.hand_value
+    return run, len(hands)
+
+
+def _bin_hand(files):
+    hands = [Hand(cards_id=cards_id) for cards_id in _random_hands()]
+    for hand in hands:
+        hand.hand_value
+
+    def run():
+        for hand in hands:
+            StatBuilder.bin_hand(hand)
+    return run, len(hands)
+
+
+def _deck(files):
+    count = 10000
+
+    def run():
+        for i in range(count):
+            deck = Deck()
+            deck.deal_cards(5)
+            deck.deal_cards(5)
+            deck.copy()
+    return run, count
+
+
+def _draw(files):
+    hands = [Hand(cards_id=cards_id) for cards_id in _random_hands(5000)]
+    strategies = [random.choice([[4], [4, 3], [4, 3, 2]]) for hand in hands]
+    cards = [list(hand.cards) for hand in hands]
+
+    def run():
+        deck = Deck()
+        for hand, hand_cards, strategy in zip(hands, cards, strategies):
+            hand.cards = list(hand_cards)
+            hand.sort_hand()
+            hand._hand_value = None
+            deck.restore(0)
+            hand.draw(deck, strategy)
+    return run, len(hands)
+
+
+def _simulate_deal(files):
+    count = 500
+    sb = StatBuilder(no_of_players=2)
+
+    def run():
+        for i in range(count):
+            sb.simulate_deal()
+    return run, count
+
+
+def _startup(files):
+    def run():
+        if files.get('hands_json'):
+            Hand.load_hands_dict(files['hands_json'])
+        Hand.load_hand_table(files['hand_table'])
+        StatBuilder.load_bins(files['bins'])
+        StatBuilder.load_stats(files['stats'])
+    return run, 1
+
+
+BENCHMARKS = OrderedDict([
+    ('evaluate_hand', _evaluate_hand),
+    ('hand_value', _hand_value),
+    ('bin_hand', _bin_hand),
+    ('deck', _deck),
+    ('draw', _draw),
+    ('simulate_deal', _simulate_deal),
+    ('startup', _startup),
+])
+
+
+def run_benchmarks(files, names=None, repeat=3):
+    # files: dict with the paths of 'hand_table', 'bins', 'stats' and optionally 'hands_json' (startup also loads the
+    # old json dict when given)
+    Hand.load_hand_table(files['hand_table'])
+    StatBuilder.load_bins(files['bins'])
+    results = OrderedDict()
+    for name in names or BENCHMARKS:
+        random.seed(SEED)
+        run, ops = BENCHMARKS[name](files)
+        run()  # warm up (imports, lazily built tables)
+        best = float('inf')
+        for i in range(repeat):
+            random.seed(SEED)
+            start = timer()
+            run()
+            best = min(best, timer() - start)
+        allocated_blocks, peak_memory = _memory(run)
+        results[name] = OrderedDict([('ops', ops), ('seconds', best), ('ops_per_sec', ops / best if best else None),
+                                     ('allocated_blocks', None if allocated_blocks is None else
+                                      float(allocated_blocks) / ops),
+                                     ('peak_memory', peak_memory)])
+    StatBuilder.load_bins(files['bins'])  # the benchmarks may have gathered stats
+    return results
+
+
+def _memory(run):
+    # (blocks a run left allocated, peak of the memory it allocated), (None, None) without tracemalloc
+    try:
+        import tracemalloc
+    except ImportError:
+        return None, None
+    gc.collect()
+    random.seed(SEED)
+    # only what's allocated once tracing started is traced, the peak is the run's own
+    tracemalloc.start()
+    try:
+        blocks = sys.getallocatedblocks()
+        run()
+        gc.collect()
+        allocated_blocks = max(0, sys.getallocatedblocks() - blocks)
+        peak_memory = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return allocated_blocks, peak_memory
+
+
+def compare(results, baseline, tolerance=0.2):
+    # names of the benchmarks slower than (1 - tolerance) times their baseline ops_per_sec, with both figures
+    regressions = []
+    for name, result in results.items():
+        if name in baseline and result['ops_per_sec'] < baseline[name]['ops_per_sec'] * (1 - tolerance):
+            regressions.append((name, result['ops_per_sec'], baseline[name]['ops_per_sec']))
+    return regressions
+
+
+def save_results(results, file_name):
+    with open(file_name, 'w') as f:
+        json.dump(results, f, indent=2)
+
+
+def load_results(file_name):
+    with open(file_name, 'r') as f:
+        return json.load(f, object_pairs_hook=OrderedDict)
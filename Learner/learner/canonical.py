@@ -0,0 +1,90 @@
+"""
+Suit isomorphism: hands that only differ by a renaming of the suits (one of the 24 permutations of the 4 suits) have
+the same strength, bin and draw odds. The canonical representative of a hand is the one with the smallest hand index
+(see learner.index) among its 24 suit renamings; there are CANONICAL_HANDS_COMBINATIONS of them.
+A card int value is suit * 13 + rank, renaming the suits with permutation p maps it to p[suit] * 13 + rank.
+"""
+import itertools
+
+from learner.index import HANDS_COMBINATIONS, hand_from_index, hand_index
+
+CANONICAL_HANDS_COMBINATIONS = 134459
+
+SUIT_PERMUTATIONS = list(itertools.permutations(range(4)))
+# index of the inverse of each permutation
+INVERSE_PERMUTATIONS = [SUIT_PERMUTATIONS.index(tuple(permutation.index(suit) for suit in range(4)))
+                        for permutation in SUIT_PERMUTATIONS]
+
+
+def rename_card(card_id, permutation):
+    # type: (int, int) -> int
+    # card int value renamed by SUIT_PERMUTATIONS[permutation]
+    return SUIT_PERMUTATIONS[permutation][card_id // 13] * 13 + card_id % 13
+
+
+def canonical_index(cards_id):
+    # type: (list[int]) -> tuple
+    # (hand index of the canonical representative, index of the permutation mapping the hand onto it), the first
+    # permutation when several do
+    best_index, best_permutation = HANDS_COMBINATIONS, -1
+    for p, permutation in enumerate(SUIT_PERMUTATIONS):
+        index = hand_index([permutation[card_id // 13] * 13 + card_id % 13 for card_id in cards_id])
+        if index < best_index:
+            best_index, best_permutation = index, p
+    return best_index, best_permutation
+
+
+def canonical_hand(cards_id):
+    # type: (list[int]) -> tuple
+    # (card int values of the canonical representative in ascending order, permutation as in canonical_index). The
+    # cards of the hand are recovered with rename_card(card_id, INVERSE_PERMUTATIONS[permutation])
+    index, permutation = canonical_index(cards_id)
+    return hand_from_index(index), permutation
+
+
+def _card_maps():
+    # (24, 52) array, the card int value each card is renamed to by each suit permutation
+    import numpy as np
+    global _maps
+    if _maps is None:
+        cards = np.arange(52)
+        _maps = np.array([np.array(permutation)[cards // 13] * 13 + cards % 13 for permutation in SUIT_PERMUTATIONS],
+                         dtype=np.int64)
+    return _maps
+
+
+_maps = None
+
+
+def canonical_indices(hands):
+    # Batch canonicalization. hands is anything numpy can turn into an (N, 5) array of card int values. Returns the
+    # hand index of each canonical representative and the index (in SUIT_PERMUTATIONS) of the permutation mapping the
+    # hand onto it, the first one when several do
+    import numpy as np
+    from learner.index import hand_indices
+    c = np.asarray(hands, dtype=np.int64).reshape(-1, 5)
+    maps = _card_maps()
+    renamed = np.empty((len(SUIT_PERMUTATIONS), len(c)), dtype=np.int64)
+    for p in range(len(SUIT_PERMUTATIONS)):
+        renamed[p] = hand_indices(maps[p][c])
+    permutations = np.argmin(renamed, axis=0)
+    return renamed[permutations, np.arange(len(c))], permutations
+
+
+def rename_cards(cards_id, permutations):
+    # card int values renamed by the given SUIT_PERMUTATIONS indices (cards_id: (N, k) array, permutations: N of them)
+    import numpy as np
+    c = np.asarray(cards_id, dtype=np.int64)
+    return _card_maps()[np.asarray(permutations, dtype=np.int64).reshape(-1, *([1] * (c.ndim - 1))), c]
+
+
+def canonical_table(chunk_size=1 << 18):
+    # canonical hand index and permutation of every hand index, as two arrays of HANDS_COMBINATIONS items
+    import numpy as np
+    from learner.index import hands_from_indices
+    canonical = np.empty(HANDS_COMBINATIONS, dtype=np.int64)
+    permutations = np.empty(HANDS_COMBINATIONS, dtype=np.int8)
+    for start in range(0, HANDS_COMBINATIONS, chunk_size):
+        stop = min(start + chunk_size, HANDS_COMBINATIONS)
+        canonical[start:stop], permutations[start:stop] = canonical_indices(hands_from_indices(np.arange(start, stop)))
+    return canonical, permutations
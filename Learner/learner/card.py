@@ -1,3 +1,4 @@
+from array import array
 from enum import Enum
 import json
 
@@ -7,20 +8,33 @@ class Card(object):
     Describes (rank & suit) of one single deck card.
     Each card has an integer value (int_value) which is used to determine card rank and suit according to the following
     formula:
-        suit = int_value / 13    (0: Clubs, 1: Diamonds, 2: Hearts, 3: Spades)
+        suit = int_value // 13    (0: Clubs, 1: Diamonds, 2: Hearts, 3: Spades)
         rank = (int_value % 13) + 2 (where 0=>2, 1=>3, ...8=>10, 9=>J, 10=>Q, 11=>K, 12=>A)
     An int_value = -1 indicates an uninitialized card (card will have a suite = -1, and rank = -1)
+    Cards are immutable and interned: there's only one Card object per int_value, Card(int_value) returns it.
     """
+    __slots__ = ('int_value', 'rank', 'suit')
     suits = ('C', 'D', 'H', 'S')
     ranks = ('2', '3', '4', '5', '6', '7', '8', '9', '10', 'J', 'Q', 'K', 'A')
-
-    def __init__(self, int_value=-1):
-        self.int_value = int_value
-        self.rank = -1
-        self.suit = -1
-        if -1 < int_value < 52:
-            self.rank = int_value % 13
-            self.suit = int_value / 13
+    _interned = {}
+
+    def __new__(cls, int_value=-1):
+        try:
+            return Card._interned[int_value]
+        except KeyError:
+            assert -1 <= int_value < 52, 'Card value out of range'
+        card = object.__new__(cls)
+        object.__setattr__(card, 'int_value', int_value)
+        object.__setattr__(card, 'rank', int_value % 13 if int_value > -1 else -1)
+        object.__setattr__(card, 'suit', int_value // 13 if int_value > -1 else -1)
+        Card._interned[int_value] = card
+        return card
+
+    def __setattr__(self, name, value):
+        raise AttributeError('Card is immutable')
+
+    def __reduce__(self):
+        return Card, (self.int_value,)
 
     def __str__(self):
         assert -1 < self.int_value < 52, 'Card not initialized'
@@ -41,12 +55,18 @@ class Card(object):
     def __eq__(self, other):
         return self.int_value == other.int_value
 
+    def __ne__(self, other):
+        return self.int_value != other.int_value
+
+    def __hash__(self):
+        return self.int_value
+
     @staticmethod
     def from_suit_first_id(card_id=-1):
         # type(int)->Card
         assert -1 < card_id < 52, 'Card value out of range'
         suit = card_id % 4
-        rank = card_id / 4
+        rank = card_id // 4
         return Card(suit * 13 + rank)
 
     @staticmethod
@@ -63,30 +83,53 @@ class Card(object):
         return Card(suit * 13 + rank)
 
 
+def _card_order(card):
+    # hands are sorted by (rank, suit)
+    return card.rank * 4 + card.suit
+
+
+for _int_value in range(-1, 52):
+    Card(_int_value)
+
+
 class Deck(object):
     """
     Describes and manages a deck of cards (52 cards, no jokers).
+    The deck is a fixed array of card int values, cards are dealt from its end by moving played_cards_pointer, so
+    snapshot() and restore() are O(1) and the same shuffled deck can be replayed for several draw strategies.
     """
 
     def __init__(self, cards_values=None, seed=-1):
         import random
         if cards_values is None:
-            cards_values = range(0, 52)
+            cards_values = list(range(0, 52))
             if 0 < seed < 1:
                 random.shuffle(cards_values, lambda: seed)
             else:
                 random.shuffle(cards_values)
 
-        self.in_cards = []  # type: list[Card]
-        self.out_cards = []  # type: list[Card]
-        self.played_cards_pointer = 0  # points to the current top of the deck that's still available (not out already)
-
-        for card_value in cards_values:
-            self.in_cards.append(Card(card_value))
+        self.cards_values = array('b', cards_values)
+        self.played_cards_pointer = 0  # number of cards dealt (out) so far, taken from the end of cards_values
 
     def __str__(self):
         return 'In cards: {0}.\nOut cards: {1} '.format(self.str_in_cards(), self.str_out_cards())
 
+    @property
+    def in_cards(self):
+        # type: () -> list[Card]
+        return [Card(card_value) for card_value in self.cards_values[:self.top]]
+
+    @property
+    def out_cards(self):
+        # type: () -> list[Card]
+        # in the order they were dealt
+        return [Card(card_value) for card_value in reversed(self.cards_values[self.top:])]
+
+    @property
+    def top(self):
+        # number of cards still in the deck
+        return len(self.cards_values) - self.played_cards_pointer
+
     def str_in_cards(self):
         return ' '.join(str(card) for card in self.in_cards)
 
@@ -96,17 +139,23 @@ class Deck(object):
     def deal_cards(self, count):
         # type: (int) -> list[Card]
         assert 0 < count <= 5, 'Only 1, 2, 3, 4 or 5 cards can be dealt at once'
-        assert len(self.in_cards) > count, 'Not enough cards!'
-        dealt_cards = []  # type: list[Card]
-        while count > 0:
-            dealt_cards.append(self.in_cards.pop())
-            count -= 1
-        self.out_cards.extend(dealt_cards)
-        return dealt_cards
+        top = self.top
+        assert top > count, 'Not enough cards!'
+        self.played_cards_pointer += count
+        interned = Card._interned
+        return [interned[card_value] for card_value in reversed(self.cards_values[top - count:top])]
+
+    def snapshot(self):
+        # type: () -> int
+        return self.played_cards_pointer
+
+    def restore(self, snapshot):
+        # type: (int) -> None
+        # puts back every card dealt since snapshot() was called
+        self.played_cards_pointer = snapshot
 
     def copy(self):
-        deck_copy = Deck(cards_values=[card.int_value for card in self.in_cards])
-        deck_copy.out_cards = [Card(int_value=card.int_value) for card in self.out_cards]
+        deck_copy = Deck(cards_values=self.cards_values)
         deck_copy.played_cards_pointer = self.played_cards_pointer
         return deck_copy
 
@@ -158,6 +207,18 @@ class HandValue(object):
         self.is_potential_flush = (-1, -1)
         self.is_potential_straight = (-1, -1, -1)
 
+    def __setattr__(self, name, value):
+        if self.__dict__.get('_frozen', False):
+            raise AttributeError('HandValue is frozen, it may be shared by several hands')
+        object.__setattr__(self, name, value)
+
+    def freeze(self):
+        # makes the HandValue immutable so it can be shared (see HandValueCache)
+        self.s0  # computes _s0
+        self.cards = tuple(self.cards)
+        self._frozen = True
+        return self
+
     def __str__(self):
         return '{0},{1},{2},{3},{4},{5},{6},{7},{8},{9}'.format(self.hand_type, self.cards[0], self.cards[1],
                                                                 self.cards[2], self.cards[3], self.cards[4], self.s0,
@@ -173,19 +234,89 @@ class HandValue(object):
                    self.cards[2].rank * 13 ** 2 + self.cards[3].rank * 13 + self.cards[4].rank
         return self._s0
 
+    @staticmethod
+    def from_string(str_value):
+        # type(str)->HandValue
+        # parses the string written by __str__ (the hands.json format)
+        str_value = str_value.replace('(', '')
+        str_value = str_value.replace(')', '')
+        fields = str_value.split(',')
+        hand_type = HandType[fields[0].split('.')[1]]
+        cards = [Card.from_string(fields[1]), Card.from_string(fields[2]), Card.from_string(
+            fields[3]), Card.from_string(fields[4]), Card.from_string(fields[5])]
+
+        s0 = int(fields[6])
+        strength = int(fields[7])
+        potential_straight = (int(fields[8]), int(fields[9]), int(fields[10]))
+        potential_flush = (int(fields[11]), int(fields[12]))
+
+        hand_value = HandValue(hand_type=hand_type, cards=cards)
+        hand_value._s0 = s0
+        hand_value.strength = strength
+        hand_value.is_potential_flush = potential_flush
+        hand_value.is_potential_straight = potential_straight
+        return hand_value
+
+
+class HandValueCache(object):
+    """
+    Process-wide cache of decoded (frozen) HandValues keyed by hand index, so every Hand holding the same cards shares
+    one HandValue and the hand table or hands.json entry is decoded only once.
+    max_size = None keeps every decoded HandValue, otherwise the least recently used ones are dropped.
+    """
+
+    def __init__(self, max_size=None):
+        from collections import OrderedDict
+        assert max_size is None or max_size > 0, 'Cache size should be positive'
+        self.max_size = max_size
+        self._values = {} if max_size is None else OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._values)
+
+    def get(self, hand_index):
+        # type: (int) -> HandValue
+        hand_value = self._values.get(hand_index)
+        if hand_value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            if self.max_size is not None:
+                # mark as most recently used
+                del self._values[hand_index]
+                self._values[hand_index] = hand_value
+        return hand_value
+
+    def put(self, hand_index, hand_value):
+        # type: (int, HandValue) -> None
+        if self.max_size is not None and len(self._values) >= self.max_size:
+            self._values.popitem(last=False)
+        self._values[hand_index] = hand_value
+
+    def clear(self):
+        self._values.clear()
+        self.hits = 0
+        self.misses = 0
+
 
 class Hand(object):
     """
     Manages a hand of 5 cards
     """
     _hands_dict = {}
+    _hand_table = None
+    _hand_value_cache = HandValueCache()
+    __slots__ = ('cards', 'as_rank_only', '_cards_id', '_hand_value')
 
-    def __init__(self, deck=None, cards=None, cards_id=None, cards_id_suit_first=None, hand_id=None, cards_string=None):
+    def __init__(self, deck=None, cards=None, cards_id=None, cards_id_suit_first=None, hand_id=None, cards_string=None,
+                 hand_index=None):
         self.cards = []
         if deck is not None:
             self.cards = deck.deal_cards(5)
         elif cards is not None:
-            self.cards = [Card(card.int_value) for card in cards]
+            self.cards = list(cards)
         elif cards_id is not None:
             for card_id in cards_id:
                 self.cards.append(Card(card_id))
@@ -201,6 +332,10 @@ class Hand(object):
             cards = cards_string.split(',')
             for card in cards:
                 self.cards.append(Card.from_string(card))
+        elif hand_index is not None:
+            from learner.index import hand_from_index
+            for card_id in hand_from_index(hand_index):
+                self.cards.append(Card(card_id))
         else:
             raise (NotImplementedError, 'Hands constructed in an unsupported way')
 
@@ -212,21 +347,38 @@ class Hand(object):
         return ' '.join(str(card) for card in self.cards)
 
     def sort_hand(self):
-        import operator
-        self.cards.sort(key=operator.attrgetter('rank', 'suit'), reverse=True)
+        self.cards.sort(key=_card_order, reverse=True)
+        self._cards_id = tuple([card.int_value for card in self.cards])
 
     def get_rank_only(self):
         return [card.rank for card in self.cards]
 
     @property
     def hand_id(self):
-        return self.cards[0] * 52 ** 4 + self.cards[1] * 52 ** 3 + self.cards[2] * 52 ** 2 + self.cards[3] * 52 + \
-               self.cards[4]
+        c = self._cards_id
+        return c[0] * 52 ** 4 + c[1] * 52 ** 3 + c[2] * 52 ** 2 + c[3] * 52 + c[4]
+
+    @property
+    def cards_id(self):
+        # int values of the cards, in hand order
+        return self._cards_id
+
+    @property
+    def hand_index(self):
+        # dense index of the hand, see learner.index
+        from learner.index import hand_index
+        return hand_index(self._cards_id)
+
+    @property
+    def canonical_index(self):
+        # (hand index of the suit-canonical representative, suit permutation), see learner.canonical
+        from learner.canonical import canonical_index
+        return canonical_index(self._cards_id)
 
     def hand_id_to_cards_id(self, hand_id):
         cards_id = []
         for i in range(0, 5):
-            cards_id.append((hand_id % 52 ** (i + 1)) / 52 ** i)
+            cards_id.append((hand_id % 52 ** (i + 1)) // 52 ** i)
 
     def evaluate_hand(self):
         # type()->HandValue
@@ -280,7 +432,7 @@ class Hand(object):
 
         # check for one_pair
         if pairs == 1:
-            kicker_idx = range(0, 5)
+            kicker_idx = list(range(0, 5))
             kicker_idx.pop(pair_idx[0])
             kicker_idx.pop(pair_idx[0])
             return HandValue(HandType.one_pair, [self.cards[pair_idx[0]], self.cards[pair_idx[0] + 1],
@@ -289,7 +441,7 @@ class Hand(object):
 
         # check for two pairs
         if pairs == 2:
-            kicker_idx = range(0, 5)
+            kicker_idx = list(range(0, 5))
             kicker_idx.pop(pair_idx[0])
             kicker_idx.pop(pair_idx[0])
             kicker_idx.pop(pair_idx[1] - 2)
@@ -300,7 +452,7 @@ class Hand(object):
 
         # check for three of a kind
         if triples == 1:
-            kicker_idx = range(0, 5)
+            kicker_idx = list(range(0, 5))
             kicker_idx.pop(triple_idx)
             kicker_idx.pop(triple_idx)
             kicker_idx.pop(triple_idx)
@@ -311,7 +463,7 @@ class Hand(object):
 
         # check for four of a kind
         if quads == 1:
-            kicker_idx = range(0, 5)
+            kicker_idx = list(range(0, 5))
             kicker_idx.pop(quad_idx)
             kicker_idx.pop(quad_idx)
             kicker_idx.pop(quad_idx)
@@ -324,7 +476,7 @@ class Hand(object):
     def evaluate_all_hand_combinations(self):
         import itertools
         hands_dict = {}
-        cards = range(0, 52)
+        cards = list(range(0, 52))
         all_hands = itertools.combinations(cards, 5)
         for combination in all_hands:
             # adjust deck numbers so that 0,1,2,3,4 is 2C,2D,2H,2S,3C instead of 2C,3C,4C,5C,6C
@@ -365,6 +517,22 @@ class Hand(object):
         import json
         with open(file_name, 'r') as infile:
             Hand._hands_dict = dict(json.load(infile, object_hook=as_enum))
+        Hand._hand_value_cache.clear()
+
+    @staticmethod
+    def load_hand_table(file_name):
+        # memory-maps the binary hand table (see learner.table), hand_value is then read from it instead of
+        # the hands.json dict
+        from learner.table import HandTable
+        if Hand._hand_table is not None:
+            Hand._hand_table.close()
+        Hand._hand_table = HandTable(file_name)
+        Hand._hand_value_cache.clear()
+
+    @staticmethod
+    def set_hand_value_cache_size(max_size=None):
+        # max_size = None (the default) caches the HandValue of every hand that has been looked up
+        Hand._hand_value_cache = HandValueCache(max_size)
 
     def lowest_rank_of_suit(self, suit):
         if suit == -1:
@@ -411,22 +579,8 @@ class Hand(object):
         # returns a tuple (idx, hand_id). If the hand is potential flush, idx is the index of the card to be thrown and
         # hand_id is the (the lowest possible) potential flush hand_id. If hand is not a potential flush (-1,-1) is
         #  returned
-        suits = [0] * 4
-        for card in self.cards:
-            suits[card.suit] += 1
-        if max(suits) != 4:
-            return -1, -1
-        # so it's a potential flush, get the lowest card that can make this a flush
-        idx = self.get_card_of_suit(suits.index(1))
-        ranks = range(13)
-        for card in self.cards:
-            ranks[card.rank] = 14
-        rank = ranks.index(min(ranks))
-        indices = range(5)
-        indices.pop(idx)
-        hand = Hand(cards=[self.cards[indices[0]], self.cards[indices[1]], self.cards[indices[2]],
-                           self.cards[indices[3]], Card.from_rank_and_suit(rank, self.cards[indices[0]].suit)])
-        return idx, hand.hand_id
+        from learner.potential import potential_flush
+        return potential_flush(list(self._cards_id))
 
     def is_potential_straight(self):
         # returns a tuple (idx,type, hand_id). If the hand is potential straight, idx is the index of the card to be
@@ -435,107 +589,27 @@ class Hand(object):
         # by either 2X card or 7X card. On the hand, type 1 means that there's only one card rank that can make the hand
         # straight (e.g. 3S,4C,6S,7D,8D can become straight by 5X alone)
         # If hand is not a potential flush (-1,-1,-1) is returned
-
-        # check for low ace case
-
-        i = self.highest_rank_of_suit()
-        idx = -1
-        if self.cards[i].rank == 12:
-            remaining_ranks = [0, 1, 2, 3]
-            for i, card in enumerate(self.cards):
-                try:
-                    remaining_ranks.pop(remaining_ranks.index(card.rank))
-                except ValueError:
-                    idx = i
-            if len(remaining_ranks) == 1:
-                indices = range(5)
-                indices.pop(idx)
-                hand = Hand(cards=[self.cards[indices[0]], self.cards[indices[1]], self.cards[indices[2]],
-                                   self.cards[indices[3]],
-                                   Card.from_rank_and_suit(remaining_ranks[0], (self.cards[indices[0]].suit + 1) % 4)])
-                return idx, 1, hand.hand_id
-        # Check for all other cases
-        straight_hands = [[0, 1, 2, 3, 4], [1, 2, 3, 4, 5], [2, 3, 4, 5, 6], [3, 4, 5, 6, 7], [4, 5, 6, 7, 8],
-                          [5, 6, 7, 8, 9], [6, 7, 8, 9, 10], [7, 8, 9, 10, 11], [8, 9, 10, 11, 12]]
-        potential_hands_indices = []
-        for card in self.cards:
-            for i, straight_hand in enumerate(straight_hands):
-                try:
-                    straight_hand.pop(straight_hand.index(card.rank))
-                    if len(straight_hand) == 1:
-                        potential_hands_indices.append(i)
-                except ValueError:
-                    pass
-        potential_hands_count = len(potential_hands_indices)
-        if potential_hands_count == 0:
-            return -1, -1, -1
-        else:
-            # make a histogram of all potential hands + the current hand
-            hist = [0] * 13
-            # potential hands
-            for potential_hands_index in potential_hands_indices:
-                for idx in range(potential_hands_index, potential_hands_index + 5):
-                    hist[idx] += 1
-            # current hand
-            for card in self.cards:
-                hist[card.rank] += 1
-
-            # Now do a moving sum to find which combination with the highest potential
-            largest_sum = -1
-            largest_sum_i = -1
-            for i in range(0, 10):
-                current_sum = sum(hist[i:i + 5])
-                if current_sum > largest_sum:
-                    largest_sum = current_sum
-                    largest_sum_i = i
-
-            potential_hand = range(largest_sum_i, largest_sum_i + 5)
-            idx = -1
-            for i, card in enumerate(self.cards):
-                try:
-                    potential_hand.pop(potential_hand.index(card.rank))
-                except ValueError:
-                    idx = i
-
-            indices = range(5)
-            indices.pop(idx)
-            hand = Hand(cards=[self.cards[indices[0]], self.cards[indices[1]], self.cards[indices[2]],
-                               self.cards[indices[3]],
-                               Card.from_rank_and_suit(potential_hand[0], (self.cards[indices[0]].suit + 1) % 4)])
-
-            # In some cases like 5X,6X,7X,8X,10X there're more than two possible straights, namely:
-            # 1- Throw 10X and draw 9X => 5X,6X,7X,8X,9X
-            # 2- Throw 10X and draw 4X => 4X,5X,6X,7X,8X
-            # 3- Throw 5X  and draw 9X => 6X,7X,8X,9X,10X
-            # However the third option (throwing 5x) is less likely to happen compared to the combination of 1 and 2 and
-            # therefore the case is disregarded
-
-            if potential_hands_count > 2:
-                potential_hands_count = 2
-            return idx, potential_hands_count, hand.hand_id
+        # In some cases like 5X,6X,7X,8X,10X there're more than two possible straights, namely:
+        # 1- Throw 10X and draw 9X => 5X,6X,7X,8X,9X
+        # 2- Throw 10X and draw 4X => 4X,5X,6X,7X,8X
+        # 3- Throw 5X  and draw 9X => 6X,7X,8X,9X,10X
+        # However the third option (throwing 5x) is less likely to happen compared to the combination of 1 and 2 and
+        # therefore the case is disregarded (see learner.potential)
+        from learner.potential import potential_straight
+        return potential_straight(list(self._cards_id))
 
     @property
     def hand_value(self):
         if self._hand_value is not None:
             return self._hand_value
-        str_value = Hand._hands_dict[self.hand_id]
-        str_value = str_value.replace('(', '')
-        str_value = str_value.replace(')', '')
-        fields = str_value.split(',')
-        hand_type = HandType[fields[0].split('.')[1]]
-        cards = [Card.from_string(fields[1]), Card.from_string(fields[2]), Card.from_string(
-            fields[3]), Card.from_string(fields[4]), Card.from_string(fields[5])]
-
-        s0 = int(fields[6])
-        strength = int(fields[7])
-        potential_straight = (int(fields[8]), int(fields[9]), int(fields[10]))
-        potential_flush = (int(fields[11]), int(fields[12]))
-
-        hand_value = HandValue(hand_type=hand_type, cards=cards)
-        hand_value._s0 = s0
-        hand_value.strength = strength
-        hand_value.is_potential_flush = potential_flush
-        hand_value.is_potential_straight = potential_straight
+        hand_index = self.hand_index
+        hand_value = Hand._hand_value_cache.get(hand_index)
+        if hand_value is None:
+            if Hand._hand_table is not None:
+                hand_value = Hand._hand_table.hand_value(hand_index)
+            else:
+                hand_value = HandValue.from_string(Hand._hands_dict[self.hand_id])
+            Hand._hand_value_cache.put(hand_index, hand_value.freeze())
         self._hand_value = hand_value
         return hand_value
 
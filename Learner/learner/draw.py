@@ -0,0 +1,152 @@
+"""
+Exact draw outcomes. For a 5-card hand and each of the 32 discard choices, every possible replacement out of the 47
+unseen cards is enumerated (C(47, k) of them when k cards are thrown, C(52, 5) in total over the 32 choices) and scored
+with the strength table, giving the exact distribution of the final strength instead of the Monte Carlo estimate of
+StatBuilder.
+A discard is a 5-bit mask over the cards as they're passed in: bit i set means cards[i] is thrown. Bin strategies index
+HandValue.cards, so pass hand.hand_value.cards (or use strategy_mask) to get outcomes in bin strategy terms.
+"""
+import copy
+import itertools
+
+import numpy as np
+
+from learner.canonical import canonical_index, rename_card
+from learner.evaluator import index_strengths
+from learner.index import hand_from_index, hand_index, hand_indices
+
+DISCARDS_COUNT = 32
+
+
+class DrawOutcome(object):
+    """
+    Exact outcome of one discard choice: the distribution of the final strength (distinct strengths and the number of
+    draws giving each) and its summary stats, named after the SBin ones:
+        performance: mean of final strength / initial strength
+        performance_unweighted: probability that the final strength is not lower than the initial one
+        p_improve: probability that the final strength is higher than the initial one
+    """
+
+    def __init__(self, discard, initial_strength, strengths, counts):
+        self.discard = discard
+        self.initial_strength = initial_strength
+        self.strengths = strengths
+        self.counts = counts
+        self.draws_count = int(counts.sum())
+        self.performance = float(np.dot(strengths, counts)) / initial_strength / self.draws_count
+        self.performance_unweighted = float(counts[strengths >= initial_strength].sum()) / self.draws_count
+        self.p_improve = float(counts[strengths > initial_strength].sum()) / self.draws_count
+
+    def __str__(self):
+        return 'Discard {0:05b}: performance = {1}, unweighted performance = {2}, P(improve) = {3}'.format(
+            self.discard, self.performance, self.performance_unweighted, self.p_improve)
+
+
+class DrawEngine(object):
+    """
+    Computes and memoizes the 32 DrawOutcomes of a hand. Outcomes are memoized per suit-canonical hand (see
+    learner.canonical), the 24 suit renamings of a hand share one entry. cache_size = None keeps every hand computed,
+    otherwise the least recently used hands are dropped.
+    """
+
+    def __init__(self, strengths=None, cache_size=1024):
+        from collections import OrderedDict
+        # strength of each hand index, index_strengths() unless given (e.g. read from the hand table)
+        self.strengths = index_strengths() if strengths is None else strengths
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._combinations = {}
+
+    def outcomes(self, cards_id):
+        # type: (list[int]) -> list[DrawOutcome]
+        # the outcomes of the 32 discards, indexed by discard mask over cards_id as given
+        cards_id = [int(card_id) for card_id in cards_id]
+        index, permutation = canonical_index(cards_id)
+        sorted_outcomes = self._cache.pop(index, None)
+        if sorted_outcomes is None:
+            sorted_outcomes = self._compute(hand_from_index(index))
+        self._cache[index] = sorted_outcomes
+        if self.cache_size is not None and len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        # outcomes are memoized with masks over the canonical cards in ascending order, map them back to the given
+        # cards and order
+        canonical_cards = hand_from_index(index)
+        position = [canonical_cards.index(rename_card(card_id, permutation)) for card_id in cards_id]
+        result = []
+        for discard in range(DISCARDS_COUNT):
+            sorted_discard = sum(1 << position[i] for i in range(5) if discard >> i & 1)
+            outcome = copy.copy(sorted_outcomes[sorted_discard])
+            outcome.discard = discard
+            result.append(outcome)
+        return result
+
+    def hand_outcomes(self, hand):
+        # outcomes with masks over hand.hand_value.cards, i.e. in the bin strategies terms
+        return self.outcomes([card.int_value for card in hand.hand_value.cards])
+
+    def clear_cache(self):
+        self._cache.clear()
+
+    def _unseen_combinations(self, k):
+        # all the k-combinations of the 47 unseen cards, as positions into the unseen cards
+        if k not in self._combinations:
+            flat = np.fromiter(itertools.chain.from_iterable(itertools.combinations(range(47), k)), dtype=np.int8)
+            self._combinations[k] = flat.reshape(-1, k) if k > 0 else np.empty((1, 0), dtype=np.int8)
+        return self._combinations[k]
+
+    def _compute(self, cards_id):
+        cards = np.array(cards_id, dtype=np.int64)
+        unseen = np.setdiff1d(np.arange(52), cards)
+        initial_strength = int(self.strengths[hand_index(cards_id)])
+        outcomes = []
+        for discard in range(DISCARDS_COUNT):
+            thrown = np.array([discard >> i & 1 for i in range(5)], dtype=bool)
+            k = int(thrown.sum())
+            combinations = self._unseen_combinations(k)
+            hands = np.empty((len(combinations), 5), dtype=np.int64)
+            hands[:, :5 - k] = cards[~thrown]
+            hands[:, 5 - k:] = unseen[combinations]
+            strengths, counts = np.unique(self.strengths[hand_indices(hands)], return_counts=True)
+            outcomes.append(DrawOutcome(discard, initial_strength, strengths, counts))
+        return outcomes
+
+
+def strategy_mask(strategy):
+    # type: (list[int]) -> int
+    # discard mask of a bin strategy (the list of HandValue.cards indices to throw)
+    return sum(1 << i for i in strategy)
+
+
+_engine = None  # type: DrawEngine
+
+
+def _summarize(index):
+    global _engine
+    if _engine is None:
+        _engine = DrawEngine(cache_size=1)
+    outcomes = _engine.outcomes(hand_from_index(index))
+    return ([outcome.performance for outcome in outcomes], [outcome.performance_unweighted for outcome in outcomes],
+            [outcome.p_improve for outcome in outcomes])
+
+
+def draw_summaries(indices, processes=None):
+    # Batch API for offline precomputation: for each hand index, the summary stats of its 32 discards with masks over
+    # the cards in ascending int value order (see learner.index.hand_from_index). Returns three (N, 32) float arrays:
+    # performance, performance_unweighted and p_improve. Hands are spread over a pool of processes (all cores by
+    # default), each worker builds its own strength table.
+    import multiprocessing
+    indices = [int(index) for index in indices]
+    if processes == 1:
+        summaries = [_summarize(index) for index in indices]
+    else:
+        pool = multiprocessing.Pool(processes)
+        try:
+            summaries = pool.map(_summarize, indices, chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+    performance = np.array([summary[0] for summary in summaries], dtype=np.float64).reshape(-1, DISCARDS_COUNT)
+    performance_unweighted = np.array([summary[1] for summary in summaries], dtype=np.float64).reshape(-1,
+                                                                                                      DISCARDS_COUNT)
+    p_improve = np.array([summary[2] for summary in summaries], dtype=np.float64).reshape(-1, DISCARDS_COUNT)
+    return performance, performance_unweighted, p_improve
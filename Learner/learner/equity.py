@@ -0,0 +1,232 @@
+"""
+Showdown equity with card removal. The chance that a hand beats an opponent hand is counted over the C(47, 5) hands the
+opponent can hold (the ones that don't share a card with ours) instead of over all the C(52, 5) hands as
+strength / HANDS_COMBINATIONS does.
+Counts come from histograms of the strengths of all hands and of the hands holding each card, corrected by
+inclusion-exclusion over the cards of our hand (the blockers):
+    weaker hands from the 47 cards = sum over S subset of our cards of (-1)^|S| * weaker hands holding all of S
+The |S| <= 1 terms are read from the histograms, the few hands holding 2 or more of our cards (about 200k) are
+enumerated.
+odds_table counts the same terms for every hand at once, so the odds of all the hands can be kept in a table (see
+EquityEngine.use_odds_table) instead of computed hand by hand.
+Against several opponents the hands share the 47 unseen cards, so the chances of beating each of them aren't
+independent and aren't the single opponent one to the power of the opponents count. p_win_multiway samples the deals
+of the opponent hands from the unseen cards instead (MULTIWAY_SAMPLES of them, a standard error below 0.005).
+"""
+import itertools
+
+import numpy as np
+
+from learner.index import hand_indices
+
+UNSEEN_HANDS_COMBINATIONS = 1533939  # C(47, 5)
+MULTIWAY_SAMPLES = 10000
+
+
+class EquityEngine(object):
+    """
+    Exact single opponent showdown odds of a hand, cached per hand index and per suit-canonical hand (see
+    learner.canonical) so the 24 suit renamings of a hand share one computation. Building the histograms takes a couple
+    of seconds, a cached lookup is a dict access. Sampled multiway chances of winning are cached the same way.
+    """
+
+    def __init__(self, strengths=None):
+        # strengths: strength of each hand index, read from the loaded hand table (or computed) unless given
+        if strengths is None:
+            from learner.card import Hand
+            if Hand._hand_table is not None:
+                strengths = Hand._hand_table.records()['strength']
+            else:
+                from learner.evaluator import index_strengths
+                strengths = index_strengths()
+        # hands are bucketed by distinct strength so the histograms stay small (7462 buckets)
+        distinct_strengths, buckets = np.unique(strengths, return_inverse=True)
+        buckets_count = len(distinct_strengths)
+        from learner.index import HANDS_COMBINATIONS, hands_from_indices
+        card_counts = np.zeros(52 * buckets_count, dtype=np.int64)
+        for start in range(0, HANDS_COMBINATIONS, 1 << 18):
+            stop = min(start + (1 << 18), HANDS_COMBINATIONS)
+            cards = hands_from_indices(np.arange(start, stop))
+            card_counts += np.bincount((cards * buckets_count + buckets[start:stop, None]).ravel(),
+                                       minlength=52 * buckets_count)
+        self._set_histograms(strengths, distinct_strengths, np.bincount(buckets, minlength=buckets_count),
+                             card_counts.reshape(52, buckets_count))
+
+    @staticmethod
+    def from_histograms(strengths, distinct_strengths, counts, card_counts):
+        # type: (object, object, object, object) -> EquityEngine
+        # an engine over already built histograms (see histograms), e.g. read from shared tables (learner.shared)
+        engine = EquityEngine.__new__(EquityEngine)
+        engine._set_histograms(strengths, distinct_strengths, counts, card_counts)
+        return engine
+
+    def histograms(self):
+        # (distinct_strengths, counts, card_counts) arrays, what from_histograms needs on top of the strengths
+        return self.distinct_strengths, self._counts, self._card_counts
+
+    def _set_histograms(self, strengths, distinct_strengths, counts, card_counts):
+        self.strengths = strengths
+        self.distinct_strengths = distinct_strengths
+        self._counts = counts
+        self._weaker = np.cumsum(counts) - counts
+        self._card_counts = card_counts
+        self._card_weaker = np.cumsum(card_counts, axis=1) - card_counts
+        self._combinations = dict((k, _combinations(52 - k, 5 - k)) for k in range(2, 6))
+        self._cache = {}
+        self._canonical_cache = {}
+        self._multiway_cache = {}
+        self._odds_counts = None
+
+    def use_odds_table(self, odds_counts):
+        # odds are read from odds_counts (see odds_table) instead of computed
+        self._odds_counts = odds_counts
+
+    def odds(self, cards_id):
+        # type: (list[int]) -> tuple
+        # (P(win), P(tie)) of the hand against one opponent hand drawn from the other 47 cards
+        from learner.index import hand_index
+        index = hand_index(cards_id)
+        if self._odds_counts is not None:
+            weaker, equal = self._odds_counts[index]
+            return float(weaker) / UNSEEN_HANDS_COMBINATIONS, float(equal) / UNSEEN_HANDS_COMBINATIONS
+        odds = self._cache.get(index)
+        if odds is None:
+            from learner.canonical import canonical_index
+            from learner.index import hand_from_index
+            # odds don't depend on the suits names
+            canonical, permutation = canonical_index([int(card_id) for card_id in cards_id])
+            odds = self._canonical_cache.get(canonical)
+            if odds is None:
+                odds = self._canonical_cache[canonical] = self._compute(hand_from_index(canonical), canonical)
+            self._cache[index] = odds
+        return odds
+
+    def p_win(self, cards_id):
+        # type: (list[int]) -> float
+        # chance of winning the showdown against one opponent hand, a tie counting as half a win (see p_win_multiway
+        # for several opponents)
+        win, tie = self.odds(cards_id)
+        return win + tie / 2.
+
+    def p_win_multiway(self, cards_id, opponents, samples=MULTIWAY_SAMPLES):
+        # type: (list[int], int, int) -> float
+        # chance of winning the showdown against opponents hands dealt from the other 47 cards, a tie for the best
+        # hand between k hands counting as 1/k of a win. Exact (p_win) against one opponent, estimated from samples
+        # deals otherwise: counting exactly against hands sharing the unseen cards needs the histograms of every
+        # subset of the weaker hands (about a second per hand for two opponents). The deals are seeded by the
+        # canonical hand, so the estimate of a hand doesn't change from call to call or process to process.
+        if opponents <= 1:
+            return self.p_win(cards_id)
+        from learner.canonical import canonical_index
+        canonical, permutation = canonical_index([int(card_id) for card_id in cards_id])
+        p = self._multiway_cache.get((canonical, opponents, samples))
+        if p is None:
+            p = self._multiway_cache[(canonical, opponents, samples)] = self._sample_multiway(canonical, opponents,
+                                                                                             samples)
+        return p
+
+    def clear_cache(self):
+        self._cache.clear()
+        self._canonical_cache.clear()
+        self._multiway_cache.clear()
+
+    def _sample_multiway(self, index, opponents, samples):
+        from learner.index import hand_from_index
+        unseen = np.setdiff1d(np.arange(52), hand_from_index(index))
+        if opponents * 5 > len(unseen):
+            raise ValueError('{0} opponents need more than the {1} unseen cards'.format(opponents, len(unseen)))
+        random_state = np.random.RandomState(index)
+        # the first opponents * 5 cards of a random permutation of the unseen cards, per deal
+        dealt = unseen[np.argsort(random_state.random_sample((samples, len(unseen))), axis=1)[:, :opponents * 5]]
+        strengths = self.strengths[hand_indices(dealt.reshape(-1, 5))].reshape(samples, opponents)
+        strength = self.strengths[index]
+        best = strengths.max(axis=1)
+        wins = np.where(best < strength, 1., 0.)
+        ties = best == strength
+        wins[ties] = 1. / (1 + np.count_nonzero(strengths[ties] == strength, axis=1))
+        return float(wins.mean())
+
+    def _compute(self, cards_id, index):
+        bucket = np.searchsorted(self.distinct_strengths, self.strengths[index])
+        weaker = int(self._weaker[bucket])
+        equal = int(self._counts[bucket])
+        for card_id in cards_id:
+            weaker -= int(self._card_weaker[card_id, bucket])
+            equal -= int(self._card_counts[card_id, bucket])
+        # hands holding 2 or more of our cards
+        strength = self.strengths[index]
+        for k in range(2, 6):
+            for blockers in itertools.combinations(cards_id, k):
+                others = np.setdiff1d(np.arange(52), blockers)
+                combinations = self._combinations[k]
+                hands = np.empty((len(combinations), 5), dtype=np.int64)
+                hands[:, :k] = blockers
+                hands[:, k:] = others[combinations]
+                strengths = self.strengths[hand_indices(hands)]
+                sign = 1 if k % 2 == 0 else -1
+                weaker += sign * int(np.count_nonzero(strengths < strength))
+                equal += sign * int(np.count_nonzero(strengths == strength))
+        return float(weaker) / UNSEEN_HANDS_COMBINATIONS, float(equal) / UNSEEN_HANDS_COMBINATIONS
+
+
+def odds_table(strengths, chunk_size=1 << 20):
+    # (HANDS_COMBINATIONS, 2) int32 array, the number of weaker and of equal opponent hands from the 47 unseen cards of
+    # every hand index (EquityEngine.odds times UNSEEN_HANDS_COMBINATIONS). The hands holding each k cards subset of
+    # our hand (k = 1..4) are counted by sorting all the (subset, strength bucket, hand) of the C(5, k) subsets of every
+    # hand: the hands holding a subset that are weaker than a hand holding it are the ones sorted before it in the
+    # subset. Takes a few seconds and a few hundred MB.
+    from learner.index import HANDS_COMBINATIONS, _BINOMIAL, hands_from_indices
+    distinct_strengths, buckets = np.unique(strengths, return_inverse=True)
+    buckets = buckets.astype(np.int64).reshape(-1)
+    counts = np.bincount(buckets)
+    weaker = (np.cumsum(counts) - counts)[buckets]
+    equal = counts[buckets] - 1  # the hand itself, the 5 cards subset
+    binomial = np.array(_BINOMIAL, dtype=np.int64)
+    # key: subset colex index (< 2^19) | bucket (< 2^13) | hand index (< 2^22)
+    hand_bits, bucket_bits = 22, 13
+    for k in range(1, 5):
+        subsets = list(itertools.combinations(range(5), k))
+        keys = np.empty(HANDS_COMBINATIONS * len(subsets), dtype=np.int64)
+        for start in range(0, HANDS_COMBINATIONS, chunk_size):
+            stop = min(start + chunk_size, HANDS_COMBINATIONS)
+            cards = hands_from_indices(np.arange(start, stop))
+            low = (buckets[start:stop] << hand_bits) + np.arange(start, stop)
+            for j, subset in enumerate(subsets):
+                subset_index = sum(binomial[i + 1][cards[:, position]] for i, position in enumerate(subset))
+                keys[j * HANDS_COMBINATIONS + start:j * HANDS_COMBINATIONS + stop] = \
+                    (subset_index << (bucket_bits + hand_bits)) + low
+        keys.sort()
+        sign = -1 if k % 2 else 1
+        # chunks of the sorted keys cut at subset boundaries, a subset never spans two chunks
+        start = 0
+        while start < len(keys):
+            stop = min(start + chunk_size, len(keys))
+            if stop < len(keys):
+                stop = np.searchsorted(keys, (keys[stop] >> (bucket_bits + hand_bits)) << (bucket_bits + hand_bits))
+                if stop == start:
+                    stop = np.searchsorted(keys, ((keys[start] >> (bucket_bits + hand_bits)) + 1) <<
+                                           (bucket_bits + hand_bits))
+            chunk = keys[start:stop]
+            group = chunk >> hand_bits
+            positions = np.arange(len(chunk))
+            new_group = np.concatenate(([True], group[1:] != group[:-1]))
+            new_subset = np.concatenate(([True], (group[1:] >> bucket_bits) != (group[:-1] >> bucket_bits)))
+            group_starts = np.flatnonzero(new_group)
+            group_sizes = np.diff(np.append(group_starts, len(chunk)))
+            # hands of the subset sorted before the first hand of the group, and hands in the group
+            below = np.maximum.accumulate(np.where(new_group, positions, 0)) - \
+                np.maximum.accumulate(np.where(new_subset, positions, 0))
+            # a hand can be in a chunk through several of its subsets, hence bincount
+            hands = chunk & ((1 << hand_bits) - 1)
+            weaker += sign * np.bincount(hands, weights=below, minlength=HANDS_COMBINATIONS).astype(np.int64)
+            equal += sign * np.bincount(hands, weights=np.repeat(group_sizes, group_sizes),
+                                        minlength=HANDS_COMBINATIONS).astype(np.int64)
+            start = stop
+        del keys
+    return np.stack([weaker, equal], axis=1).astype(np.int32)
+
+
+def _combinations(n, k):
+    # all the k-combinations of range(n), as a (C(n, k), k) array
+    flat = np.fromiter(itertools.chain.from_iterable(itertools.combinations(range(n), k)), dtype=np.int8)
+    return flat.reshape(-1, k) if k > 0 else np.empty((1, 0), dtype=np.int8)
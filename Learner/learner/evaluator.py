@@ -0,0 +1,99 @@
+"""
+NumPy batch hand evaluator.
+Works on (N, 5) integer arrays of card int values (suit * 13 + rank, see Card) and gives the same hand_type, s0 and
+strength as Hand.evaluate_hand, HandValue.s0 and the strength assigned by Hand.evaluate_all_hand_combinations.
+"""
+import numpy as np
+
+from learner.index import HANDS_COMBINATIONS, hands_from_indices
+
+# hands are evaluated in slices of this many rows to bound the memory of the temporaries
+CHUNK_SIZE = 1 << 18
+
+_strength_lookup = None  # type: tuple[np.ndarray, np.ndarray]
+_index_strengths = None  # type: np.ndarray
+
+
+def classify_hands(hands):
+    # returns (hand_type, s0, cards) where cards holds each hand in HandValue order: cards grouped by rank multiplicity
+    # (quads, triples, pairs, kickers), ties broken by rank then suit, descending. That's the order evaluate_hand puts
+    # the cards in for every hand type.
+    c = np.asarray(hands).reshape(-1, 5).astype(np.int16)
+    rank = c % 13
+    suit = c // 13
+    rank_count = (rank[:, :, None] == rank[:, None, :]).sum(axis=2).astype(np.int16)
+
+    order = np.argsort(-(rank_count * 64 + rank * 4 + suit), axis=1)
+    rows = np.arange(len(c))[:, None]
+    cards = c[rows, order]
+    ranks = rank[rows, order]
+    counts = rank_count[rows, order]
+
+    # after ordering, counts[:, 0], [:, 2] and [:, 3] identify the multiplicity pattern
+    flush = (suit == suit[:, :1]).all(axis=1)
+    high_card = counts[:, 0] == 1
+    straight = high_card & ((ranks[:, 0] == ranks[:, 4] + 4) | ((ranks[:, 0] == 12) & (ranks[:, 1] == 3)))
+    hand_type = np.zeros(len(c), dtype=np.int8)
+    hand_type[(counts[:, 0] == 2) & (counts[:, 2] == 1)] = 1  # one pair
+    hand_type[(counts[:, 0] == 2) & (counts[:, 2] == 2)] = 2  # two pair
+    hand_type[(counts[:, 0] == 3) & (counts[:, 3] == 1)] = 3  # three of a kind
+    hand_type[straight] = 4
+    hand_type[flush] = 5
+    hand_type[(counts[:, 0] == 3) & (counts[:, 3] == 2)] = 6  # full house
+    hand_type[counts[:, 0] == 4] = 7  # four of a kind
+    hand_type[flush & straight] = 8
+
+    ranks = ranks.astype(np.int64)
+    s0 = (hand_type.astype(np.int64) * 13 ** 5 + ranks[:, 0] * 13 ** 4 + ranks[:, 1] * 13 ** 3 + ranks[:, 2] * 13 ** 2 +
+          ranks[:, 3] * 13 + ranks[:, 4])
+    return hand_type, s0, cards.astype(np.int8)
+
+
+def strength_lookup():
+    # (distinct s0 values sorted, strength of each). The strength of a hand is 1 + the number of hands with a
+    # strictly smaller s0, exactly as evaluate_all_hand_combinations ranks them. Built once, takes a few seconds.
+    global _strength_lookup
+    if _strength_lookup is None:
+        _strength_lookup = _rank_s0(_all_s0())
+    return _strength_lookup
+
+
+def index_strengths():
+    # strength of every hand as a flat uint32 array indexed by hand index (see learner.index). Built once, ~10 MB.
+    global _strength_lookup, _index_strengths
+    if _index_strengths is None:
+        s0 = _all_s0()
+        if _strength_lookup is None:
+            _strength_lookup = _rank_s0(s0)
+        _index_strengths = s0_to_strength(s0).astype(np.uint32)
+    return _index_strengths
+
+
+def _all_s0():
+    # s0 of every hand, in hand index order
+    s0 = np.empty(HANDS_COMBINATIONS, dtype=np.int64)
+    for start in range(0, HANDS_COMBINATIONS, CHUNK_SIZE):
+        stop = min(start + CHUNK_SIZE, HANDS_COMBINATIONS)
+        s0[start:stop] = classify_hands(hands_from_indices(np.arange(start, stop)))[1]
+    return s0
+
+
+def _rank_s0(s0):
+    distinct_s0, counts = np.unique(s0, return_counts=True)
+    return distinct_s0, np.cumsum(counts) - counts + 1
+
+
+def s0_to_strength(s0):
+    distinct_s0, strength = strength_lookup()
+    return strength[np.searchsorted(distinct_s0, s0)]
+
+
+def evaluate_hands(hands):
+    # returns (hand_type, s0, strength) arrays for an (N, 5) array of card int values
+    c = np.asarray(hands).reshape(-1, 5)
+    hand_type = np.empty(len(c), dtype=np.int8)
+    s0 = np.empty(len(c), dtype=np.int64)
+    for start in range(0, len(c), CHUNK_SIZE):
+        stop = min(start + CHUNK_SIZE, len(c))
+        hand_type[start:stop], s0[start:stop] = classify_hands(c[start:stop])[:2]
+    return hand_type, s0, s0_to_strength(s0)
@@ -0,0 +1,132 @@
+"""
+Exhaustive (noise free) evaluation of the bin strategies. Every starting hand, every strategy of its bin and every
+replacement of the thrown cards out of the 47 unseen ones is scored, giving the exact per bin stats StatBuilder
+estimates by sampling.
+Suit renamings don't change outcomes, so a (starting hand, discard) pair is evaluated once per suit-canonical form (see
+learner.canonical) and weighted by how many raw pairs it stands for: the 2,598,960 hands and their bin strategies
+collapse to about half a million canonical pairs over the 134,459 canonical hands.
+The stats are the population ones over the equally likely (starting hand, draw) pairs of a bin strategy: count is the
+number of pairs, mean and m2 their mean and sum of squared deviations, so they merge with sampled stats as more
+(exact) samples.
+"""
+import itertools
+
+import numpy as np
+
+from learner.canonical import canonical_table, rename_cards
+from learner.index import HANDS_COMBINATIONS, hand_from_index, hand_indices
+from learner.stats import Accumulator, SimulationStats
+
+_TASK_HANDS = 256
+
+
+def exhaustive_stats(bins, bin_index, records, processes=None):
+    # type: (list, object, object, int) -> SimulationStats
+    # bins and bin_index: StatBuilder.bins and StatBuilder.bin_index, records: the hand table records. The canonical
+    # hands are spread over a pool of processes (all cores by default).
+    import multiprocessing
+    max_strategies = max(len(sbin.strategies) for sbin in bins)
+    masks = np.zeros((len(bins), 6, max_strategies), dtype=np.int64)
+    for b, sbin_strategies in enumerate(bin_index.strategies):
+        for d, strategies in enumerate(sbin_strategies):
+            for s, strategy in enumerate(strategies):
+                masks[b, d, s] = sum(1 << i % 5 for i in set(strategy))  # -1 is the last card
+    hand_bins = bin_index.hand_bins.astype(np.int64)
+    draw_indices = bin_index.draw_indices.astype(np.int64) + 1
+    strategies_count = np.array([len(sbin.strategies) for sbin in bins], dtype=np.int64)
+
+    # each raw (hand, strategy) pair as (bin strategy, canonical hand, discard mask over the canonical cards sorted by
+    # int value), counted
+    canonical, permutations = canonical_table()
+    renamed = rename_cards(records['cards'].astype(np.int64), permutations)
+    order = np.argsort(renamed, axis=1)
+    keys = []
+    for s in range(max_strategies):
+        played = np.flatnonzero(s < strategies_count[hand_bins])
+        thrown = masks[hand_bins[played], draw_indices[played], s][:, None] >> np.arange(5) & 1
+        sorted_thrown = thrown[np.arange(len(played))[:, None], order[played]]
+        mask = (sorted_thrown << np.arange(5)).sum(axis=1)
+        keys.append(((hand_bins[played] * max_strategies + s) * HANDS_COMBINATIONS + canonical[played]) * 32 + mask)
+    keys, multiplicities = np.unique(np.concatenate(keys), return_counts=True)
+    bin_strategies, pairs = keys // (HANDS_COMBINATIONS * 32), keys % (HANDS_COMBINATIONS * 32)
+    pairs, pair_of_key = np.unique(pairs, return_inverse=True)
+
+    # outcome stats of every canonical pair, hand by hand
+    hands = pairs // 32
+    starts = np.flatnonzero(np.concatenate(([True], hands[1:] != hands[:-1])))
+    stops = np.append(starts[1:], len(pairs))
+    tasks = []
+    for i in range(0, len(starts), _TASK_HANDS):
+        task_starts = starts[i:i + _TASK_HANDS]
+        task_stops = stops[i:i + _TASK_HANDS]
+        tasks.append([(int(hands[start]), [int(mask) for mask in pairs[start:stop] % 32])
+                      for start, stop in zip(task_starts, task_stops)])
+    if processes == 1:
+        results = [_evaluate_hands(task) for task in tasks]
+    else:
+        pool = multiprocessing.Pool(processes)
+        try:
+            results = pool.map(_evaluate_hands, tasks, chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+    pair_stats = np.concatenate(results).reshape(-1, 4)  # draws count, mean, m2, hits (final strength >= initial one)
+
+    # pairs combined into the bin strategies (Chan et al., a pair counted multiplicity times)
+    size = len(bins) * max_strategies
+    draws, mean, m2, hits = [pair_stats[pair_of_key, i] for i in range(4)]
+    count = np.bincount(bin_strategies, weights=multiplicities * draws, minlength=size)
+    total_mean = np.bincount(bin_strategies, weights=multiplicities * draws * mean, minlength=size) / \
+        np.maximum(count, 1)
+    deviations = m2 + draws * (mean - total_mean[bin_strategies]) ** 2
+    total_m2 = np.bincount(bin_strategies, weights=multiplicities * deviations, minlength=size)
+    total_hits = np.bincount(bin_strategies, weights=multiplicities * hits, minlength=size)
+    stats = SimulationStats(HANDS_COMBINATIONS)
+    for b, sbin in enumerate(bins):
+        stats.bins[sbin.name] = []
+        for s in range(len(sbin.strategies)):
+            key = b * max_strategies + s
+            n = int(count[key])
+            if n == 0:
+                stats.bins[sbin.name].append((Accumulator(), Accumulator()))
+                continue
+            p = total_hits[key] / n
+            stats.bins[sbin.name].append((Accumulator(n, float(total_mean[key]), float(total_m2[key])),
+                                          Accumulator(n, float(p), float(n * p * (1 - p)))))
+    return stats
+
+
+_strengths = None
+_combinations = {}
+
+
+def _evaluate_hands(task):
+    # worker side of exhaustive_stats: [(canonical hand index, [discard masks])] -> flat (draws, mean, m2, hits) of
+    # every (hand, mask) in order
+    global _strengths
+    if _strengths is None:
+        from learner.card import Hand
+        if Hand._hand_table is not None:
+            _strengths = Hand._hand_table.records()['strength'].astype(np.float64)
+        else:
+            from learner.evaluator import index_strengths
+            _strengths = index_strengths().astype(np.float64)
+    result = []
+    for index, masks in task:
+        cards = np.array(hand_from_index(index), dtype=np.int64)
+        unseen = np.setdiff1d(np.arange(52), cards)
+        initial_strength = _strengths[index]
+        for mask in masks:
+            thrown = np.array([mask >> i & 1 for i in range(5)], dtype=bool)
+            k = int(thrown.sum())
+            if k not in _combinations:
+                flat = np.fromiter(itertools.chain.from_iterable(itertools.combinations(range(47), k)), dtype=np.int8)
+                _combinations[k] = flat.reshape(-1, k) if k > 0 else np.empty((1, 0), dtype=np.int8)
+            combinations = _combinations[k]
+            hands = np.empty((len(combinations), 5), dtype=np.int64)
+            hands[:, :5 - k] = cards[~thrown]
+            hands[:, 5 - k:] = unseen[combinations]
+            ratio = _strengths[hand_indices(hands)] / initial_strength
+            mean = ratio.mean()
+            result.extend((len(ratio), mean, float(((ratio - mean) ** 2).sum()), int((ratio >= 1.).sum())))
+    return np.array(result, dtype=np.float64)
@@ -0,0 +1,141 @@
+"""
+Parallel, bounded-memory generation of the binary hand table (see learner.table), the replacement of
+Hand.evaluate_all_hand_combinations followed by convert_hands_json.
+The C(52,5) hand indices are split into chunks that are evaluated on a process pool in two passes:
+    1- every chunk returns the counts of its distinct s0 values, the counts are merged into the strength of each s0
+       (1 + the number of hands with a strictly smaller s0, as evaluate_all_hand_combinations ranks them)
+    2- every chunk is encoded into its table records, which are streamed to disk in hand index order
+Only a window of chunks is in flight at any time, so the memory used doesn't depend on the number of hands and the
+output is the same, byte for byte, whatever the number of processes or the chunk size. The memory budget bounds the
+resident memory of all the processes together: every process costs the resident size of the main one (interpreter,
+numpy, counted in full for every worker though forked pages are partly shared) plus its chunks, the number of
+processes is lowered when the budget can't hold them all.
+"""
+import collections
+import multiprocessing
+
+import numpy as np
+
+from learner.card import HandType
+from learner.evaluator import classify_hands
+from learner.index import HANDS_COMBINATIONS, hands_from_indices
+from learner.potential import hand_order, potential_flushes, potential_straights
+from learner.shared import process_rss
+from learner.stats import _replace_file
+from learner.table import HEADER, MAGIC, RECORD, VERSION
+
+DEFAULT_MEMORY_BUDGET = 256 * 1024 ** 2
+
+# generous upper bound of the working memory of a chunk per hand (evaluator temporaries, records, pickled result)
+BYTES_PER_HAND = 1024
+MIN_CHUNK_SIZE = 1024
+# resident size of a process where it can't be read (see learner.shared.process_rss)
+PROCESS_RSS_ESTIMATE = 64 * 1024 ** 2
+
+# numpy view of learner.table.RECORD
+RECORD_DTYPE = np.dtype([('hand_type', 'u1'), ('s0', '<u4'), ('strength', '<u4'), ('cards', 'u1', (5,)),
+                         ('flush_idx', 'i1'), ('flush_hand_id', '<i4'), ('straight_idx', 'i1'),
+                         ('straight_type', 'i1'), ('straight_hand_id', '<i4')])
+assert RECORD_DTYPE.itemsize == RECORD.size
+
+
+def generate_hand_table(file_name, processes=None, memory_budget=DEFAULT_MEMORY_BUDGET):
+    # processes defaults to the number of cores (fewer when the budget can't hold them), memory_budget (in bytes) bounds
+    # the peak resident memory of the main process and all the workers together
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    process_size = process_rss() or PROCESS_RSS_ESTIMATE
+    processes, chunk_size = max(processes, 1), 0
+    while processes >= 1:
+        chunk_size = _chunk_size(memory_budget, processes, process_size)
+        if chunk_size >= MIN_CHUNK_SIZE:
+            break
+        processes -= 1
+    if chunk_size < MIN_CHUNK_SIZE:
+        raise ValueError('A memory budget of {0} bytes is too small, a process alone is {1} bytes'.format(
+            memory_budget, process_size))
+    chunks = [(start, min(start + chunk_size, HANDS_COMBINATIONS)) for start in range(0, HANDS_COMBINATIONS, chunk_size)]
+
+    pool = multiprocessing.Pool(processes) if processes > 1 else None
+    try:
+        distinct_s0, counts = np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        for chunk_s0, chunk_counts in _ordered_map(pool, _count_s0, chunks, processes):
+            distinct_s0, counts = merge_s0_counts(distinct_s0, counts, chunk_s0, chunk_counts)
+        strength = np.cumsum(counts) - counts + 1
+
+        tmp_file_name = file_name + '.tmp'
+        with open(tmp_file_name, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, VERSION, RECORD.size, HANDS_COMBINATIONS))
+            tasks = [(start, stop, distinct_s0, strength) for start, stop in chunks]
+            for records in _ordered_map(pool, _encode_chunk, tasks, processes):
+                f.write(records)
+        _replace_file(tmp_file_name, file_name)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+
+def _chunk_size(memory_budget, processes, process_size):
+    # size of the chunks for processes processes (a pool of them besides the main process when more than 1) to stay
+    # within memory_budget: what the processes themselves leave, shared between the chunks being evaluated and the
+    # results the main process holds (one per worker)
+    if processes == 1:
+        working_set, chunks = memory_budget - process_size, 1
+    else:
+        working_set, chunks = memory_budget - (processes + 1) * process_size, 2 * processes + 1
+    return min(max(working_set, 0) // chunks // BYTES_PER_HAND, HANDS_COMBINATIONS)
+
+
+def merge_s0_counts(s0_a, counts_a, s0_b, counts_b):
+    # merges two (sorted distinct s0, count of each) histograms
+    distinct_s0 = np.union1d(s0_a, s0_b)
+    counts = np.zeros(len(distinct_s0), dtype=np.int64)
+    counts[np.searchsorted(distinct_s0, s0_a)] += counts_a
+    counts[np.searchsorted(distinct_s0, s0_b)] += counts_b
+    return distinct_s0, counts
+
+
+def _ordered_map(pool, func, tasks, window):
+    # like pool.imap but with at most window tasks submitted and not yet consumed
+    if pool is None:
+        for task in tasks:
+            yield func(task)
+        return
+    pending = collections.deque()
+    for task in tasks:
+        pending.append(pool.apply_async(func, (task,)))
+        if len(pending) >= window:
+            yield pending.popleft().get()
+    while pending:
+        yield pending.popleft().get()
+
+
+def _count_s0(chunk):
+    start, stop = chunk
+    s0 = classify_hands(hands_from_indices(np.arange(start, stop)))[1]
+    return np.unique(s0, return_counts=True)
+
+
+def _encode_chunk(task):
+    start, stop, distinct_s0, strength = task
+    hands = hands_from_indices(np.arange(start, stop))
+    hand_type, s0, cards = classify_hands(hands)
+
+    records = np.zeros(stop - start, dtype=RECORD_DTYPE)
+    records['hand_type'] = hand_type
+    records['s0'] = s0
+    records['strength'] = strength[np.searchsorted(distinct_s0, s0)]
+    records['cards'] = cards
+    records['flush_idx'] = -1
+    records['flush_hand_id'] = -1
+    records['straight_idx'] = -1
+    records['straight_type'] = -1
+    records['straight_hand_id'] = -1
+    # draws are only recorded for one pair and high card hands, as evaluate_all_hand_combinations does
+    drawing = np.flatnonzero(hand_type <= HandType.one_pair.value)
+    drawing_hands = hand_order(hands[drawing])
+    records['flush_idx'][drawing], records['flush_hand_id'][drawing] = potential_flushes(drawing_hands)
+    records['straight_idx'][drawing], records['straight_type'][drawing], records['straight_hand_id'][drawing] = \
+        potential_straights(drawing_hands)
+    return records.tobytes()
@@ -0,0 +1,83 @@
+"""
+Dense hand index: a perfect ranking of 5-card hands onto 0..HANDS_COMBINATIONS-1 using the colex combinatorial number
+system. A hand made of the card int values c0 < c1 < c2 < c3 < c4 has the index
+    C(c0, 1) + C(c1, 2) + C(c2, 3) + C(c3, 4) + C(c4, 5)
+so anything keyed by hand (strength, bin, discard advice...) can be stored as a flat array instead of a dict keyed by
+the sparse base-52 Hand.hand_id.
+"""
+
+HANDS_COMBINATIONS = 2598960
+
+# _BINOMIAL[k][n] = C(n, k) for k in 0..5 and n in 0..52
+_BINOMIAL = [[1] * 53]
+for _k in range(1, 6):
+    _BINOMIAL.append([0] * 53)
+    for _n in range(1, 53):
+        _BINOMIAL[_k][_n] = _BINOMIAL[_k][_n - 1] + _BINOMIAL[_k - 1][_n - 1]
+
+
+def hand_index(cards_id):
+    # type: (list[int]) -> int
+    # cards_id are the 5 (distinct) card int values, in any order
+    c = sorted(cards_id)
+    return _BINOMIAL[1][c[0]] + _BINOMIAL[2][c[1]] + _BINOMIAL[3][c[2]] + _BINOMIAL[4][c[3]] + _BINOMIAL[5][c[4]]
+
+
+def hand_from_index(index):
+    # type: (int) -> list[int]
+    # inverse of hand_index, the card int values are returned in ascending order
+    assert 0 <= index < HANDS_COMBINATIONS, 'Hand index out of range'
+    cards_id = [0] * 5
+    n = 52
+    for k in range(5, 0, -1):
+        n -= 1
+        while _BINOMIAL[k][n] > index:
+            n -= 1
+        cards_id[k - 1] = n
+        index -= _BINOMIAL[k][n]
+    return cards_id
+
+
+def hand_id_to_index(hand_id):
+    # type: (int) -> int
+    # conversion path from the old base-52 Hand.hand_id
+    cards_id = []
+    for j in range(5):
+        cards_id.append(hand_id % 52)
+        hand_id //= 52
+    return hand_index(cards_id)
+
+
+def index_to_hand_id(index):
+    # type: (int) -> int
+    # Hand.hand_id orders the cards by (rank, suit) descending
+    cards_id = sorted(hand_from_index(index), key=lambda card_id: (card_id % 13, card_id // 13), reverse=True)
+    hand_id = 0
+    for card_id in cards_id:
+        hand_id = hand_id * 52 + card_id
+    return hand_id
+
+
+def hand_indices(hands):
+    # Batch version of hand_index. hands is anything numpy can turn into an (N, 5) array of card int values; the
+    # indices are returned as an int64 array
+    import numpy as np
+    c = np.sort(np.asarray(hands, dtype=np.int64).reshape(-1, 5), axis=1)
+    binomial = np.array(_BINOMIAL, dtype=np.int64)
+    return (binomial[1][c[:, 0]] + binomial[2][c[:, 1]] + binomial[3][c[:, 2]] + binomial[4][c[:, 3]] +
+            binomial[5][c[:, 4]])
+
+
+def hands_from_indices(indices):
+    # Batch version of hand_from_index, returns an (N, 5) int64 array with each row in ascending order
+    import numpy as np
+    remainder = np.array(indices, dtype=np.int64).reshape(-1)
+    assert np.all((0 <= remainder) & (remainder < HANDS_COMBINATIONS)), 'Hand index out of range'
+    binomial = np.array(_BINOMIAL, dtype=np.int64)
+    cards_id = np.empty((len(remainder), 5), dtype=np.int64)
+    for k in range(5, 0, -1):
+        # C(n, k) is non-decreasing in n, the card is the largest n with C(n, k) <= remainder
+        n = np.searchsorted(binomial[k], remainder, side='right') - 1
+        cards_id[:, k - 1] = n
+        remainder -= binomial[k][n]
+    return cards_id
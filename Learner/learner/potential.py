@@ -0,0 +1,206 @@
+"""
+Draw detection (potential flush / potential straight) through lookup tables over the 13-bit rank mask of a hand (bit r
+set when a card of rank r is in the hand), with a batch version over (N, 5) arrays.
+The answers are the same as the original Hand.is_potential_flush / Hand.is_potential_straight ones:
+    potential_flush   -> (idx, hand_id)
+    potential_straight -> (idx, type, hand_id)
+where idx is the index (in hand order, i.e. sorted by rank then suit, descending) of the card to throw and hand_id the
+Hand.hand_id of a hand the draw can make. The hands are expected not to be made already (the tables are used for one
+pair and high card hands).
+"""
+
+RANK_MASKS = 1 << 13
+
+# the rank windows of a straight (the ace-low one is handled separately), _WINDOWS_SUMS also slides over the
+# truncated window starting at 9 as the original code did
+_STRAIGHT_WINDOWS = [0x1f << low for low in range(9)]
+_WINDOWS_SUMS = 10
+_ACE = 12
+_LOW_RANKS = 0xf  # 2, 3, 4 and 5, the ace-low straight without the ace
+
+
+def _build_tables():
+    lowest_set = [-1] * RANK_MASKS
+    windows_count = [0] * RANK_MASKS
+    windows_coverage = [None] * RANK_MASKS
+    for mask in range(RANK_MASKS):
+        for rank in range(13):
+            if mask >> rank & 1:
+                lowest_set[mask] = rank
+                break
+        coverage = [0] * 13
+        for low, window in enumerate(_STRAIGHT_WINDOWS):
+            # a window is a potential straight when the hand has 4 (or 5) of its ranks
+            if bin(mask & window).count('1') >= 4:
+                windows_count[mask] += 1
+                for rank in range(low, low + 5):
+                    coverage[rank] += 1
+        windows_coverage[mask] = tuple(coverage)
+    return lowest_set, windows_count, windows_coverage
+
+
+# lowest rank of a mask (-1 for 0), number of potential straight windows of a mask and how many of these windows cover
+# each rank
+_LOWEST_SET, _WINDOWS_COUNT, _WINDOWS_COVERAGE = _build_tables()
+_BIT_COUNT = [bin(mask).count('1') for mask in range(RANK_MASKS)]
+
+
+def rank_mask(cards_id):
+    # type: (list[int]) -> int
+    mask = 0
+    for card_id in cards_id:
+        mask |= 1 << card_id % 13
+    return mask
+
+
+def _hand_id(cards_id):
+    # Hand.hand_id of the cards: sorted by (rank, suit) descending, base 52
+    cards_id = sorted(cards_id, key=lambda card_id: card_id % 13 * 4 + card_id // 13, reverse=True)
+    hand_id = 0
+    for card_id in cards_id:
+        hand_id = hand_id * 52 + card_id
+    return hand_id
+
+
+def potential_flush(cards_id):
+    # type: (list[int]) -> tuple
+    # cards_id in hand order. Throw the card of the odd suit and draw the lowest rank missing from the hand
+    suits = [card_id // 13 for card_id in cards_id]
+    suits_count = [0] * 4
+    for suit in suits:
+        suits_count[suit] += 1
+    if max(suits_count) != 4:
+        return -1, -1
+    idx = suits.index(suits_count.index(1))
+    kept = cards_id[:idx] + cards_id[idx + 1:]
+    new_card = kept[0] // 13 * 13 + _LOWEST_SET[~rank_mask(cards_id) & (RANK_MASKS - 1)]
+    return idx, _hand_id(kept + [new_card])
+
+
+def potential_straight(cards_id):
+    # type: (list[int]) -> tuple
+    # cards_id in hand order. type is the number of straight windows the hand is one card away from (capped to 2)
+    ranks = [card_id % 13 for card_id in cards_id]
+    mask = rank_mask(cards_id)
+    if mask >> _ACE & 1 and _BIT_COUNT[mask & _LOW_RANKS] == 3:
+        idx, hand_id = _straight_draw(cards_id, ranks, mask, _LOW_RANKS)
+        return idx, 1, hand_id
+    windows_count = _WINDOWS_COUNT[mask]
+    if windows_count == 0:
+        return -1, -1, -1
+    # the window to draw for is the one with the most potential windows and hand cards over its ranks
+    hist = list(_WINDOWS_COVERAGE[mask])
+    for rank in ranks:
+        hist[rank] += 1
+    best_sum = -1
+    best_low = -1
+    for low in range(_WINDOWS_SUMS):
+        window_sum = sum(hist[low:low + 5])
+        if window_sum > best_sum:
+            best_sum = window_sum
+            best_low = low
+    idx, hand_id = _straight_draw(cards_id, ranks, mask, 0x1f << best_low)
+    return idx, min(windows_count, 2), hand_id
+
+
+def _straight_draw(cards_id, ranks, mask, window):
+    # throw the last card (in hand order) that's out of the window or pairs the card before it, draw the lowest rank of
+    # the window missing from the hand, of the suit following the first kept card's one
+    idx = -1
+    for i, rank in enumerate(ranks):
+        if not window >> rank & 1 or (i > 0 and rank == ranks[i - 1]):
+            idx = i
+    kept = list(cards_id)
+    kept.pop(idx)
+    new_card = (kept[0] // 13 + 1) % 4 * 13 + _LOWEST_SET[window & ~mask]
+    return idx, _hand_id(kept + [new_card])
+
+
+def _tables_as_arrays():
+    import numpy as np
+    global _arrays
+    if _arrays is None:
+        _arrays = (np.array(_LOWEST_SET, dtype=np.int64), np.array(_WINDOWS_COUNT, dtype=np.int64),
+                   np.array(_WINDOWS_COVERAGE, dtype=np.int64), np.array(_BIT_COUNT, dtype=np.int64))
+    return _arrays
+
+
+_arrays = None
+
+
+def hand_order(hands):
+    # (N, 5) array of card int values sorted in hand order (rank then suit, descending)
+    import numpy as np
+    c = np.asarray(hands, dtype=np.int64).reshape(-1, 5)
+    order = np.argsort(-(c % 13 * 4 + c // 13), axis=1)
+    return c[np.arange(len(c))[:, None], order]
+
+
+def potential_flushes(hands):
+    # Batch version of potential_flush, hands is an (N, 5) array of card int values in hand order (see hand_order).
+    # Returns (idx, hand_id) arrays, -1 for the hands that aren't potential flushes
+    import numpy as np
+    lowest_set = _tables_as_arrays()[0]
+    c = np.asarray(hands, dtype=np.int64).reshape(-1, 5)
+    suits = c // 13
+    suits_count = (suits[:, :, None] == np.arange(4)).sum(axis=1)
+    is_potential = suits_count.max(axis=1) == 4
+    odd_suit = np.argmin(np.where(suits_count == 0, 5, suits_count), axis=1)
+    idx = np.argmax(suits == odd_suit[:, None], axis=1)
+    kept = _drop_column(c, idx)
+    mask = _rank_masks(c)
+    new_card = kept[:, 0] // 13 * 13 + lowest_set[~mask & (RANK_MASKS - 1)]
+    hand_id = _hand_ids(np.column_stack((kept, new_card)))
+    return np.where(is_potential, idx, -1), np.where(is_potential, hand_id, -1)
+
+
+def potential_straights(hands):
+    # Batch version of potential_straight, hands is an (N, 5) array of card int values in hand order (see
+    # hand_order). Returns (idx, type, hand_id) arrays, -1 for the hands that aren't potential straights
+    import numpy as np
+    lowest_set, windows_count, windows_coverage, bit_count = _tables_as_arrays()
+    c = np.asarray(hands, dtype=np.int64).reshape(-1, 5)
+    ranks = c % 13
+    mask = _rank_masks(c)
+    ace_low = ((mask >> _ACE & 1) == 1) & (bit_count[mask & _LOW_RANKS] == 3)
+    count = windows_count[mask]
+
+    hist = windows_coverage[mask] + (ranks[:, :, None] == np.arange(13)).sum(axis=1)
+    cumulative = np.zeros((len(c), 15), dtype=np.int64)
+    cumulative[:, 1:14] = np.cumsum(hist, axis=1)
+    cumulative[:, 14] = cumulative[:, 13]
+    low = np.arange(_WINDOWS_SUMS)
+    window_sums = cumulative[:, low + 5] - cumulative[:, low]
+    best_low = np.argmax(window_sums, axis=1)  # first of the largest sums
+    window = np.where(ace_low, _LOW_RANKS, 0x1f << best_low)
+
+    paired = np.zeros(c.shape, dtype=bool)
+    paired[:, 1:] = ranks[:, 1:] == ranks[:, :-1]
+    throwable = ((window[:, None] >> ranks & 1) == 0) | paired
+    idx = np.where(throwable.any(axis=1), 4 - np.argmax(throwable[:, ::-1], axis=1), -1)
+    kept = _drop_column(c, idx)
+    new_card = (kept[:, 0] // 13 + 1) % 4 * 13 + lowest_set[window & ~mask & (RANK_MASKS - 1)]
+    hand_id = _hand_ids(np.column_stack((kept, new_card)))
+
+    is_potential = ace_low | (count > 0)
+    straight_type = np.where(ace_low, 1, np.minimum(count, 2))
+    return (np.where(is_potential, idx, -1), np.where(is_potential, straight_type, -1),
+            np.where(is_potential, hand_id, -1))
+
+
+def _rank_masks(c):
+    import numpy as np
+    return np.bitwise_or.reduce(1 << c % 13, axis=1)
+
+
+def _drop_column(c, idx):
+    # removes column idx (-1 being the last one, like list.pop) of each row
+    import numpy as np
+    keep = np.arange(5) != (idx % 5)[:, None]
+    return c[keep].reshape(-1, 4)
+
+
+def _hand_ids(c):
+    import numpy as np
+    c = hand_order(c)
+    return c[:, 0] * 52 ** 4 + c[:, 1] * 52 ** 3 + c[:, 2] * 52 ** 2 + c[:, 3] * 52 + c[:, 4]
@@ -0,0 +1,189 @@
+"""
+Shared warm tables. What a bot process derives from the hand table and bins.json at startup (the bin index, the
+equity histograms and the odds of every hand, seconds of numpy work) is written once to a file that later processes
+memory-map read-only: attaching is a header read and a few array views, and every process mapping the file shares
+one copy of it in the page cache, as for the hand table (learner.table) and the stats file (learner.stats_table).
+The file is a fixed HEADER, a JSON directory of the arrays (name, dtype, shape, offset) and the arrays, 64-byte
+aligned. The header ties it to the bins definition and to the hand table file it was built from, a stale file is
+refused. Processes starting together build it once: the builder holds a lock file (file name + '.lock') meanwhile.
+The lock file is left in place: removing it would let a waiting process lock the removed file while a new one
+locks a new file, and both would build.
+"""
+import json
+import mmap
+import os
+import struct
+
+import numpy as np
+
+from learner.stats import BinIndex, StatBuilder, _replace_file
+
+MAGIC = b'JMDW'
+VERSION = 2
+
+# magic, version, bins hash, hand table size, hand table modification time, directory size
+HEADER = struct.Struct('<4sH32sQQI')
+_ALIGNMENT = 64
+
+
+class SharedTables(object):
+    """
+    Read-only, memory-mapped warm tables. attach() installs them: StatBuilder.bin_index is set and an EquityEngine
+    reading the shared histograms is returned.
+    """
+
+    def __init__(self, file_name, hand_table_file_name, bins):
+        self._file = open(file_name, 'rb')
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._mmap) < HEADER.size:
+            raise ValueError('{0} is not a shared tables file'.format(file_name))
+        magic, version, bins_hash, table_size, table_mtime, directory_size = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC:
+            raise ValueError('{0} is not a shared tables file'.format(file_name))
+        if version != VERSION:
+            raise ValueError('Unsupported shared tables version {0} in {1}'.format(version, file_name))
+        from learner.stats_table import bins_hash as hash_bins
+        if bins_hash != hash_bins(bins) or (table_size, table_mtime) != _file_stamp(hand_table_file_name):
+            raise ValueError('{0} was built from other bins or another hand table'.format(file_name))
+        directory = json.loads(self._mmap[HEADER.size:HEADER.size + directory_size].decode('utf-8'))
+        self.arrays = {}
+        for name, dtype, shape, offset in directory:
+            count = int(np.prod(shape)) if shape else 1
+            if offset + count * np.dtype(dtype).itemsize > len(self._mmap):
+                raise ValueError('{0} is truncated'.format(file_name))
+            self.arrays[name] = np.frombuffer(self._mmap, dtype=np.dtype(dtype), count=count,
+                                              offset=offset).reshape(shape)
+
+    def close(self):
+        # the arrays (and what was attached) can't be used after
+        self.arrays = {}
+        self._mmap.close()
+        self._file.close()
+
+    def attach(self, bins):
+        # type: (list) -> object
+        from learner.card import Hand
+        from learner.equity import EquityEngine
+        StatBuilder.bin_index = BinIndex(bins, self.arrays['hand_bins'], self.arrays['draw_indices'])
+        equity = EquityEngine.from_histograms(Hand._hand_table.records()['strength'],
+                                              self.arrays['distinct_strengths'], self.arrays['counts'],
+                                              self.arrays['card_counts'])
+        equity.use_odds_table(self.arrays['odds_counts'])
+        return equity
+
+    @staticmethod
+    def write(file_name, hand_table_file_name, bins, bin_index, equity):
+        # bin_index: StatBuilder.bin_index, equity: an EquityEngine, both built for bins and the hand table. Written
+        # to a temporary file of the process then renamed, so processes attaching meanwhile see the old file or the
+        # new one.
+        from learner.equity import odds_table
+        from learner.stats_table import bins_hash
+        distinct_strengths, counts, card_counts = equity.histograms()
+        arrays = [('hand_bins', bin_index.hand_bins), ('draw_indices', bin_index.draw_indices),
+                  ('distinct_strengths', distinct_strengths), ('counts', counts), ('card_counts', card_counts),
+                  ('odds_counts', odds_table(equity.strengths))]
+        arrays = [(name, np.ascontiguousarray(array)) for name, array in arrays]
+        # the directory size depends on the offsets it holds, sizing it with wide offsets first keeps it stable
+        directory_size = len(_directory(arrays, [10 ** 12] * len(arrays)))
+        offset = _align(HEADER.size + directory_size)
+        offsets = []
+        for name, array in arrays:
+            offsets.append(offset)
+            offset = _align(offset + array.nbytes)
+        directory = _directory(arrays, offsets).ljust(directory_size)
+        table_size, table_mtime = _file_stamp(hand_table_file_name)
+        tmp_file_name = '{0}.{1}.tmp'.format(file_name, os.getpid())
+        try:
+            with open(tmp_file_name, 'wb') as f:
+                f.write(HEADER.pack(MAGIC, VERSION, bins_hash(bins), table_size, table_mtime, directory_size))
+                f.write(directory)
+                for (name, array), array_offset in zip(arrays, offsets):
+                    f.write(b'\0' * (array_offset - f.tell()))
+                    f.write(array.tobytes())
+            _replace_file(tmp_file_name, file_name)
+        finally:
+            if os.path.exists(tmp_file_name):
+                os.remove(tmp_file_name)
+
+
+def _directory(arrays, offsets):
+    return json.dumps([[name, array.dtype.str, list(array.shape), offset]
+                       for (name, array), offset in zip(arrays, offsets)]).encode('utf-8')
+
+
+def _align(offset):
+    return (offset + _ALIGNMENT - 1) // _ALIGNMENT * _ALIGNMENT
+
+
+def _file_stamp(file_name):
+    stat = os.stat(file_name)
+    return stat.st_size, int(stat.st_mtime)
+
+
+def attach_or_build(file_name, hand_table_file_name):
+    # Attaches the shared tables of the loaded hand table and bins (Hand.load_hand_table, StatBuilder.load_bins with
+    # index=False), building and writing them first when file_name is missing or stale. Returns the EquityEngine and
+    # the SharedTables (None if they had to be built and couldn't be written and attached, the tables built in memory
+    # are used then).
+    from learner.equity import EquityEngine
+    try:
+        tables = SharedTables(file_name, hand_table_file_name, StatBuilder.bins)
+        return tables.attach(StatBuilder.bins), tables
+    except (IOError, OSError, ValueError):
+        pass
+    lock = _lock(file_name + '.lock')
+    try:
+        if lock is not None:
+            # another process may have built the file while this one waited for the lock
+            try:
+                tables = SharedTables(file_name, hand_table_file_name, StatBuilder.bins)
+                return tables.attach(StatBuilder.bins), tables
+            except (IOError, OSError, ValueError):
+                pass
+        StatBuilder.index_bins()
+        equity = EquityEngine()
+        try:
+            SharedTables.write(file_name, hand_table_file_name, StatBuilder.bins, StatBuilder.bin_index, equity)
+            tables = SharedTables(file_name, hand_table_file_name, StatBuilder.bins)
+        except (IOError, OSError, ValueError):
+            return equity, None
+        return tables.attach(StatBuilder.bins), tables
+    finally:
+        if lock is not None:
+            lock.close()  # releases the lock
+
+
+def _lock(file_name):
+    # the file file_name opened and exclusively locked (waiting for the process holding it), None where it can't be
+    # (no fcntl, read-only directory): the tables are then built without a lock
+    try:
+        import fcntl
+    except ImportError:
+        return None
+    try:
+        f = open(file_name, 'a')
+    except (IOError, OSError):
+        return None
+    try:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+    except (IOError, OSError):
+        f.close()
+        return None
+    return f
+
+
+def process_rss():
+    # resident set size of the current process in bytes, None where it can't be read
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * mmap.PAGESIZE
+    except (IOError, OSError):
+        pass
+    try:
+        import resource
+        import sys
+        # peak rather than current, in bytes on mac and in kilobytes elsewhere
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return rss if sys.platform == 'darwin' else rss * 1024
+    except ImportError:
+        return None
@@ -0,0 +1,126 @@
+"""
+Batch Monte Carlo version of StatBuilder.simulate_deal. A batch of decks is shuffled at once (one permutation of the 52
+cards per row), hands are dealt by slicing the permutations, strategies are applied as discard masks over the hand table
+cards and the hands are scored by hand index lookups, so a deal costs a few array operations per strategy profile
+instead of Python objects.
+A row plays exactly what simulate_deal plays with Deck(cards_values=row): every player is dealt 5 cards from the end of
+the deck, and for each strategy profile (one strategy per player) the players draw in turn from the cards that follow.
+"""
+import itertools
+
+import numpy as np
+
+from learner.index import hand_indices
+from learner.stats import Accumulator, SimulationStats
+
+
+class BatchSimulator(object):
+    """
+    Plays batches of deals for the bins of a bin index and gathers the per (bin, strategy) stats as a SimulationStats.
+    """
+
+    def __init__(self, bins, bin_index, records, no_of_players=2):
+        # bins and bin_index: StatBuilder.bins and StatBuilder.bin_index, records: the hand table records
+        assert 10 * no_of_players < 52, 'Not enough cards!'
+        self.bins = bins
+        self.no_of_players = no_of_players
+        self._hand_bins = bin_index.hand_bins.astype(np.int64)
+        self._draw_indices = bin_index.draw_indices.astype(np.int64) + 1
+        self._strengths = records['strength'].astype(np.float64)
+        self._cards = records['cards'].astype(np.int64)  # HandValue order, the strategies card indices refer to it
+        self.max_strategies = max(len(sbin.strategies) for sbin in bins)
+        # discard mask of every (bin, draw index + 1, strategy), strategies past the bin ones are never played
+        self._masks = np.zeros((len(bins), 6, self.max_strategies), dtype=np.int64)
+        self._strategies_count = np.array([len(sbin.strategies) for sbin in bins], dtype=np.int64)
+        for b, sbin_strategies in enumerate(bin_index.strategies):
+            for d, strategies in enumerate(sbin_strategies):
+                for s, strategy in enumerate(strategies):
+                    self._masks[b, d, s] = sum(1 << i % 5 for i in set(strategy))  # -1 is the last card
+
+    def simulate(self, iterations, batch=4096, random_state=None):
+        # type: (int, int, np.random.RandomState) -> SimulationStats
+        if random_state is None:
+            random_state = np.random.RandomState()
+        groups = _Groups(len(self.bins), self.max_strategies)
+        done = 0
+        while done < iterations:
+            decks = random_state.rand(min(batch, iterations - done), 52).argsort(axis=1)
+            self.simulate_decks(decks, groups)
+            done += len(decks)
+        return groups.simulation_stats(self.bins, iterations)
+
+    def simulate_decks(self, decks, groups):
+        # decks: (N, 52) array of card int values, dealt from the end as Deck does
+        decks = np.asarray(decks, dtype=np.int64)
+        rows = np.arange(len(decks))
+        players = []
+        for i in range(self.no_of_players):
+            index = hand_indices(decks[:, 52 - 5 * (i + 1):52 - 5 * i])
+            hand_bin = self._hand_bins[index]
+            assert np.all(hand_bin >= 0), 'A hand is in no bin'
+            players.append((index, hand_bin, self._strategies_count[hand_bin]))
+        first_draw = 52 - 5 * self.no_of_players
+        for profile in itertools.product(range(self.max_strategies), repeat=self.no_of_players):
+            played = np.ones(len(decks), dtype=bool)
+            for (index, hand_bin, strategies_count), s in zip(players, profile):
+                played &= s < strategies_count
+            if not played.any():
+                continue
+            top = np.full(len(decks), first_draw, dtype=np.int64)  # cards still in the deck
+            for (index, hand_bin, strategies_count), s in zip(players, profile):
+                mask = self._masks[hand_bin, self._draw_indices[index], s]
+                thrown = (mask[:, None] >> np.arange(5)) & 1
+                # the thrown cards are replaced one after the other by the cards at the end of the deck
+                drawn = decks[rows[:, None], np.maximum(top[:, None] - np.cumsum(thrown, axis=1), 0)]
+                final = np.where(thrown == 1, drawn, self._cards[index])
+                top -= thrown.sum(axis=1)
+                ratio = self._strengths[hand_indices(final)] / self._strengths[index]
+                groups.add(hand_bin[played], s, ratio[played])
+
+
+class _Groups(object):
+    # per (bin, strategy) count, mean and m2 of a stream of batches, batches are combined as Accumulator.merge does
+
+    def __init__(self, bins_count, max_strategies):
+        self.max_strategies = max_strategies
+        size = bins_count * max_strategies
+        self.performance = (np.zeros(size), np.zeros(size), np.zeros(size))
+        self.unweighted = (np.zeros(size), np.zeros(size), np.zeros(size))
+
+    def add(self, hand_bin, strategy, ratio):
+        key = hand_bin * self.max_strategies + strategy
+        self.performance = _merge(self.performance, _moments(key, ratio, len(self.performance[0])))
+        self.unweighted = _merge(self.unweighted, _moments(key, (ratio >= 1.).astype(np.float64),
+                                                           len(self.unweighted[0])))
+
+    def simulation_stats(self, bins, iterations_count):
+        stats = SimulationStats(iterations_count)
+        for b, sbin in enumerate(bins):
+            stats.bins[sbin.name] = []
+            for s in range(len(sbin.strategies)):
+                key = b * self.max_strategies + s
+                stats.bins[sbin.name].append((_accumulator(self.performance, key),
+                                              _accumulator(self.unweighted, key)))
+        return stats
+
+
+def _moments(key, x, size):
+    count = np.bincount(key, minlength=size).astype(np.float64)
+    mean = np.bincount(key, weights=x, minlength=size) / np.maximum(count, 1)
+    m2 = np.bincount(key, weights=(x - mean[key]) ** 2, minlength=size)
+    return count, mean, m2
+
+
+def _merge(a, b):
+    # Chan et al. pairwise update, elementwise
+    count = a[0] + b[0]
+    delta = b[1] - a[1]
+    safe_count = np.maximum(count, 1)
+    return count, a[1] + delta * b[0] / safe_count, a[2] + b[2] + delta ** 2 * a[0] * b[0] / safe_count
+
+
+def _accumulator(moments, key):
+    count = int(moments[0][key])
+    if count == 0:
+        return Accumulator()
+    return Accumulator(count, float(moments[1][key]), float(moments[2][key]))
@@ -1,5 +1,86 @@
 from learner.card import Deck, Card, Hand, HandType, HandValue, CustomEncoder, as_enum
 import json
+import math
+import os
+
+
+class Accumulator(object):
+    """
+    Streaming count, mean and sum of squared deviations from the mean (m2) of a sample, updated with Welford's method
+    so millions of updates don't lose precision. Two accumulators merge exactly (Chan et al.) and in any order.
+    unknown samples (loaded from older stats files) have a known mean but no m2: they count as sitting at their mean,
+    so m2 is the spread of the other samples and the variance is estimated from those only.
+    """
+    __slots__ = ('count', 'mean', 'm2', 'unknown')
+
+    def __init__(self, count=0, mean=0., m2=0., unknown=0):
+        self.count = count
+        self.mean = mean
+        self.m2 = m2
+        self.unknown = unknown
+
+    def __setstate__(self, state):
+        # accumulators pickled (checkpoints) before unknown counts existed have none
+        self.unknown = 0
+        for slots in state:
+            for name, value in (slots or {}).items():
+                setattr(self, name, value)
+
+    def add(self, x):
+        self.count += 1
+        delta = x - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (x - self.mean)
+
+    def merge(self, other):
+        # type: (Accumulator) -> Accumulator
+        count = self.count + other.count
+        if count == 0:
+            return Accumulator()
+        delta = other.mean - self.mean
+        return Accumulator(count, self.mean + delta * other.count / count,
+                           self.m2 + other.m2 + delta * delta * self.count * other.count / count,
+                           self.unknown + other.unknown)
+
+    def copy(self):
+        return Accumulator(self.count, self.mean, self.m2, self.unknown)
+
+    @property
+    def variance(self):
+        # sample variance, nan for less than 2 samples with a known deviation
+        known = self.count - self.unknown
+        return self.m2 / (known - 1) if known > 1 else float('nan')
+
+    @property
+    def std_error(self):
+        # standard error of the mean (of all the samples)
+        return math.sqrt(self.variance / self.count) if self.count - self.unknown > 1 else float('nan')
+
+    def confidence_interval(self, z=1.96):
+        # (low, high) bounds of the mean, 95% by default
+        return self.mean - z * self.std_error, self.mean + z * self.std_error
+
+
+def _strategy_stats_line(i, performance, unweighted):
+    # stats_dump line of a strategy: index, hit count, performance, unweighted performance, m2 of the performance and,
+    # when some are, the hits whose performance deviation is unknown (see Accumulator)
+    line = '{0},{1},{2},{3},{4}'.format(i, performance.count, repr(performance.mean if performance.count else 1.),
+                                        repr(unweighted.mean if unweighted.count else 1.), repr(performance.m2))
+    return line + (',{0}\n'.format(performance.unknown) if performance.unknown else '\n')
+
+
+def _strategy_stats_from_line(l_data):
+    # inverse of _strategy_stats_line. The older 4 fields lines have no m2 (or a nan one), all their hits are unknown.
+    # The unweighted performance is a 0/1 sample so its m2 follows from its mean
+    count = int(l_data[1])
+    m2 = float(l_data[4]) if len(l_data) > 4 else float('nan')
+    unknown = int(l_data[5]) if len(l_data) > 5 else 0
+    if math.isnan(m2):
+        m2, unknown = 0., count
+    performance = Accumulator(count, float(l_data[2]), m2, unknown) if count else Accumulator()
+    p = float(l_data[3])
+    unweighted = Accumulator(count, p, count * p * (1 - p)) if count else Accumulator()
+    return performance, unweighted
 
 
 class SBin(object):
@@ -14,9 +95,9 @@ class SBin(object):
         self.rank_from = 0
         self.rank_to = 0
         self.__strategies = [[]]
-        self.strategies_performance = [1]
-        self.strategies_hitcount = [0]
-        self.strategies_performance_unweighted = [1]
+        # per strategy accumulators of the ratio strength after / before the draw and of (ratio >= 1)
+        self.performance_stats = [Accumulator()]
+        self.unweighted_stats = [Accumulator()]
         self.index = 0
 
     @property
@@ -25,10 +106,28 @@ class SBin(object):
 
     @strategies.setter
     def strategies(self, st):
-        self.__strategies = st
-        self.strategies_performance = [1] * len(self.__strategies)
-        self.strategies_performance_unweighted = [1] * len(self.__strategies)
-        self.strategies_hitcount = [0] * len(self.__strategies)
+        # kept as tuples so a bin can be shared by hands, threads and processes, a -1 card index is a placeholder for
+        # the card a hand of the bin throws to draw to its potential straight or flush (see resolve_strategies)
+        self.__strategies = tuple(tuple(strategy) for strategy in st)
+        self.reset_stats()
+
+    @property
+    def strategies_hitcount(self):
+        return [stats.count for stats in self.performance_stats]
+
+    @property
+    def strategies_performance(self):
+        # a strategy that has never been tried is assumed neutral (1)
+        return [stats.mean if stats.count else 1 for stats in self.performance_stats]
+
+    @property
+    def strategies_performance_unweighted(self):
+        return [stats.mean if stats.count else 1 for stats in self.unweighted_stats]
+
+    @property
+    def strategies_std_error(self):
+        # standard error of strategies_performance
+        return [stats.std_error for stats in self.performance_stats]
 
     def is_member(self, hand_value):
         # hand_value in this case is HandValue
@@ -44,29 +143,156 @@ class SBin(object):
                other_is_potential_flush == self.is_potential_flush and \
                self.is_potential_straight == other_is_potential_straight
 
+    def draw_index(self, hand_value):
+        # index of the card a hand of this bin throws for its potential straight or flush, -1 if none
+        if self.is_potential_straight in [1, 2]:
+            return hand_value.is_potential_straight[0]
+        elif self.is_potential_flush:
+            return hand_value.is_potential_flush[0]
+        return -1
+
+    def resolve_strategies(self, draw_index):
+        # the strategies of a hand of this bin, with the -1 placeholders replaced by its draw_index
+        return tuple((draw_index,) + strategy[1:] if len(strategy) > 0 and strategy[0] == -1 else strategy
+                     for strategy in self.__strategies)
+
     def __str__(self):
         return self.name
 
     def print_stats(self):
         print(self.name)
         for i in range(len(self.strategies)):
-            print('Strategy {0}: Hit count = {1}, Performance = {2}, Unweighted Performance = {3}'.format(i,
-                                                                                                          self.strategies_hitcount[
-                                                                                                              i],
-                                                                                                          self.strategies_performance[
-                                                                                                              i],
-                                                                                                          self.strategies_performance_unweighted[
-                                                                                                              i]))
+            print('Strategy {0}: Hit count = {1}, Performance = {2} (+/- {3}), Unweighted Performance = {4} '
+                  '(+/- {5})'.format(i, self.strategies_hitcount[i], self.strategies_performance[i],
+                                     self.performance_stats[i].std_error, self.strategies_performance_unweighted[i],
+                                     self.unweighted_stats[i].std_error))
 
     def dump_stats(self, f):
         f.write(self.name + '\n')
         for i in range(len(self.strategies)):
-            f.write('{0},{1},{2},{3}\n'.format(i, self.strategies_hitcount[i], self.strategies_performance[i],
-                                           self.strategies_performance_unweighted[i]))
+            f.write(_strategy_stats_line(i, self.performance_stats[i], self.unweighted_stats[i]))
+
+    def reset_stats(self):
+        self.performance_stats = [Accumulator() for strategy in self.__strategies]
+        self.unweighted_stats = [Accumulator() for strategy in self.__strategies]
+
+    def max_std_error(self):
+        # largest standard error of the strategies performance, inf while a strategy has less than 2 hits
+        max_std_error = 0.
+        for stats in self.performance_stats:
+            std_error = stats.std_error
+            max_std_error = max(max_std_error, float('inf') if math.isnan(std_error) else std_error)
+        return max_std_error
+
+
+class SimulationStats(object):
+    """
+    Per bin (by name) and per strategy (performance, unweighted performance) Accumulators of a simulation run, plus its
+    iterations count. Merging is associative and commutative so the results of worker processes, runs or machines can
+    be combined in any order. The file format is the stats_dump one.
+    """
+
+    def __init__(self, iterations_count=0):
+        from collections import OrderedDict
+        self.iterations_count = iterations_count
+        self.bins = OrderedDict()  # type: dict[str, list[tuple[Accumulator, Accumulator]]]
+
+    @staticmethod
+    def from_bins(bins, iterations_count):
+        stats = SimulationStats(iterations_count)
+        for sbin in bins:
+            stats.bins[sbin.name] = [(performance.copy(), unweighted.copy()) for performance, unweighted in
+                                     zip(sbin.performance_stats, sbin.unweighted_stats)]
+        return stats
+
+    def apply(self, bins):
+        # writes the stats into the SBins of the same name
+        for sbin in bins:
+            for i, (performance, unweighted) in enumerate(self.bins.get(sbin.name, [])):
+                sbin.performance_stats[i] = performance.copy()
+                sbin.unweighted_stats[i] = unweighted.copy()
+
+    def merge(self, other):
+        # type: (SimulationStats) -> SimulationStats
+        merged = SimulationStats(self.iterations_count + other.iterations_count)
+        for name in list(self.bins) + [name for name in other.bins if name not in self.bins]:
+            strategies = self.bins.get(name, [])
+            other_strategies = other.bins.get(name, [])
+            merged.bins[name] = []
+            for i in range(max(len(strategies), len(other_strategies))):
+                a = strategies[i] if i < len(strategies) else (Accumulator(), Accumulator())
+                b = other_strategies[i] if i < len(other_strategies) else (Accumulator(), Accumulator())
+                merged.bins[name].append((a[0].merge(b[0]), a[1].merge(b[1])))
+        return merged
+
+    @staticmethod
+    def load(file_name):
+        stats = SimulationStats()
+        with open(file_name, 'r') as f:
+            stats.iterations_count = int(f.readline().strip())
+            strategies = None
+            for l in f:
+                l_data = l.strip().split(',')
+                if l_data == ['']:
+                    continue
+                if len(l_data) == 1:
+                    strategies = stats.bins[l_data[0]] = []
+                elif len(l_data) in (4, 5, 6) and strategies is not None:
+                    strategies.append(_strategy_stats_from_line(l_data))
+                else:
+                    raise ValueError('Invalid stats file format in {0}'.format(file_name))
+        return stats
+
+    def dump(self, file_name):
+        with open(file_name, 'w') as f:
+            f.write('{0}\n'.format(self.iterations_count))
+            for name, strategies in self.bins.items():
+                f.write(name + '\n')
+                for i, (performance, unweighted) in enumerate(strategies):
+                    f.write(_strategy_stats_line(i, performance, unweighted))
+
+
+class BinIndex(object):
+    """
+    Bin and resolved strategies of every hand, by hand index, built from the hand table records. Looking a hand up is
+    two array reads and a tuple lookup; the arrays are read only so an index can be shared by threads and (forked)
+    processes.
+    """
+
+    def __init__(self, bins, hand_bins, draw_indices):
+        # hand_bins: bin of each hand index (see bin_hands), draw_indices: index of the card thrown for the potential
+        # straight/flush (-1 if none) of each hand index, as SBin.draw_index
+        self.bins = list(bins)
+        self.hand_bins = hand_bins
+        self.draw_indices = draw_indices
+        # resolved strategies per bin and draw index (-1 to 4)
+        self.strategies = [[sbin.resolve_strategies(draw_index) for draw_index in range(-1, 5)] for sbin in self.bins]
+
+    @staticmethod
+    def from_records(bins, records):
+        # type: (list, object) -> BinIndex
+        import numpy as np
+        hand_bins = bin_hands(bins, records)
+        is_potential_straight = np.array([False] + [sbin.is_potential_straight in [1, 2] for sbin in bins],
+                                         dtype=bool)[hand_bins + 1]
+        is_potential_flush = np.array([False] + [bool(sbin.is_potential_flush) for sbin in bins],
+                                      dtype=bool)[hand_bins + 1]
+        draw_indices = np.where(is_potential_straight, records['straight_idx'],
+                                np.where(is_potential_flush, records['flush_idx'], -1)).astype(np.int8)
+        return BinIndex(bins, hand_bins, draw_indices)
+
+    def lookup(self, hand_index):
+        # type: (int) -> tuple
+        # (bin, strategies) of a hand index, (None, None) for a hand that's in no bin
+        bin_index = self.hand_bins[hand_index]
+        if bin_index < 0:
+            return None, None
+        return self.bins[bin_index], self.strategies[bin_index][self.draw_indices[hand_index] + 1]
 
 
 class StatBuilder(object):
     bins = []
+    bin_index = None  # type: BinIndex
     global_iterations_count = 0
 
     def __init__(self, no_of_players=2):
@@ -75,18 +301,27 @@ class StatBuilder(object):
 
     @staticmethod
     def bin_hand(hand):
+        return StatBuilder.classify_hand(hand)[0]
+
+    @staticmethod
+    def classify_hand(hand):
+        # (bin, strategies) of a hand, the strategies being the bin ones resolved for the hand. Uses the bin index when
+        # there's one (see index_bins), scans the bins otherwise
+        if StatBuilder.bin_index is not None:
+            return StatBuilder.bin_index.lookup(hand.hand_index)
         for hbin in StatBuilder.bins:
             if hbin.is_member(hand.hand_value):
-                # fix potential flush/straight
-                for idx, strategy in enumerate(hbin.strategies):
-                    if len(strategy) > 0 and strategy[0] == -1:
-                        if hbin.is_potential_straight in [1, 2]:
-                            strategy[0] = hand.hand_value.is_potential_straight[0]
-                        elif hbin.is_potential_flush:
-                            strategy[0] = hand.hand_value.is_potential_flush[0]
-                        hbin.strategies[idx] = strategy
-                return hbin
-        print('hi')
+                return hbin, hbin.resolve_strategies(hbin.draw_index(hand.hand_value))
+        return None, None
+
+    @staticmethod
+    def index_bins():
+        # builds the bin index of the current bins, needs the hand table (Hand.load_hand_table). Called by define_bins
+        # and load_bins, call it again if the bins are changed after.
+        if Hand._hand_table is None:
+            StatBuilder.bin_index = None
+        else:
+            StatBuilder.bin_index = BinIndex.from_records(StatBuilder.bins, Hand._hand_table.records())
 
     @staticmethod
     def define_bins():
@@ -114,15 +349,20 @@ class StatBuilder(object):
         hbin.is_potential_flush = False
         hbin.strategies = [[], [4]]  # 1: Don't do anything, 2: Throw the fifth card
         StatBuilder.bins.append(hbin)
+        StatBuilder.index_bins()
 
     @staticmethod
     def dump_bins(file_name):
         # write bins (defined in define_bins) to a json file
         with open(file_name, 'w') as outfile:
-            json.dump([hbin.__dict__ for hbin in StatBuilder.bins], outfile, cls=CustomEncoder)
+            # the stats accumulators go to stats_dump, not to the bins definition
+            json.dump([dict((k, v) for k, v in hbin.__dict__.items()
+                            if k not in ('performance_stats', 'unweighted_stats')) for hbin in StatBuilder.bins],
+                      outfile, cls=CustomEncoder)
 
     @staticmethod
-    def load_bins(file_name):
+    def load_bins(file_name, index=True):
+        # index = False skips building the bin index (e.g. when it's attached from shared tables, see learner.shared)
         StatBuilder.bins = []
         with open(file_name, 'r') as infile:
             json_bins = json.load(infile, object_hook=as_enum)
@@ -132,6 +372,10 @@ class StatBuilder(object):
                     hbin.__setattr__(k, v)
                 StatBuilder.bins.append(hbin)
                 hbin.index = len(StatBuilder.bins) - 1
+        if index:
+            StatBuilder.index_bins()
+        else:
+            StatBuilder.bin_index = None
 
     @staticmethod
     def load_stats(file_name):
@@ -153,27 +397,184 @@ class StatBuilder(object):
                     if current_bin is None:
                         print('Failed while loading bins stats.')
                         return
-                elif len(l_data) == 4:
-                    sbin.strategies_hitcount[int(l_data[0])] = int(l_data[1])
-                    sbin.strategies_performance[int(l_data[0])] = float(l_data[2])
-                    sbin.strategies_performance_unweighted[int(l_data[0])] = float(l_data[3])
+                elif len(l_data) in (4, 5, 6):
+                    current_bin.performance_stats[int(l_data[0])], current_bin.unweighted_stats[int(l_data[0])] = \
+                        _strategy_stats_from_line(l_data)
                 else:
                     print('Invalid file format')
                     return
         print('Bins stats loaded successfully')
 
+    @staticmethod
+    def load_stats_table(file_name, no_of_players=None):
+        # loads a binary stats file (see learner.stats_table), gathered for the current bins and, when given,
+        # no_of_players players
+        from learner.stats_table import StatsTable
+        table = StatsTable(file_name)
+        try:
+            if no_of_players is not None and table.no_of_players != no_of_players:
+                raise ValueError('{0} was gathered with {1} players'.format(file_name, table.no_of_players))
+            table.apply(StatBuilder.bins)
+            StatBuilder.global_iterations_count = table.iterations_count
+        finally:
+            table.close()
+
     def print_stats(self):
         for sbin in StatBuilder.bins:
             sbin.print_stats()
             print('-' * 16)
 
     def dump_stats(self, file_location):
+        # the iterations are added to the global count once, dumping again doesn't count them twice
         StatBuilder.global_iterations_count += self.iterations_count
+        self.iterations_count = 0
         with open(file_location, 'w') as f:
             f.write('{0}\n'.format(StatBuilder.global_iterations_count))
             for sbin in StatBuilder.bins:
                 sbin.dump_stats(f)
 
+    def dump_stats_table(self, file_name):
+        # binary version of dump_stats (see learner.stats_table)
+        from learner.stats_table import StatsTable
+        StatBuilder.global_iterations_count += self.iterations_count
+        self.iterations_count = 0
+        StatsTable.write(file_name, StatBuilder.bins,
+                         SimulationStats.from_bins(StatBuilder.bins, StatBuilder.global_iterations_count),
+                         self.no_of_players)
+
+    def simulate_parallel(self, iterations, processes=None, seed=0, shards=None):
+        # Runs the iterations on a pool of processes (all cores by default) and merges the results into the bins.
+        # The iterations are cut into shards (one per process by default), each shard gets its own random stream
+        # (seeded from seed and the shard number) and its own bins stats so shards don't depend on each other.
+        import multiprocessing
+        if processes is None:
+            processes = multiprocessing.cpu_count()
+        if shards is None:
+            shards = processes
+        tasks = [(seed * 65536 + shard, iterations // shards + (1 if shard < iterations % shards else 0),
+                  self.no_of_players) for shard in range(shards)]
+        pool = multiprocessing.Pool(processes)
+        try:
+            results = pool.map(_simulate_shard, tasks, chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+        stats = SimulationStats.from_bins(StatBuilder.bins, 0)
+        for result in results:
+            stats = stats.merge(result)
+        stats.apply(StatBuilder.bins)
+        self.iterations_count += stats.iterations_count
+
+    def simulate_batch(self, iterations, batch=4096, seed=None):
+        # Vectorized simulate_deal (see learner.simulator): same deals and per bin stats, numpy arrays instead of
+        # Python objects. Needs the hand table (Hand.load_hand_table).
+        import numpy as np
+        from learner.simulator import BatchSimulator
+        if StatBuilder.bin_index is None:
+            StatBuilder.index_bins()
+        simulator = BatchSimulator(StatBuilder.bins, StatBuilder.bin_index, Hand._hand_table.records(),
+                                   self.no_of_players)
+        result = simulator.simulate(iterations, batch, np.random.RandomState(seed))
+        SimulationStats.from_bins(StatBuilder.bins, 0).merge(result).apply(StatBuilder.bins)
+        self.iterations_count += result.iterations_count
+
+    def simulate_until(self, std_error, check_every=10000, max_iterations=None):
+        # Simulates deals until the performance of every strategy of every bin is known within std_error (standard
+        # error of the mean), or max_iterations deals have been simulated
+        while max_iterations is None or self.iterations_count < max_iterations:
+            if all(sbin.max_std_error() <= std_error for sbin in StatBuilder.bins):
+                return True
+            count = check_every if max_iterations is None else min(check_every,
+                                                                  max_iterations - self.iterations_count)
+            for i in range(count):
+                self.simulate_deal()
+        return all(sbin.max_std_error() <= std_error for sbin in StatBuilder.bins)
+
+    def simulate_checkpointed(self, iterations, checkpoint_file, checkpoint_every=100000, seed=None):
+        # Simulates iterations deals (simulate_deal) writing a checkpoint every checkpoint_every deals and at the end.
+        # When checkpoint_file exists the run resumes from it exactly where it stopped (bins stats, deals count and
+        # random state), the bins stats it was started from included, so loading stats_dump before resuming is
+        # harmless. A checkpoint that can't be read is moved aside (.corrupt) and the run starts over. Runs started
+        # from the same stats (e.g. one per machine, with different seeds) can be combined with merge_checkpoints.
+        import random
+        checkpoint = None
+        if os.path.exists(checkpoint_file):
+            try:
+                checkpoint = load_checkpoint(checkpoint_file)
+            except CHECKPOINT_ERRORS as e:
+                print('Corrupt checkpoint {0} ({1!r}), moved to {0}.corrupt and starting over'.format(checkpoint_file,
+                                                                                                    e))
+                _replace_file(checkpoint_file, checkpoint_file + '.corrupt')
+        if checkpoint is not None:
+            if checkpoint['no_of_players'] != self.no_of_players:
+                raise ValueError('{0} was written by a {1} players run'.format(checkpoint_file,
+                                                                                checkpoint['no_of_players']))
+            base, run = checkpoint['base'], checkpoint['run']
+            random.setstate(checkpoint['random_state'])
+        else:
+            base = SimulationStats.from_bins(StatBuilder.bins, StatBuilder.global_iterations_count)
+            run = SimulationStats()
+            random.seed(seed)
+        # the bins only hold the stats of this run while it goes on, the checkpoints keep both apart
+        for sbin in StatBuilder.bins:
+            sbin.reset_stats()
+        run.apply(StatBuilder.bins)
+        run_start = self.iterations_count
+        self.iterations_count += run.iterations_count
+        try:
+            while self.iterations_count - run_start < iterations:
+                for i in range(min(checkpoint_every, iterations - (self.iterations_count - run_start))):
+                    self.simulate_deal()
+                run = SimulationStats.from_bins(StatBuilder.bins, self.iterations_count - run_start)
+                _write_checkpoint(checkpoint_file, {'no_of_players': self.no_of_players, 'base': base, 'run': run,
+                                                    'random_state': random.getstate()})
+        finally:
+            # whatever was simulated since the last checkpoint stays in the bins, the same as simulate_deal
+            StatBuilder.global_iterations_count = base.iterations_count
+            base.merge(SimulationStats.from_bins(StatBuilder.bins, 0)).apply(StatBuilder.bins)
+
+    def simulate_stratified(self, std_error, batch=10000, min_hits=30, max_deals=None):
+        # Stratified and adaptive alternative to simulate_deal/simulate_until: starting hands are drawn bin by bin
+        # (uniformly among the hands of the bin), each round splits batch deals evenly over the bins that still have a
+        # strategy above std_error (a bin gets no more than the hits it's estimated to need), and a deal only plays the
+        # strategies of the bin that haven't reached it. Bins stop being sampled once all their strategies have, so
+        # rare bins get as many deals as common ones instead of 1 per million.
+        # A deal plays one hand against the other 47 cards shuffled, which gives the same per bin stats as a player of
+        # simulate_deal. Needs the hand table (Hand.load_hand_table). Returns True when every bin has converged.
+        import random
+        import numpy as np
+        if StatBuilder.bin_index is None:
+            StatBuilder.index_bins()
+        hand_bins = StatBuilder.bin_index.hand_bins
+        bin_hand_indices = [np.flatnonzero(hand_bins == i) for i in range(len(StatBuilder.bins))]
+        deals = 0
+        while max_deals is None or deals < max_deals:
+            # bins without hands (if any) can't be sampled
+            needs = [_hits_needed(sbin, std_error, min_hits) if len(bin_hand_indices[i]) > 0
+                     else [0] * len(sbin.strategies) for i, sbin in enumerate(StatBuilder.bins)]
+            open_bins = sum(1 for need in needs if max(need) > 0)
+            if open_bins == 0:
+                return True
+            for i, sbin in enumerate(StatBuilder.bins):
+                bin_need = max(needs[i])
+                if bin_need == 0:
+                    continue
+                active_strategies = [strategy for strategy, need in enumerate(needs[i]) if need > 0]
+                for j in range(min(bin_need, max(1, batch // open_bins))):
+                    hand = Hand(hand_index=int(random.choice(bin_hand_indices[i])))
+                    cards_values = [card_id for card_id in range(52) if card_id not in hand.cards_id]
+                    random.shuffle(cards_values)
+                    deck = Deck(cards_values=cards_values)
+                    hand_bin, hand_strategies = self.classify_hand(hand)
+                    snapshot = deck.snapshot()
+                    for strategy in active_strategies:
+                        deck.restore(snapshot)
+                        self.execute_strategy(deck, [Hand(cards=hand.cards)], [hand_bin], [strategy], [hand_strategies])
+                    deals += 1
+                    self.iterations_count += 1
+        return all(max(_hits_needed(sbin, std_error, min_hits)) == 0
+                   for i, sbin in enumerate(StatBuilder.bins) if len(bin_hand_indices[i]) > 0)
+
     def simulate_deal(self, seed=-1):
         self.iterations_count += 1
         if seed == -1:
@@ -183,14 +584,16 @@ class StatBuilder(object):
 
         hands = []
         bins = []
+        hands_strategies = []
         players_strategies = []
         for i in range(self.no_of_players):
             hand = Hand(deck=starting_deck)
             hands.append(hand)
             # print hand
-            hand_bin = self.bin_hand(hand)
+            hand_bin, hand_strategies = self.classify_hand(hand)
             bins.append(hand_bin)
-            players_strategies.append(range(len(hand_bin.strategies)))
+            hands_strategies.append(hand_strategies)
+            players_strategies.append(range(len(hand_strategies)))
 
         # print players_strategies
         import itertools
@@ -198,31 +601,132 @@ class StatBuilder(object):
 
         # print bins[0], ' | ', bins[1]
         # print strategies
+        snapshot = starting_deck.snapshot()
         for strategy in strategies:
-            tmp_deck = starting_deck.copy()
+            starting_deck.restore(snapshot)
             tmp_hands = [Hand(cards=hands[i].cards) for i in range(len(hands))]
-            self.execute_strategy(tmp_deck, tmp_hands, bins, strategy)
+            self.execute_strategy(starting_deck, tmp_hands, bins, strategy, hands_strategies)
             # print new bins
             # for hand in tmp_hands:
             #     print self.bin_hand(hand), ' | ',
             # print
             # print '_' * 15
 
-    def execute_strategy(self, deck, hands, bins, players_strategy):
+    def execute_strategy(self, deck, hands, bins, players_strategy, hands_strategies):
+        # hands_strategies: the resolved strategies of each hand (see classify_hand)
         # print players_strategy
         for i, player_strategy in enumerate(players_strategy):
-            predraw_hand = Hand(hand_id=hands[i].hand_id)
             predraw_value = hands[i].hand_value.strength
-            hands[i].draw(deck, bins[i].strategies[players_strategy[i]])
+            hands[i].draw(deck, hands_strategies[i][players_strategy[i]])
             postdraw_value = hands[i].hand_value.strength
             st_ratio = postdraw_value / float(predraw_value)
-            perf_sum = bins[i].strategies_performance[player_strategy] * bins[i].strategies_hitcount[
-                player_strategy] + st_ratio
-            perf_sum_unweighted = bins[i].strategies_performance_unweighted[player_strategy] * \
-                                  bins[i].strategies_hitcount[
-                                      player_strategy] + (1. if st_ratio >= 1. else 0.)
-            bins[i].strategies_hitcount[player_strategy] += 1
-            bins[i].strategies_performance[player_strategy] = perf_sum / bins[i].strategies_hitcount[player_strategy]
-            bins[i].strategies_performance_unweighted[player_strategy] = perf_sum_unweighted / \
-                                                                         bins[i].strategies_hitcount[
-                                                                             player_strategy]
+            bins[i].performance_stats[player_strategy].add(st_ratio)
+            bins[i].unweighted_stats[player_strategy].add(1. if st_ratio >= 1. else 0.)
+
+
+def _simulate_shard(task):
+    # worker side of StatBuilder.simulate_parallel
+    import random
+    shard_seed, iterations, no_of_players = task
+    random.seed(shard_seed)
+    for sbin in StatBuilder.bins:
+        sbin.reset_stats()
+    sb = StatBuilder(no_of_players=no_of_players)
+    for i in range(iterations):
+        sb.simulate_deal()
+    return SimulationStats.from_bins(StatBuilder.bins, sb.iterations_count)
+
+
+def _write_checkpoint(file_name, checkpoint):
+    # written to a temporary file, synced to disk then renamed over the previous checkpoint, so a crash leaves one or
+    # the other
+    import pickle
+    tmp_file_name = file_name + '.tmp'
+    with open(tmp_file_name, 'wb') as f:
+        pickle.dump(checkpoint, f, pickle.HIGHEST_PROTOCOL)
+        f.flush()
+        os.fsync(f.fileno())
+    _replace_file(tmp_file_name, file_name)
+
+
+def _replace_file(tmp_file_name, file_name):
+    if hasattr(os, 'replace'):
+        os.replace(tmp_file_name, file_name)
+    else:
+        # python 2 os.rename doesn't overwrite on windows
+        if os.name == 'nt' and os.path.exists(file_name):
+            os.remove(file_name)
+        os.rename(tmp_file_name, file_name)
+
+
+# what reading a truncated or otherwise corrupt checkpoint raises (load_checkpoint)
+CHECKPOINT_ERRORS = (EOFError, ValueError, TypeError, AttributeError, ImportError, IndexError, KeyError)
+
+
+def load_checkpoint(file_name):
+    # a dict holding the run settings (no_of_players), the stats the run was started from (base, a SimulationStats
+    # whose iterations_count is the global one), the stats of the run itself (run) and the random state. Raises one
+    # of CHECKPOINT_ERRORS when the file is corrupt.
+    import pickle
+    with open(file_name, 'rb') as f:
+        try:
+            checkpoint = pickle.load(f)
+        except pickle.UnpicklingError as e:
+            raise ValueError('{0} is not a checkpoint: {1}'.format(file_name, e))
+    if not isinstance(checkpoint, dict) or \
+            set(checkpoint) != set(['no_of_players', 'base', 'run', 'random_state']):
+        raise ValueError('{0} is not a checkpoint'.format(file_name))
+    return checkpoint
+
+
+def merge_checkpoints(file_names, stats_file_name):
+    # Combines the runs of checkpoint files started from the same stats into a stats_dump: the base stats plus every
+    # run stats, iterations counts added up
+    checkpoints = [load_checkpoint(file_name) for file_name in file_names]
+    base = checkpoints[0]['base']
+    stats = base
+    for file_name, checkpoint in zip(file_names, checkpoints):
+        if _stats_key(checkpoint['base']) != _stats_key(base):
+            raise ValueError('{0} was started from different stats than {1}'.format(file_name, file_names[0]))
+        stats = stats.merge(checkpoint['run'])
+    stats.dump(stats_file_name)
+    return stats
+
+
+def _stats_key(stats):
+    return stats.iterations_count, [(name, [(performance.count, performance.mean, unweighted.count, unweighted.mean)
+                                            for performance, unweighted in strategies])
+                                    for name, strategies in stats.bins.items()]
+
+
+def bin_hands(bins, records):
+    # Bin (index in bins, -1 for none) of every hand index, from the hand table records (HandTable.records()). Same
+    # rules as SBin.is_member, the first matching bin wins
+    import numpy as np
+    top_rank = records['cards'][:, 0] % 13
+    potential_flush = records['flush_idx'] > -1
+    # a hand that's both potential straight and potential flush is considered potential flush only
+    potential_straight = np.where(potential_flush & (records['straight_type'] > -1), -1, records['straight_type'])
+    hand_bins = np.full(len(records), -1, dtype=np.int16)
+    for i, sbin in enumerate(bins):
+        member = ((records['hand_type'] == sbin.hand_type.value) & (sbin.rank_from <= top_rank) &
+                  (top_rank < sbin.rank_to) & (potential_flush == bool(sbin.is_potential_flush)) &
+                  (potential_straight == int(sbin.is_potential_straight)) & (hand_bins == -1))
+        hand_bins[member] = i
+    return hand_bins
+
+
+def _hits_needed(sbin, std_error, min_hits):
+    # per strategy, estimate of the additional hits needed for the performance standard error to reach std_error (the
+    # standard error goes down as 1 / sqrt(hits))
+    needs = []
+    for stats in sbin.performance_stats:
+        # the variance is estimated from the hits whose deviation is known (not loaded from an older stats_dump)
+        known = stats.count - stats.unknown
+        if known < max(min_hits, 2):
+            needs.append(max(min_hits, 2) - known)
+        elif stats.std_error <= std_error:
+            needs.append(0)
+        else:
+            needs.append(int(math.ceil(stats.count * ((stats.std_error / std_error) ** 2 - 1))))
+    return needs
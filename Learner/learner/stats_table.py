@@ -0,0 +1,126 @@
+import hashlib
+import json
+import mmap
+import struct
+
+from learner.stats import Accumulator, SimulationStats, _replace_file
+
+MAGIC = b'JMDS'
+VERSION = 2
+
+# magic, version, record size, bins hash, players count, iterations count, bins count
+HEADER = struct.Struct('<4sHH32sHQI')
+# offset (in records) of the first strategy of each bin, bins count + 1 of them
+OFFSET = struct.Struct('<I')
+# per strategy: performance (count, mean, m2), unweighted performance (count, mean, m2), performance unknown count (see
+# Accumulator)
+RECORD = struct.Struct('<QddQddQ')
+
+
+class StatsTable(object):
+    """
+    Read-only, memory-mapped view of a binary stats file (the replacement of stats_dump).
+    The file is a fixed HEADER, the bins offsets and one fixed-width RECORD per strategy, bin after bin in the bins
+    order. The header holds the hash of the bins definition (see bins_hash) so stats are never applied to bins they
+    weren't gathered for, reading a strategy stats is a single offset computation and nothing is parsed at load time.
+    """
+
+    def __init__(self, file_name):
+        self._file = open(file_name, 'rb')
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._mmap) < HEADER.size:
+            raise ValueError('{0} is not a stats file'.format(file_name))
+        magic, version, record_size, self.bins_hash, self.no_of_players, self.iterations_count, self.bins_count = \
+            HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC:
+            raise ValueError('{0} is not a stats file'.format(file_name))
+        if version != VERSION or record_size != RECORD.size:
+            raise ValueError('Unsupported stats file version {0} in {1}'.format(version, file_name))
+        self._records_offset = HEADER.size + (self.bins_count + 1) * OFFSET.size
+        if len(self._mmap) < self._records_offset or \
+                len(self._mmap) != self._records_offset + self._bin_offset(self.bins_count) * RECORD.size:
+            raise ValueError('Stats file {0} is truncated'.format(file_name))
+
+    def close(self):
+        self._mmap.close()
+        self._file.close()
+
+    def _bin_offset(self, bin_index):
+        return OFFSET.unpack_from(self._mmap, HEADER.size + bin_index * OFFSET.size)[0]
+
+    def strategies_count(self, bin_index):
+        # type: (int) -> int
+        return self._bin_offset(bin_index + 1) - self._bin_offset(bin_index)
+
+    def strategy_stats(self, bin_index, strategy):
+        # type: (int, int) -> tuple
+        # (performance, unweighted performance) Accumulators of a strategy of a bin
+        assert 0 <= strategy < self.strategies_count(bin_index), 'Strategy out of range'
+        record = RECORD.unpack_from(self._mmap, self._records_offset +
+                                    (self._bin_offset(bin_index) + strategy) * RECORD.size)
+        return Accumulator(record[0], record[1], record[2], record[6]), Accumulator(*record[3:6])
+
+    def records(self):
+        # numpy structured array of all the records, read in place from the mapped file (see strategy_stats for the
+        # layout). The table can't be closed while the array is in use.
+        import numpy as np
+        dtype = np.dtype([('count', '<u8'), ('mean', '<f8'), ('m2', '<f8'), ('unweighted_count', '<u8'),
+                          ('unweighted_mean', '<f8'), ('unweighted_m2', '<f8'), ('unknown', '<u8')])
+        return np.frombuffer(self._mmap, dtype=dtype, offset=self._records_offset)
+
+    def check_bins(self, bins):
+        if self.bins_hash != bins_hash(bins):
+            raise ValueError('The stats were gathered for other bins')
+
+    def apply(self, bins):
+        # writes the stats into the SBins, which must be the ones the stats were gathered for
+        self.check_bins(bins)
+        for bin_index, sbin in enumerate(bins):
+            for strategy in range(self.strategies_count(bin_index)):
+                sbin.performance_stats[strategy], sbin.unweighted_stats[strategy] = \
+                    self.strategy_stats(bin_index, strategy)
+
+    def simulation_stats(self, bins):
+        # type: (list) -> SimulationStats
+        self.check_bins(bins)
+        stats = SimulationStats(self.iterations_count)
+        for bin_index, sbin in enumerate(bins):
+            stats.bins[sbin.name] = [self.strategy_stats(bin_index, strategy)
+                                     for strategy in range(self.strategies_count(bin_index))]
+        return stats
+
+    @staticmethod
+    def write(file_name, bins, stats, no_of_players):
+        # bins: the SBins (their definition is hashed in the header), stats: SimulationStats to write, by bin name,
+        # a bin missing from stats is written with empty stats. Written to a temporary file then renamed.
+        offsets = [0]
+        for sbin in bins:
+            offsets.append(offsets[-1] + len(sbin.strategies))
+        tmp_file_name = file_name + '.tmp'
+        with open(tmp_file_name, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, VERSION, RECORD.size, bins_hash(bins), no_of_players, stats.iterations_count,
+                                len(bins)))
+            for offset in offsets:
+                f.write(OFFSET.pack(offset))
+            for sbin in bins:
+                strategies = stats.bins.get(sbin.name, [])
+                for strategy in range(len(sbin.strategies)):
+                    performance, unweighted = strategies[strategy] if strategy < len(strategies) else \
+                        (Accumulator(), Accumulator())
+                    f.write(RECORD.pack(performance.count, performance.mean, performance.m2, unweighted.count,
+                                        unweighted.mean, unweighted.m2, performance.unknown))
+        _replace_file(tmp_file_name, file_name)
+
+
+def bins_hash(bins):
+    # type: (list) -> bytes
+    # sha256 of the bins definition (names, what decides which hands go in a bin and the strategies), bins.json keys
+    # order and formatting don't change it
+    definition = [[sbin.name, sbin.hand_type.value, bool(sbin.is_potential_flush), int(sbin.is_potential_straight),
+                   sbin.rank_from, sbin.rank_to, [list(strategy) for strategy in sbin.strategies]] for sbin in bins]
+    return hashlib.sha256(json.dumps(definition, sort_keys=True).encode('utf-8')).digest()
+
+
+def convert_stats_dump(stats_file_name, table_file_name, bins, no_of_players=2):
+    # Build the binary stats file out of a text stats_dump gathered for bins (see StatBuilder.load_bins)
+    StatsTable.write(table_file_name, bins, SimulationStats.load(stats_file_name), no_of_players)
@@ -0,0 +1,99 @@
+import mmap
+import struct
+
+from learner.card import Card, HandType, HandValue
+from learner.index import HANDS_COMBINATIONS, hand_id_to_index
+
+MAGIC = b'JMDH'
+VERSION = 2
+
+# magic, version, record size, record count
+HEADER = struct.Struct('<4sHHI')
+# hand_type, s0, strength, 5 cards (HandValue order), potential flush (idx, hand_id),
+# potential straight (idx, type, hand_id)
+RECORD = struct.Struct('<BII5Bbibbi')
+
+
+class HandTable(object):
+    """
+    Read-only, memory-mapped view of the binary hand table (the replacement of hands.json).
+    The file is a fixed HEADER followed by one fixed-width RECORD per hand, stored at the hand's dense index (see
+    learner.index), so a lookup is a single offset computation over the mapped bytes and nothing is parsed or copied at
+    load time. Processes that map the same file share one copy of it in the page cache.
+    """
+
+    def __init__(self, file_name):
+        self._file = open(file_name, 'rb')
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, record_size, count = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC:
+            raise ValueError('{0} is not a hand table'.format(file_name))
+        if version != VERSION or record_size != RECORD.size:
+            raise ValueError('Unsupported hand table version {0} in {1}'.format(version, file_name))
+        if count != HANDS_COMBINATIONS or len(self._mmap) != HEADER.size + count * RECORD.size:
+            raise ValueError('Hand table {0} is truncated'.format(file_name))
+        self.count = count
+
+    def __len__(self):
+        return self.count
+
+    def close(self):
+        self._mmap.close()
+        self._file.close()
+
+    def record(self, hand_index):
+        # type: (int) -> tuple
+        assert 0 <= hand_index < self.count, 'Hand index out of range'
+        return RECORD.unpack_from(self._mmap, HEADER.size + hand_index * RECORD.size)
+
+    def hand_value(self, hand_index):
+        # type: (int) -> HandValue
+        return record_to_hand_value(self.record(hand_index))
+
+    def records(self):
+        # numpy structured array (see learner.generator.RECORD_DTYPE) of all the records, read in place from the mapped
+        # file. The table can't be closed while the array is in use.
+        import numpy as np
+        from learner.generator import RECORD_DTYPE
+        return np.frombuffer(self._mmap, dtype=RECORD_DTYPE, offset=HEADER.size)
+
+    @staticmethod
+    def write(file_name, records):
+        # records: iterable of RECORD tuples, one per hand in hand index order
+        with open(file_name, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, VERSION, RECORD.size, 0))
+            count = 0
+            for record in records:
+                f.write(RECORD.pack(*record))
+                count += 1
+            f.seek(0)
+            f.write(HEADER.pack(MAGIC, VERSION, RECORD.size, count))
+
+
+def hand_value_to_record(hand_value):
+    # type: (HandValue) -> tuple
+    cards = [card.int_value for card in hand_value.cards]
+    return ((hand_value.hand_type.value, hand_value.s0, hand_value.strength) + tuple(cards) +
+            tuple(hand_value.is_potential_flush) + tuple(hand_value.is_potential_straight))
+
+
+def record_to_hand_value(record):
+    # type: (tuple) -> HandValue
+    hand_value = HandValue(hand_type=HandType(record[0]), cards=[Card(card_id) for card_id in record[3:8]])
+    hand_value._s0 = record[1]
+    hand_value.strength = record[2]
+    hand_value.is_potential_flush = record[8:10]
+    hand_value.is_potential_straight = record[10:13]
+    return hand_value
+
+
+def convert_hands_json(json_file_name, table_file_name):
+    # Build the binary table out of a hands.json generated by Hand.evaluate_all_hand_combinations
+    import json
+    with open(json_file_name, 'r') as infile:
+        entries = json.load(infile)
+    entries = sorted((hand_id_to_index(int(hand_id)), str_value) for hand_id, str_value in entries)
+    if [entry[0] for entry in entries] != range(HANDS_COMBINATIONS):
+        raise ValueError('{0} does not hold every hand combination'.format(json_file_name))
+    HandTable.write(table_file_name, (hand_value_to_record(HandValue.from_string(str_value))
+                                      for hand_index, str_value in entries))
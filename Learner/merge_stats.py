@@ -0,0 +1,12 @@
+# Combines simulation checkpoints (see StatBuilder.simulate_checkpointed) into a stats_dump
+# usage: python merge_stats.py stats_dump checkpoint [checkpoint ...]
+import sys
+
+from learner.stats import merge_checkpoints
+
+if len(sys.argv) < 3:
+    print 'usage: python merge_stats.py stats_dump checkpoint [checkpoint ...]'
+    exit(1)
+stats = merge_checkpoints(sys.argv[2:], sys.argv[1])
+print '{0} checkpoints merged into {1} ({2:,} iterations)'.format(len(sys.argv) - 2, sys.argv[1],
+                                                                  stats.iterations_count)
@@ -0,0 +1,114 @@
+# Tests of the bin index (learner.stats.BinIndex) against the bins scan, and of the binary stats file
+# (learner.stats_table).
+# Run from the Learner directory: python -m unittest discover tests (or pytest tests)
+import copy
+import os
+import random
+import shutil
+import sys
+import tempfile
+import unittest
+
+LEARNER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, LEARNER_DIR)
+
+from learner.card import Hand
+from learner.stats import Accumulator, SimulationStats, StatBuilder
+from learner.stats_table import StatsTable
+
+HAND_TABLE = os.path.join(LEARNER_DIR, 'hands.bin')
+BINS = os.path.join(LEARNER_DIR, 'bins.json')
+
+
+@unittest.skipUnless(os.path.exists(HAND_TABLE), 'needs the hand table (Learner/hands.bin)')
+class BinIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        Hand.load_hand_table(HAND_TABLE)
+        StatBuilder.load_bins(BINS)
+
+    def test_index_matches_scan(self):
+        bin_index = StatBuilder.bin_index
+        rng = random.Random(0)
+        hands = [Hand(cards_id=rng.sample(range(52), 5)) for i in range(5000)]
+        # potential flushes and straights, where the resolved strategies depend on the hand
+        hands += [Hand(cards_id=[suit * 13 + rank for rank in ranks])
+                  for suit in range(4) for ranks in ([0, 3, 5, 8, 12], [2, 3, 4, 5, 9], [1, 4, 6, 9, 11])]
+        hands += [Hand(cards_id=[0, 2, 4, 6, 13 + 10])]
+        try:
+            StatBuilder.bin_index = None
+            scanned = [StatBuilder.classify_hand(hand) for hand in hands]
+        finally:
+            StatBuilder.bin_index = bin_index
+        for hand, (hand_bin, strategies) in zip(hands, scanned):
+            self.assertIsNotNone(hand_bin, str(hand))
+            self.assertEqual(StatBuilder.classify_hand(hand), (hand_bin, strategies), str(hand))
+
+    def test_strategies_are_not_shared(self):
+        # resolving the strategies of a hand never changes the bin ones
+        before = [list(sbin.strategies) for sbin in StatBuilder.bins]
+        rng = random.Random(1)
+        for i in range(1000):
+            StatBuilder.bin_hand(Hand(cards_id=rng.sample(range(52), 5)))
+        self.assertEqual([list(sbin.strategies) for sbin in StatBuilder.bins], before)
+
+
+class StatsTableTest(unittest.TestCase):
+
+    def setUp(self):
+        StatBuilder.load_bins(BINS, index=False)
+        self.bins = StatBuilder.bins
+        self.directory = tempfile.mkdtemp()
+        self.file_name = os.path.join(self.directory, 'stats.bin')
+        rng = random.Random(0)
+        self.stats = SimulationStats(123456)
+        for sbin in self.bins:
+            self.stats.bins[sbin.name] = [(Accumulator(rng.randrange(1000), rng.random(), rng.random(),
+                                                       rng.randrange(10)),
+                                           Accumulator(rng.randrange(1000), rng.random(), rng.random()))
+                                          for strategy in sbin.strategies]
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_round_trip(self):
+        StatsTable.write(self.file_name, self.bins, self.stats, 3)
+        table = StatsTable(self.file_name)
+        try:
+            self.assertEqual((table.no_of_players, table.iterations_count), (3, 123456))
+            loaded = table.simulation_stats(self.bins)
+            for sbin in self.bins:
+                for (performance, unweighted), (expected, expected_unweighted) in zip(loaded.bins[sbin.name],
+                                                                                     self.stats.bins[sbin.name]):
+                    self.assertEqual(
+                        (performance.count, performance.mean, performance.m2, performance.unknown),
+                        (expected.count, expected.mean, expected.m2, expected.unknown))
+                    self.assertEqual((unweighted.count, unweighted.mean, unweighted.m2),
+                                     (expected_unweighted.count, expected_unweighted.mean, expected_unweighted.m2))
+            self.assertEqual(len(table.records()), sum(len(sbin.strategies) for sbin in self.bins))
+        finally:
+            table.close()
+
+    def test_other_bins_are_refused(self):
+        StatsTable.write(self.file_name, self.bins, self.stats, 2)
+        bins = copy.deepcopy(self.bins)
+        bins[0].strategies = bins[0].strategies[:-1]
+        table = StatsTable(self.file_name)
+        try:
+            self.assertRaises(ValueError, table.apply, bins)
+            self.assertRaises(ValueError, table.simulation_stats, bins)
+            table.apply(self.bins)
+        finally:
+            table.close()
+
+    def test_truncated_file_is_refused(self):
+        StatsTable.write(self.file_name, self.bins, self.stats, 2)
+        with open(self.file_name, 'rb') as f:
+            data = f.read()
+        with open(self.file_name, 'wb') as f:
+            f.write(data[:-1])
+        self.assertRaises(ValueError, StatsTable, self.file_name)
+
+
+if __name__ == '__main__':
+    unittest.main()
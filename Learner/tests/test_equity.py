@@ -0,0 +1,105 @@
+# Tests of the showdown equity (learner.equity): the per-hand inclusion-exclusion count (EquityEngine._compute)
+# against the all-hands one (odds_table) and a brute force count, and the sampled multiway chances.
+# Run from the Learner directory: python -m unittest discover tests (or pytest tests)
+import itertools
+import os
+import random
+import sys
+import unittest
+
+import numpy as np
+
+LEARNER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, LEARNER_DIR)
+
+from learner.canonical import SUIT_PERMUTATIONS, rename_card
+from learner.card import Hand
+from learner.equity import UNSEEN_HANDS_COMBINATIONS, EquityEngine, odds_table
+from learner.index import HANDS_COMBINATIONS, hand_from_index, hand_index, hand_indices
+
+HAND_TABLE = os.path.join(LEARNER_DIR, 'hands.bin')
+
+
+@unittest.skipUnless(os.path.exists(HAND_TABLE), 'needs the hand table (Learner/hands.bin)')
+class EquityTest(unittest.TestCase):
+    engine = None
+    odds_counts = None
+
+    @classmethod
+    def setUpClass(cls):
+        Hand.load_hand_table(HAND_TABLE)
+        cls.engine = EquityEngine()
+        cls.odds_counts = odds_table(cls.engine.strengths)
+
+    @classmethod
+    def tearDownClass(cls):
+        # the engine strengths are a view of the mapped hand table, which can't be closed (reloaded) meanwhile
+        cls.engine = None
+
+    def setUp(self):
+        self.engine.use_odds_table(None)
+        self.engine.clear_cache()
+
+    def sample_indices(self, count, seed):
+        rng = random.Random(seed)
+        return [rng.randrange(HANDS_COMBINATIONS) for i in range(count)] + [0, HANDS_COMBINATIONS - 1]
+
+    def test_compute_matches_odds_table(self):
+        for index in self.sample_indices(100, 0):
+            win, tie = self.engine._compute(hand_from_index(index), index)
+            weaker, equal = self.odds_counts[index]
+            self.assertEqual(int(round(win * UNSEEN_HANDS_COMBINATIONS)), weaker, index)
+            self.assertEqual(int(round(tie * UNSEEN_HANDS_COMBINATIONS)), equal, index)
+
+    def test_odds_table_is_used(self):
+        index = self.sample_indices(1, 1)[0]
+        cards_id = hand_from_index(index)
+        computed = self.engine.odds(cards_id)
+        self.engine.clear_cache()
+        self.engine.use_odds_table(self.odds_counts)
+        self.assertEqual(self.engine.odds(cards_id), computed)
+
+    def test_brute_force(self):
+        strengths = self.engine.strengths
+        for index in self.sample_indices(2, 2):
+            cards_id = hand_from_index(index)
+            unseen = np.setdiff1d(np.arange(52), cards_id)
+            opponents = strengths[hand_indices(unseen[np.array(list(itertools.combinations(range(47), 5)))])]
+            self.assertEqual(len(opponents), UNSEEN_HANDS_COMBINATIONS)
+            win, tie = self.engine.odds(cards_id)
+            self.assertEqual(int(round(win * UNSEEN_HANDS_COMBINATIONS)),
+                             np.count_nonzero(opponents < strengths[index]))
+            self.assertEqual(int(round(tie * UNSEEN_HANDS_COMBINATIONS)),
+                             np.count_nonzero(opponents == strengths[index]))
+
+    def test_odds_are_suit_invariant(self):
+        for index in self.sample_indices(20, 3):
+            cards_id = hand_from_index(index)
+            odds = tuple(self.odds_counts[index])
+            for p in range(len(SUIT_PERMUTATIONS)):
+                renamed = hand_index([rename_card(card_id, p) for card_id in cards_id])
+                self.assertEqual(tuple(self.odds_counts[renamed]), odds)
+
+    def test_multiway_against_one_opponent(self):
+        # the sampled estimate converges to the exact single opponent p_win
+        for index in self.sample_indices(5, 4):
+            cards_id = hand_from_index(index)
+            self.assertEqual(self.engine.p_win_multiway(cards_id, 1), self.engine.p_win(cards_id))
+            self.assertAlmostEqual(self.engine._sample_multiway(index, 1, 40000), self.engine.p_win(cards_id),
+                                   delta=0.01)
+
+    def test_multiway(self):
+        for index in self.sample_indices(5, 5):
+            cards_id = hand_from_index(index)
+            p = [self.engine.p_win_multiway(cards_id, opponents) for opponents in range(1, 5)]
+            self.assertTrue(all(0. <= a <= 1. for a in p))
+            self.assertTrue(all(b <= a + 0.02 for a, b in zip(p, p[1:])), p)
+            # deterministic, and suit invariant
+            self.engine.clear_cache()
+            self.assertEqual(self.engine.p_win_multiway([rename_card(card_id, 7) for card_id in cards_id], 3), p[2])
+        # a royal flush only ties another one
+        self.assertGreater(self.engine.p_win_multiway([47, 48, 49, 50, 51], 9), 0.999)
+
+
+if __name__ == '__main__':
+    unittest.main()
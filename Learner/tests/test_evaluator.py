@@ -0,0 +1,40 @@
+# Property test of the batch evaluator (learner.evaluator) against the scalar path (Hand.evaluate_hand, HandValue.s0).
+# Run from the Learner directory: python -m unittest discover tests (or pytest tests)
+import os
+import random
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from learner.card import Hand
+from learner.evaluator import classify_hands
+
+
+class ClassifyHandsTest(unittest.TestCase):
+
+    def assert_matches_evaluate_hand(self, hands):
+        hand_type, s0, cards = classify_hands(hands)
+        for i, cards_id in enumerate(hands):
+            hand = Hand(cards_id=cards_id)
+            hand_value = hand.evaluate_hand()
+            self.assertEqual(hand_value.hand_type.value, hand_type[i], str(hand))
+            self.assertEqual(hand_value.s0, s0[i], str(hand))
+            self.assertEqual([card.int_value for card in hand_value.cards], list(cards[i]), str(hand))
+
+    def test_random_hands(self):
+        rng = random.Random(0)
+        self.assert_matches_evaluate_hand([rng.sample(range(52), 5) for i in range(10000)])
+
+    def test_straight_flushes(self):
+        # random sampling hardly ever hits them
+        self.assert_matches_evaluate_hand([[suit * 13 + (top - j) % 13 for j in range(5)]
+                                           for suit in range(4) for top in range(3, 13)])
+
+    def test_four_of_a_kind(self):
+        self.assert_matches_evaluate_hand([[rank, 13 + rank, 26 + rank, 39 + rank, kicker]
+                                           for rank in range(13) for kicker in range(52) if kicker % 13 != rank])
+
+
+if __name__ == '__main__':
+    unittest.main()
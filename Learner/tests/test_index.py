@@ -0,0 +1,89 @@
+# Tests of the dense colex hand index (learner.index) and of the suit canonicalization (learner.canonical).
+# Run from the Learner directory: python -m unittest discover tests (or pytest tests)
+import os
+import random
+import sys
+import unittest
+
+import numpy as np
+
+LEARNER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, LEARNER_DIR)
+
+from learner.canonical import CANONICAL_HANDS_COMBINATIONS, INVERSE_PERMUTATIONS, SUIT_PERMUTATIONS, \
+    canonical_hand, canonical_indices, canonical_index, canonical_table, rename_card, rename_cards
+from learner.index import HANDS_COMBINATIONS, hand_from_index, hand_id_to_index, hand_index, hand_indices, \
+    hands_from_indices, index_to_hand_id
+
+HAND_TABLE = os.path.join(LEARNER_DIR, 'hands.bin')
+
+
+class HandIndexTest(unittest.TestCase):
+
+    def test_bounds(self):
+        self.assertEqual(hand_index([0, 1, 2, 3, 4]), 0)
+        self.assertEqual(hand_index([47, 48, 49, 50, 51]), HANDS_COMBINATIONS - 1)
+
+    def test_round_trip(self):
+        rng = random.Random(0)
+        for index in [0, 1, HANDS_COMBINATIONS - 1] + [rng.randrange(HANDS_COMBINATIONS) for i in range(5000)]:
+            cards_id = hand_from_index(index)
+            self.assertEqual(cards_id, sorted(set(cards_id)))
+            self.assertEqual(hand_index(cards_id), index)
+            rng.shuffle(cards_id)
+            self.assertEqual(hand_index(cards_id), index)
+            self.assertEqual(hand_id_to_index(index_to_hand_id(index)), index)
+
+    def test_batch_round_trip(self):
+        # every index, in chunks, through the batch functions
+        for start in range(0, HANDS_COMBINATIONS, 1 << 19):
+            indices = np.arange(start, min(start + (1 << 19), HANDS_COMBINATIONS))
+            hands = hands_from_indices(indices)
+            self.assertTrue(np.all(hands[:, :-1] < hands[:, 1:]))
+            self.assertTrue(np.array_equal(hand_indices(hands[:, ::-1]), indices))
+
+    def test_batch_matches_scalar(self):
+        rng = random.Random(1)
+        hands = [rng.sample(range(52), 5) for i in range(1000)]
+        self.assertEqual(list(hand_indices(hands)), [hand_index(cards_id) for cards_id in hands])
+
+
+class CanonicalTest(unittest.TestCase):
+
+    def test_renamings_share_the_canonical_hand(self):
+        rng = random.Random(2)
+        for i in range(500):
+            cards_id = rng.sample(range(52), 5)
+            canonical, permutation = canonical_index(cards_id)
+            self.assertEqual(hand_index([rename_card(card_id, permutation) for card_id in cards_id]), canonical)
+            for p in range(len(SUIT_PERMUTATIONS)):
+                self.assertEqual(canonical_index([rename_card(card_id, p) for card_id in cards_id])[0], canonical)
+            cards, permutation = canonical_hand(cards_id)
+            self.assertEqual(sorted(rename_card(card_id, INVERSE_PERMUTATIONS[permutation]) for card_id in cards),
+                             sorted(cards_id))
+
+    def test_batch_matches_scalar(self):
+        rng = random.Random(3)
+        hands = np.array([rng.sample(range(52), 5) for i in range(2000)])
+        canonical, permutations = canonical_indices(hands)
+        for i, cards_id in enumerate(hands):
+            self.assertEqual((canonical[i], permutations[i]), canonical_index(list(cards_id)))
+        self.assertTrue(np.array_equal(hand_indices(rename_cards(hands, permutations)), canonical))
+
+    def test_canonical_hands_count(self):
+        canonical, permutations = canonical_table()
+        self.assertEqual(len(np.unique(canonical)), CANONICAL_HANDS_COMBINATIONS)
+        # a canonical hand is its own representative
+        self.assertTrue(np.all(canonical[canonical] == canonical))
+
+    @unittest.skipUnless(os.path.exists(HAND_TABLE), 'needs the hand table (Learner/hands.bin)')
+    def test_strength_is_suit_invariant(self):
+        from learner.card import Hand
+        Hand.load_hand_table(HAND_TABLE)
+        strengths = Hand._hand_table.records()['strength']
+        canonical, permutations = canonical_table()
+        self.assertTrue(np.array_equal(strengths, strengths[canonical]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+# Test of the batch simulator (learner.simulator) against the scalar one (StatBuilder.simulate_deal) on the same decks.
+# Run from the Learner directory: python -m unittest discover tests (or pytest tests)
+import os
+import sys
+import unittest
+
+import numpy as np
+
+LEARNER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, LEARNER_DIR)
+
+import learner.stats
+from learner.card import Deck, Hand
+from learner.simulator import BatchSimulator, _Groups
+from learner.stats import SimulationStats, StatBuilder
+
+HAND_TABLE = os.path.join(LEARNER_DIR, 'hands.bin')
+
+
+@unittest.skipUnless(os.path.exists(HAND_TABLE), 'needs the hand table (Learner/hands.bin)')
+class BatchSimulatorTest(unittest.TestCase):
+
+    def setUp(self):
+        Hand.load_hand_table(HAND_TABLE)
+        StatBuilder.load_bins(os.path.join(LEARNER_DIR, 'bins.json'))
+
+    def scalar_stats(self, decks, no_of_players):
+        # simulate_deal dealing the given decks instead of shuffled ones
+        for sbin in StatBuilder.bins:
+            sbin.reset_stats()
+        sb = StatBuilder(no_of_players=no_of_players)
+        try:
+            for deck in decks:
+                learner.stats.Deck = lambda seed=-1, cards_values=[int(card_id) for card_id in deck]: \
+                    Deck(cards_values=cards_values)
+                sb.simulate_deal()
+        finally:
+            learner.stats.Deck = Deck
+        return SimulationStats.from_bins(StatBuilder.bins, sb.iterations_count)
+
+    def assert_same_stats(self, no_of_players, deals):
+        decks = np.random.RandomState(no_of_players).rand(deals, 52).argsort(axis=1)
+        simulator = BatchSimulator(StatBuilder.bins, StatBuilder.bin_index, Hand._hand_table.records(),
+                                   no_of_players)
+        groups = _Groups(len(StatBuilder.bins), simulator.max_strategies)
+        simulator.simulate_decks(decks, groups)
+        batch = groups.simulation_stats(StatBuilder.bins, deals)
+        scalar = self.scalar_stats(decks, no_of_players)
+        hits = 0
+        for name, strategies in scalar.bins.items():
+            for (performance, unweighted), (batch_performance, batch_unweighted) in zip(strategies, batch.bins[name]):
+                self.assertEqual(performance.count, batch_performance.count, name)
+                self.assertEqual(unweighted.count, batch_unweighted.count, name)
+                if performance.count:
+                    self.assertAlmostEqual(performance.mean, batch_performance.mean, places=9)
+                    self.assertAlmostEqual(performance.m2, batch_performance.m2, delta=1e-9 * (1 + performance.m2))
+                    self.assertAlmostEqual(unweighted.mean, batch_unweighted.mean, places=9)
+                hits += performance.count
+        self.assertGreater(hits, 0)
+
+    def test_two_players(self):
+        self.assert_same_stats(2, 1000)
+
+    def test_three_players(self):
+        self.assert_same_stats(3, 300)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,159 @@
+# Tests of the stats accumulators (learner.stats.Accumulator), of their stats_dump lines and of the sampling from
+# older stats_dump files.
+# Run from the Learner directory: python -m unittest discover tests (or pytest tests)
+import math
+import os
+import pickle
+import random
+import shutil
+import sys
+import tempfile
+import unittest
+
+LEARNER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, LEARNER_DIR)
+
+from learner.stats import Accumulator, SimulationStats, _strategy_stats_from_line, _strategy_stats_line
+
+HAND_TABLE = os.path.join(LEARNER_DIR, 'hands.bin')
+
+
+def welford(samples):
+    accumulator = Accumulator()
+    for x in samples:
+        accumulator.add(x)
+    return accumulator
+
+
+class AccumulatorTest(unittest.TestCase):
+
+    def test_merge_matches_single_pass(self):
+        rng = random.Random(0)
+        samples = [rng.expovariate(1.) for i in range(1000)]
+        for cut in (0, 1, 250, 999, 1000):
+            merged = welford(samples[:cut]).merge(welford(samples[cut:]))
+            single = welford(samples)
+            self.assertEqual(merged.count, single.count)
+            self.assertAlmostEqual(merged.mean, single.mean, places=12)
+            self.assertAlmostEqual(merged.m2, single.m2, places=8)
+
+    def test_legacy_line_variance(self):
+        # a 4 fields stats_dump line has no m2: the variance comes from the samples added after loading
+        performance, unweighted = _strategy_stats_from_line('0,1000,1.5,0.6'.split(','))
+        self.assertEqual((performance.count, performance.unknown), (1000, 1000))
+        self.assertTrue(math.isnan(performance.std_error))
+        rng = random.Random(0)
+        for i in range(200):
+            performance.add(rng.gauss(1.5, 0.5))
+        self.assertEqual(performance.count, 1200)
+        self.assertTrue(0.3 < math.sqrt(performance.variance) < 0.7)
+        self.assertFalse(math.isnan(performance.std_error))
+        merged = performance.merge(welford([rng.gauss(1.5, 0.5) for i in range(100)]))
+        self.assertEqual(merged.unknown, 1000)
+        self.assertFalse(math.isnan(merged.std_error))
+
+    def test_nan_m2_line_is_legacy(self):
+        # lines written with a nan m2 (dumps of legacy stats before unknown counts) load as legacy ones
+        performance, unweighted = _strategy_stats_from_line('0,10,1.5,0.6,nan'.split(','))
+        self.assertEqual((performance.m2, performance.unknown), (0., 10))
+
+    def test_line_round_trip(self):
+        performance = Accumulator(1200, 1.25, 42.5, 1000)
+        unweighted = Accumulator(1200, 0.5, 300.)
+        line = _strategy_stats_line(3, performance, unweighted)
+        loaded, loaded_unweighted = _strategy_stats_from_line(line.strip().split(','))
+        self.assertEqual((loaded.count, loaded.mean, loaded.m2, loaded.unknown), (1200, 1.25, 42.5, 1000))
+        self.assertEqual((loaded_unweighted.count, loaded_unweighted.mean), (1200, 0.5))
+        line = _strategy_stats_line(3, Accumulator(5, 1., 2.), unweighted)
+        self.assertEqual(len(line.strip().split(',')), 5)
+
+    def test_pickle(self):
+        accumulator = pickle.loads(pickle.dumps(Accumulator(10, 1.5, 3., 4), pickle.HIGHEST_PROTOCOL))
+        self.assertEqual((accumulator.count, accumulator.mean, accumulator.m2, accumulator.unknown), (10, 1.5, 3., 4))
+        # as pickled before unknown counts
+        accumulator = Accumulator.__new__(Accumulator)
+        accumulator.__setstate__((None, {'count': 10, 'mean': 1.5, 'm2': 3.}))
+        self.assertEqual((accumulator.count, accumulator.unknown, accumulator.variance), (10, 0, 3. / 9))
+
+
+@unittest.skipUnless(os.path.exists(HAND_TABLE), 'needs the hand table (Learner/hands.bin)')
+class LegacyDumpSamplingTest(unittest.TestCase):
+    BINS = ['Four of a Kind', 'Full House', 'Flush', 'Straight', 'Three of a Kind - High']
+
+    def setUp(self):
+        from learner.card import Hand
+        from learner.stats import StatBuilder
+        Hand.load_hand_table(HAND_TABLE)
+        StatBuilder.load_bins(os.path.join(LEARNER_DIR, 'bins.json'))
+        StatBuilder.bins = [sbin for sbin in StatBuilder.bins if sbin.name in self.BINS]
+        StatBuilder.index_bins()
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write_legacy_dump(self):
+        from learner.stats import StatBuilder
+        file_name = os.path.join(self.directory, 'stats_dump')
+        with open(file_name, 'w') as f:
+            f.write('100000\n')
+            for sbin in StatBuilder.bins:
+                f.write(sbin.name + '\n')
+                for i in range(len(sbin.strategies)):
+                    f.write('{0},500,1.01,0.9\n'.format(i))
+        return file_name
+
+    def test_stratified_sampling_converges(self):
+        from learner.stats import StatBuilder
+        StatBuilder.load_stats(self.write_legacy_dump())
+        random.seed(0)
+        self.assertTrue(StatBuilder(no_of_players=2).simulate_stratified(0.01, batch=500, min_hits=30,
+                                                                          max_deals=20000))
+        for sbin in StatBuilder.bins:
+            for stats in sbin.performance_stats:
+                self.assertEqual(stats.unknown, 500)
+                self.assertLessEqual(stats.std_error, 0.01)
+
+    def test_dump_keeps_unknown_counts(self):
+        from learner.stats import StatBuilder
+        StatBuilder.load_stats(self.write_legacy_dump())
+        random.seed(0)
+        StatBuilder(no_of_players=2).simulate_stratified(0.01, batch=500, min_hits=30, max_deals=20000)
+        file_name = os.path.join(self.directory, 'stats_dump2')
+        SimulationStats.from_bins(StatBuilder.bins, 0).dump(file_name)
+        for strategies in SimulationStats.load(file_name).bins.values():
+            for performance, unweighted in strategies:
+                self.assertEqual(performance.unknown, 500)
+                self.assertFalse(math.isnan(performance.m2))
+
+
+@unittest.skipUnless(os.path.exists(HAND_TABLE), 'needs the hand table (Learner/hands.bin)')
+class CheckpointTest(unittest.TestCase):
+
+    def setUp(self):
+        from learner.card import Hand
+        from learner.stats import StatBuilder
+        Hand.load_hand_table(HAND_TABLE)
+        StatBuilder.load_bins(os.path.join(LEARNER_DIR, 'bins.json'))
+        StatBuilder.index_bins()
+        self.directory = tempfile.mkdtemp()
+        self.checkpoint_file = os.path.join(self.directory, 'stats_checkpoint')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_corrupt_checkpoint_starts_over(self):
+        from learner.stats import StatBuilder, load_checkpoint, CHECKPOINT_ERRORS
+        StatBuilder(no_of_players=2).simulate_checkpointed(200, self.checkpoint_file, seed=0)
+        with open(self.checkpoint_file, 'rb') as f:
+            data = f.read()
+        with open(self.checkpoint_file, 'wb') as f:
+            f.write(data[:len(data) // 2])
+        self.assertRaises(CHECKPOINT_ERRORS, load_checkpoint, self.checkpoint_file)
+        StatBuilder(no_of_players=2).simulate_checkpointed(200, self.checkpoint_file, seed=0)
+        self.assertTrue(os.path.exists(self.checkpoint_file + '.corrupt'))
+        self.assertEqual(load_checkpoint(self.checkpoint_file)['run'].iterations_count, 200)
+
+
+if __name__ == '__main__':
+    unittest.main()